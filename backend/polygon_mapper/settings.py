@@ -3,6 +3,8 @@ Django settings for polygon_mapper project.
 """
 
 import os
+import sys
+import tempfile
 from pathlib import Path
 import environ
 
@@ -35,6 +37,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'polygons.instrumentation.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -43,6 +46,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'polygons.profiling.ProfilingMiddleware',
+    'polygons.query_budget.QueryDebugMiddleware',
 ]
 
 ROOT_URLCONF = 'polygon_mapper.urls'
@@ -78,6 +83,41 @@ DATABASES = {
         'PORT': env('DB_PORT', default='5432'),
     }
 }
+# A DATABASE_URL (e.g. sqlite:////tmp/primary.sqlite3) replaces the DB_* settings
+if env('DATABASE_URL', default=''):
+    DATABASES['default'] = env.db('DATABASE_URL')
+
+# Comma-separated URLs of read replicas for the polygon read endpoints
+POLYGON_READ_REPLICAS = []
+for index, url in enumerate(env.list('DB_REPLICA_URLS', default=[]), 1):
+    DATABASES[f'replica{index}'] = {
+        **environ.Env.db_url_config(url), 'TEST': {'MIRROR': 'default'}
+    }
+    POLYGON_READ_REPLICAS.append(f'replica{index}')
+# Without configured replicas, the test suite still gets a replica1 alias
+# (a mirror of the test database) to check read routing against
+if 'replica1' not in DATABASES and sys.argv[1:2] == ['test']:
+    DATABASES['replica1'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['polygons.db_router.PrimaryReplicaRouter']
+# Seconds reads stay on the primary after a write, covering replication lag
+POLYGON_REPLICA_LAG = env.int('POLYGON_REPLICA_LAG', default=5)
+
+# Keep connections open for this many seconds (0 closes them after every
+# request; use 0 under ASGI) and check a reused connection before a request
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=60)
+    database['CONN_HEALTH_CHECKS'] = env.bool('DB_CONN_HEALTH_CHECKS', default=True)
+
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Use a shared backend (e.g. redis://) in production so workers see each
+# other's spatial index and tile invalidations and collection versions;
+# with locmem, each worker serves and validates collections from its own.
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    'tiles': env.cache('TILE_CACHE_URL', default='locmemcache://polygon-tiles'),
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -127,11 +167,104 @@ CORS_ALLOWED_ORIGINS = [
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'polygons.renderers.ORJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'polygons.pagination.PolygonCursorPagination',
+    'PAGE_SIZE': env.int('POLYGON_PAGE_SIZE', default=100),
+}
+
+# Upper bound for the ?page_size= query parameter
+POLYGON_MAX_PAGE_SIZE = env.int('POLYGON_MAX_PAGE_SIZE', default=1000)
+
+# Bulk polygon ingest
+POLYGON_BULK_CHUNK_SIZE = env.int('POLYGON_BULK_CHUNK_SIZE', default=1000)
+
+# Bulk uploads carry whole FeatureCollections in one request body
+DATA_UPLOAD_MAX_MEMORY_SIZE = env.int(
+    'DATA_UPLOAD_MAX_MEMORY_SIZE', default=200 * 1024 * 1024
+)
+
+# Rows fetched per server-side cursor round trip when streaming GeoJSON
+POLYGON_STREAM_CHUNK_SIZE = env.int('POLYGON_STREAM_CHUNK_SIZE', default=2000)
+
+# Serve the read endpoints from async views (use with an ASGI server)
+POLYGON_ASYNC_VIEWS = env.bool('POLYGON_ASYNC_VIEWS', default=False)
+
+# Record request latency, sizes and query counts and serve them at /metrics
+POLYGON_METRICS_ENABLED = env.bool('POLYGON_METRICS_ENABLED', default=True)
+
+# Per-request profiles (X-Profile: 1 from staff, X-Profile: <token>, or a
+# random sample) are written here, by default to a directory of this user's
+# own in the temp directory; it must be mode 0700 and is created so.
+# Empty disables profiling
+POLYGON_PROFILE_DIR = env(
+    'POLYGON_PROFILE_DIR',
+    default=os.path.join(tempfile.gettempdir(), f'polygon-profiles-{os.geteuid()}')
+)
+POLYGON_PROFILE_TOKEN = env('POLYGON_PROFILE_TOKEN', default='')
+# Fraction of all requests to profile
+POLYGON_PROFILE_SAMPLE_RATE = env.float('POLYGON_PROFILE_SAMPLE_RATE', default=0.0)
+# Seconds between stack samples of a profiled request
+POLYGON_PROFILE_INTERVAL = env.float('POLYGON_PROFILE_INTERVAL', default=0.005)
+
+# Log requests over their query budget or repeating a statement (N+1)
+POLYGON_QUERY_DEBUG = env.bool('POLYGON_QUERY_DEBUG', default=DEBUG)
+POLYGON_REPEATED_QUERY_THRESHOLD = env.int(
+    'POLYGON_REPEATED_QUERY_THRESHOLD', default=5
+)
+
+# What creates and bulk imports do with a polygon whose geometry is already
+# stored: allow (insert it anyway), reject or merge (answer with the stored
+# one); overridden per request by ?duplicates=
+POLYGON_DUPLICATES = env('POLYGON_DUPLICATES', default='allow')
+# Recently measured geometries whose metrics are reused per process (0 disables)
+POLYGON_METRICS_MEMO_SIZE = env.int('POLYGON_METRICS_MEMO_SIZE', default=10000)
+
+# Changes kept beside the in-memory STRtree before it is rebuilt
+POLYGON_SPATIAL_INDEX_REBUILD_THRESHOLD = env.int(
+    'POLYGON_SPATIAL_INDEX_REBUILD_THRESHOLD', default=1000
+)
+
+# Simplification levels (degrees) precomputed for low-zoom GeoJSON
+POLYGON_SIMPLIFY_TOLERANCES = env.list(
+    'POLYGON_SIMPLIFY_TOLERANCES', cast=float, default=[0.0001, 0.001, 0.01]
+)
+
+# Vector tile cache
+POLYGON_TILE_CACHE = 'tiles'
+POLYGON_TILE_CACHE_TIMEOUT = env.int('POLYGON_TILE_CACHE_TIMEOUT', default=24 * 60 * 60)
+# Beyond this many affected tiles at one zoom, the zoom level is invalidated
+POLYGON_TILE_INVALIDATION_LIMIT = env.int(
+    'POLYGON_TILE_INVALIDATION_LIMIT', default=256
+)
+
+# Rendered GeoJSON response cache
+POLYGON_RESPONSE_CACHE = 'default'
+POLYGON_RESPONSE_CACHE_TIMEOUT = env.int(
+    'POLYGON_RESPONSE_CACHE_TIMEOUT', default=60 * 60
+)
+# Streamed collections larger than this are sent but not cached
+POLYGON_RESPONSE_CACHE_MAX_BYTES = env.int(
+    'POLYGON_RESPONSE_CACHE_MAX_BYTES', default=16 * 1024 * 1024
+)
+# Seconds /stats responses are reused; they may be this stale
+POLYGON_STATS_CACHE_TIMEOUT = env.int('POLYGON_STATS_CACHE_TIMEOUT', default=60)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'polygons': {
+            'handlers': ['console'],
+            'level': env('POLYGON_LOG_LEVEL', default='INFO'),
+        },
+    },
 }
 
 # Google Maps API Key
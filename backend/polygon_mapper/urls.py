@@ -1,10 +1,15 @@
 """
 URL configuration for polygon_mapper project.
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
+from polygons.instrumentation import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('polygons.urls')),
-] 
\ No newline at end of file
+]
+
+if settings.POLYGON_METRICS_ENABLED:
+    urlpatterns.append(path('metrics', metrics_view, name='metrics')) 
\ No newline at end of file
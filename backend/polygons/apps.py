@@ -3,4 +3,12 @@ from django.apps import AppConfig
 
 class PolygonsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'polygons' 
\ No newline at end of file
+    name = 'polygons'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import signals  # noqa: F401
+        from . import instrumentation, profiling, query_budget
+        connection_created.connect(instrumentation.install_query_recorder)
+        connection_created.connect(profiling.install_query_recorder)
+        connection_created.connect(query_budget.install_query_recorder) 
\ No newline at end of file
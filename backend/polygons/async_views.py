@@ -0,0 +1,217 @@
+"""
+Async read endpoints for ASGI deployments.
+
+Enabled with ``POLYGON_ASYNC_VIEWS``.  They answer reads on the same URLs
+and with the same bodies as ``PolygonViewSet`` and hand every other method
+to it.  Django's async ORM still runs each query in a worker thread; what
+changes is that a streamed ``geojson_collection`` is fetched chunk by chunk
+with ``aiterator`` and no thread is held while a slow client reads it.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, HttpResponse
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .db_router import read_database
+from .exports import aiter_export, export_queryset, export_response, parse_after
+from .filters import filter_request, parse_point
+from .geometry import geometry_from_geojson, group_matches, point_array
+from .models import Polygon
+from .pagination import PolygonCursorPagination
+from .renderers import dumps
+from .response_cache import (
+    cached_response, cached_streaming_response, collection_state, expiring_response
+)
+from .serializers import (
+    PolygonSerializer, LIST_FIELDS, list_representations, feature_rows,
+    encode_features
+)
+from .simplify import parse_tolerance
+from .spatial_index import spatial_index
+from .stats import compute_stats, parse_histogram
+from .streaming import aiter_feature_collection
+from .tiles import MAX_ZOOM, get_tile
+from .views import PolygonViewSet
+
+
+def _json_response(data, status=200):
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+
+def _error_response(exc):
+    """The body DRF's default exception handler gives ``exc``."""
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {'detail': exc.detail}
+    return _json_response(data, exc.status_code)
+
+
+def read_view(fallback, methods=('GET', 'HEAD')):
+    """
+    Turn an async handler taking a DRF ``Request`` into a Django view.
+
+    Requests with other methods go to the sync ``fallback`` view, so
+    writes keep their DRF behaviour.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method not in methods:
+                return await sync_to_async(fallback)(request, *args, **kwargs)
+            request = Request(request, parsers=[
+                parser() for parser in api_settings.DEFAULT_PARSER_CLASSES
+            ])
+            try:
+                return await handler(request, *args, **kwargs)
+            except Http404:
+                return _error_response(NotFound())
+            except APIException as exc:
+                return _error_response(exc)
+        # Same as the DRF views; Django 4.2's csrf_exempt cannot wrap
+        # coroutine functions.
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+async def _polygons(request):
+    """``Polygon.objects`` on the database ``request`` should read from."""
+    return Polygon.objects.using(await sync_to_async(read_database)(request))
+
+
+async def _get_polygon(request, pk):
+    try:
+        return await (await _polygons(request)).aget(pk=pk)
+    except (Polygon.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+        raise Http404
+
+
+async def _matching_response(request, ids):
+    polygons = await _polygons(request)
+    rows = [row async for row in polygons.filter(id__in=ids).values(*LIST_FIELDS)]
+    return _json_response({"count": len(ids), "results": list_representations(rows)})
+
+
+@read_view(PolygonViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def polygon_list(request):
+    queryset = filter_request(await _polygons(request), request).values(*LIST_FIELDS)
+    paginator = PolygonCursorPagination()
+
+    def render():
+        page = paginator.paginate_queryset(queryset, request)
+        return paginator.get_paginated_response(list_representations(page)).data
+
+    return _json_response(await sync_to_async(render)())
+
+
+@read_view(PolygonViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy'
+}))
+async def polygon_detail(request, pk):
+    polygon = await _get_polygon(request, pk)
+    return await sync_to_async(cached_response)(
+        request, 'retrieve',
+        (polygon.pk, polygon.updated_at.isoformat()),
+        int(polygon.updated_at.timestamp()),
+        lambda: dumps(PolygonSerializer(polygon).data)
+    )
+
+
+@read_view(PolygonViewSet.as_view({'get': 'geojson'}))
+async def polygon_geojson(request, pk):
+    tolerance = parse_tolerance(request.query_params)
+    polygon = await _get_polygon(request, pk)
+    return await sync_to_async(cached_response)(
+        request, 'geojson',
+        (polygon.pk, polygon.updated_at.isoformat(), tolerance),
+        int(polygon.updated_at.timestamp()),
+        lambda: dumps(polygon.to_geojson(tolerance))
+    )
+
+
+@read_view(PolygonViewSet.as_view({'get': 'geojson_collection'}))
+async def polygon_geojson_collection(request):
+    tolerance = parse_tolerance(request.query_params)
+    queryset = filter_request(await _polygons(request), request)
+    version, last_modified = await sync_to_async(collection_state)()
+    parts = (version, request.get_full_path())
+    paginator = PolygonCursorPagination()
+
+    if paginator.is_requested(request):
+        def render_page():
+            page = paginator.paginate_queryset(
+                feature_rows(queryset, tolerance), request
+            )
+            return paginator.encode_feature_collection(encode_features(page, tolerance))
+
+        return await sync_to_async(cached_response)(
+            request, 'geojson_collection', parts, last_modified, render_page
+        )
+
+    return await sync_to_async(cached_streaming_response)(
+        request, 'geojson_collection', parts, last_modified,
+        lambda: aiter_feature_collection(queryset, tolerance=tolerance)
+    )
+
+
+@read_view(PolygonViewSet.as_view({'get': 'export'}))
+async def polygon_export(request, fmt):
+    queryset = export_queryset(
+        filter_request(await _polygons(request), request),
+        parse_after(request.query_params)
+    )
+    return export_response(fmt, queryset, aiter_export)
+
+
+@read_view(PolygonViewSet.as_view({'get': 'stats'}))
+async def polygon_stats(request):
+    histogram, bins = parse_histogram(request.query_params)
+    queryset = filter_request(await _polygons(request), request)
+    return await sync_to_async(expiring_response)(
+        'stats', (request.get_full_path(),), settings.POLYGON_STATS_CACHE_TIMEOUT,
+        lambda: dumps(compute_stats(queryset, histogram, bins))
+    )
+
+
+@read_view(PolygonViewSet.as_view({'get': 'contains'}))
+async def polygon_contains(request):
+    lng, lat = parse_point(request.query_params)
+    return await _matching_response(
+        request, await sync_to_async(spatial_index.contains)(lng, lat)
+    )
+
+
+@read_view(PolygonViewSet.as_view({'post': 'intersects'}), methods=('POST',))
+async def polygon_intersects(request):
+    geometry = geometry_from_geojson(request.data)
+    return await _matching_response(
+        request, await sync_to_async(spatial_index.intersects)(geometry)
+    )
+
+
+@read_view(PolygonViewSet.as_view({'post': 'locate'}), methods=('POST',))
+async def polygon_locate(request):
+    points = request.data.get('points') if isinstance(request.data, dict) else None
+    coords = point_array(points)
+    point_indices, polygon_ids = await sync_to_async(spatial_index.locate)(coords)
+    return _json_response({
+        "count": len(coords),
+        "results": group_matches(len(coords), point_indices, polygon_ids)
+    })
+
+
+@read_view(PolygonViewSet.as_view({'get': 'tile'}))
+async def polygon_tile(request, z, x, y):
+    if z > MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        raise Http404
+    data, hit = await sync_to_async(get_tile)(await _polygons(request), z, x, y)
+    response = HttpResponse(data, content_type='application/vnd.mapbox-vector-tile')
+    response['X-Tile-Cache'] = 'HIT' if hit else 'MISS'
+    return response
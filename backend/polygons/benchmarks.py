@@ -0,0 +1,299 @@
+"""
+Performance benchmarks for metrics, validation, serialization and the API.
+
+Used by the ``benchmark`` management command.  Every case is a function
+run repeatedly by :func:`measure`; results are keyed by case name and the
+size it ran at, e.g. ``list[rows=100000]``, so runs on different commits
+can be compared with :func:`compare`; :func:`storage_sizes` records the
+bytes each column takes.  The synthetic data and requests
+also drive the query budget tests and ``check_query_budgets``.
+"""
+import platform
+import statistics
+import time
+
+import django
+import numpy as np
+import shapely
+from django.db import connection, transaction
+from django.db.models import Sum, TextField
+from django.db.models.functions import Cast, Length
+from django.test import Client
+
+from . import geodesic
+from .bulk import prepare_items
+from .dedupe import metrics_memo
+from .geometry import unpack_coordinates
+from .models import Polygon
+from .serializers import PolygonSerializer
+
+# Settings overrides making every read reach the (test) primary database.
+# Tile invalidation needs a cache that keeps counters, so only the
+# response cache is switched off.
+ISOLATED_SETTINGS = {
+    'CACHES': {
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        'tiles': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'polygon-benchmark-tiles',
+        },
+    },
+    'POLYGON_RESPONSE_CACHE': 'default',
+    'POLYGON_READ_REPLICAS': [],
+}
+
+
+def synthetic_rings(count, vertices, seed=0, size=0.01):
+    """
+    ``count`` random valid rings of ``vertices`` distinct points each.
+
+    Rings are star-shaped around a random centre (vertices at increasing
+    angles), so they never self-intersect.  The radius wobbles smoothly
+    between about half and all of ``size`` degrees, with a little
+    per-vertex noise, so edges stay short like those of real outlines.
+    """
+    rng = np.random.default_rng(seed)
+    centers = np.column_stack([
+        rng.uniform(-170, 170, count), rng.uniform(-60, 60, count)
+    ])
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    harmonics = np.arange(1, 6)
+    amplitudes = rng.uniform(0, 0.1, (count, len(harmonics)))
+    phases = rng.uniform(0, 2 * np.pi, (count, len(harmonics)))
+    wobble = np.einsum(
+        'ch,cvh->cv', amplitudes,
+        np.sin(angles[:, None] * harmonics + phases[:, None, :])
+    )
+    noise = rng.uniform(-0.01, 0.01, (count, vertices))
+    radii = size * (0.75 + wobble + noise)
+    rings = np.stack([
+        centers[:, :1] + radii * np.cos(angles),
+        centers[:, 1:] + radii * np.sin(angles),
+    ], axis=-1)
+    rings = np.concatenate([rings, rings[:, :1]], axis=1)
+    return rings.round(9).tolist()
+
+
+def populate(rows, vertices, chunk_size=2000, seed=0):
+    """Insert synthetic polygons until the table holds ``rows`` of them."""
+    existing = Polygon.objects.count()
+    for start in range(existing, rows, chunk_size):
+        count = min(chunk_size, rows - start)
+        rings = synthetic_rings(count, vertices, seed=seed + start)
+        polygons = prepare_items(
+            (index, {'name': f"synthetic {index}", 'coordinates': ring})
+            for index, ring in enumerate(rings, start)
+        )[0]
+        with transaction.atomic():
+            Polygon.objects.bulk_create(polygons)
+
+
+def budget_requests(polygon_ids):
+    """
+    ``(method, path, body)`` exercising every route in ``QUERY_BUDGETS``,
+    given the ids of three stored polygons.  The second is replaced and
+    edited, the third deleted.
+    """
+    ring, other_ring = synthetic_rings(2, 20, seed=1)
+    polygon = {'name': 'budget', 'coordinates': ring}
+    other = {'name': 'budget', 'coordinates': other_ring}
+    first, second, doomed = polygon_ids
+    lng, lat = Polygon.objects.values_list('centroid_lng', 'centroid_lat').get(pk=first)
+    # Edits of ``second`` once it holds ``ring``, which is star-shaped
+    centre = [sum(values) / len(values) for values in zip(*ring[:-1])]
+    edits = {'operations': [
+        {'op': 'insert', 'index': 1,
+         'point': [(a + b) / 2 for a, b in zip(ring[0], ring[1])]},
+        {'op': 'move', 'index': 0,
+         'point': [(a + b) / 2 for a, b in zip(ring[0], centre)]},
+        {'op': 'delete', 'index': 5},
+    ]}
+    return [
+        ('GET', '/api/polygons/', None),
+        ('GET', '/api/polygons/?bbox=-180,-90,180,90&page_size=10', None),
+        ('POST', '/api/polygons/', polygon),
+        ('POST', '/api/polygons/?duplicates=merge', polygon),
+        ('POST', '/api/polygons/?duplicates=reject', other),
+        ('GET', f'/api/polygons/{first}/', None),
+        ('PUT', f'/api/polygons/{second}/', polygon),
+        ('PATCH', f'/api/polygons/{second}/', {'name': 'renamed'}),
+        ('PATCH', f'/api/polygons/{second}/vertices/', edits),
+        ('DELETE', f'/api/polygons/{doomed}/', None),
+        ('GET', f'/api/polygons/{first}/geojson/', None),
+        ('GET', f'/api/polygons/{first}/geojson/?zoom=3', None),
+        ('GET', '/api/polygons/geojson_collection/', None),
+        ('GET', '/api/polygons/geojson_collection/?page_size=5', None),
+        ('GET', '/api/polygons/export/ndjson/', None),
+        ('GET', '/api/polygons/export/csv/?created_after=2000-01-01', None),
+        ('GET', f'/api/polygons/export/fgb/?after={first}', None),
+        ('GET', '/api/polygons/stats/', None),
+        ('GET', '/api/polygons/stats/?histogram=area&bins=5', None),
+        ('GET', '/api/polygons/stats/?histogram=day&bbox=-180,-90,180,90', None),
+        ('POST', '/api/polygons/bulk/', [polygon] * 3),
+        ('POST', '/api/polygons/bulk/?duplicates=merge', [polygon, other] * 2),
+        ('GET', f'/api/polygons/contains/?lng={lng}&lat={lat}', None),
+        ('POST', '/api/polygons/intersects/',
+         {'type': 'Polygon', 'coordinates': [ring]}),
+        ('POST', '/api/polygons/locate/', {'points': [[lng, lat], [0, 0]]}),
+        ('GET', '/api/polygons/tiles/0/0/0.mvt', None),
+    ]
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """
+    Time ``func`` like ``timeit``: calls are batched until a batch takes at
+    least ``min_time`` seconds, then ``repeat`` batches are timed.
+
+    Returns seconds per call as ``{'median', 'min', 'calls'}``.
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1 << 16:
+            break
+        number *= 2 if elapsed * 4 >= min_time else 10
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number)
+    return {
+        'median': statistics.median(timings), 'min': min(timings),
+        'calls': number * repeat
+    }
+
+
+def vertex_cases(vertices):
+    """Cases whose cost depends on the size of one polygon."""
+    ring = synthetic_rings(1, vertices, seed=vertices)[0]
+    client = Client()
+    body = {'name': 'benchmark', 'coordinates': ring}
+
+    # Each case measures one ring over and over; all but the *_memoized
+    # ones forget it first, as for a polygon never seen before.
+    def metrics_memoized():
+        Polygon(coordinates=ring).calculate_metrics()
+
+    def metrics():
+        metrics_memo.clear()
+        metrics_memoized()
+
+    def validation_memoized():
+        if not len(metrics_memo):
+            metrics_memoized()
+        if not PolygonSerializer(data=body).is_valid():
+            raise AssertionError("synthetic polygon failed validation")
+
+    def validation():
+        metrics_memo.clear()
+        validation_memoized()
+
+    def create():
+        metrics_memo.clear()
+        response = client.post('/api/polygons/', body, content_type='application/json')
+        if response.status_code != 201:
+            raise AssertionError(f"create returned {response.status_code}")
+
+    # Moves one vertex of a stored copy halfway to the centre and back.
+    centre = np.mean(ring[:-1], axis=0)
+    points = [((np.array(ring[1]) + centre) / 2).tolist(), ring[1]]
+    edited = {}
+
+    def vertex_edit():
+        if not edited:
+            response = client.post(
+                '/api/polygons/', body, content_type='application/json'
+            )
+            edited.update(id=response.json()['id'], moves=0)
+        point = points[edited['moves'] % 2]
+        edited['moves'] += 1
+        response = client.patch(
+            f"/api/polygons/{edited['id']}/vertices/",
+            {'operations': [{'op': 'move', 'index': 1, 'point': point}]},
+            content_type='application/json'
+        )
+        if response.status_code != 200:
+            raise AssertionError(f"vertex edit returned {response.status_code}")
+
+    return {
+        'metrics': metrics, 'metrics_memoized': metrics_memoized,
+        'validation': validation, 'validation_memoized': validation_memoized,
+        'create': create, 'vertex_edit': vertex_edit,
+    }
+
+
+def row_cases():
+    """Cases whose cost depends on the number of stored polygons."""
+    client = Client()
+
+    def get(path):
+        response = client.get(path)
+        if response.status_code != 200:
+            raise AssertionError(f"{path} returned {response.status_code}")
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    # Every stored ring read and decoded to an array, as the spatial index
+    # and exports read them, from the packed and from the JSON column.
+    def rings_packed():
+        rows = Polygon.objects.order_by().values_list('coordinates_packed', flat=True)
+        for data in rows.iterator(chunk_size=2000):
+            unpack_coordinates(data)
+
+    def rings_json():
+        rows = Polygon.objects.order_by().values_list('coordinates', flat=True)
+        for coordinates in rows.iterator(chunk_size=2000):
+            geodesic.as_ring_array(coordinates)
+
+    return {
+        'list': lambda: get('/api/polygons/'),
+        'list_page_1000': lambda: get('/api/polygons/?page_size=1000'),
+        'geojson_collection': lambda: get('/api/polygons/geojson_collection/'),
+        'rings_packed': rings_packed,
+        'rings_json': rings_json,
+    }
+
+
+def storage_sizes():
+    """Bytes stored in the packed and the JSON coordinate columns."""
+    return Polygon.objects.aggregate(
+        coordinates_packed=Sum(Length('coordinates_packed')),
+        coordinates=Sum(Length(Cast('coordinates', TextField()))),
+    )
+
+
+def environment():
+    """What the numbers were measured on."""
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'numpy': np.__version__,
+        'shapely': shapely.__version__,
+        'database': connection.vendor,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    ``(name, baseline, current, ratio, regressed)`` for cases in both runs.
+
+    Ratios are of median seconds per call; a ratio above ``1 + threshold``
+    counts as a regression.
+    """
+    rows = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before:
+            ratio = result['median'] / before['median']
+            rows.append((
+                name, before['median'], result['median'], ratio, ratio > 1 + threshold
+            ))
+    return rows
@@ -0,0 +1,222 @@
+"""
+Batch ingest of many polygons in a single request.
+"""
+import numpy as np
+import shapely
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from . import geodesic
+from .dedupe import Metrics, metrics_memo, ring_hash, stored_duplicates
+from .geometry import pack_coordinates, rings_to_polygons
+from .instrumentation import BULK_CHUNK, timed
+from .models import Polygon
+from .serializers import check_ring
+from .simplify import simplified_levels
+from .signals import polygons_saved
+
+
+def parse_items(payload):
+    """Return the raw items of a list payload or a GeoJSON FeatureCollection."""
+    if isinstance(payload, dict) and payload.get('type') == 'FeatureCollection':
+        payload = payload.get('features')
+    if not isinstance(payload, list):
+        raise serializers.ValidationError(
+            "Expected a list of polygons or a GeoJSON FeatureCollection"
+        )
+    return payload
+
+
+def normalize_item(item):
+    """
+    Return ``(name, ring)`` for a ``{name, coordinates}`` item or a Feature.
+
+    Raises ``ValidationError`` with serializer-style field errors.
+    """
+    if not isinstance(item, dict):
+        raise serializers.ValidationError("Each item must be an object")
+
+    if item.get('type') == 'Feature':
+        geometry = item.get('geometry') or {}
+        if geometry.get('type') != 'Polygon':
+            raise serializers.ValidationError(
+                {'geometry': ["Feature geometry must be a Polygon"]}
+            )
+        rings = geometry.get('coordinates')
+        if not isinstance(rings, list) or not rings:
+            raise serializers.ValidationError(
+                {'coordinates': ["Polygon geometry must contain an exterior ring"]}
+            )
+        if len(rings) > 1:
+            raise serializers.ValidationError(
+                {'coordinates': ["Polygons with holes are not supported"]}
+            )
+        ring = rings[0]
+        name = (item.get('properties') or {}).get('name') or ''
+    else:
+        ring = item.get('coordinates')
+        name = item.get('name') or ''
+
+    if not isinstance(name, str) or len(name) > 255:
+        raise serializers.ValidationError(
+            {'name': ["Name must be a string of at most 255 characters"]}
+        )
+    try:
+        check_ring(ring)
+    except serializers.ValidationError as e:
+        raise serializers.ValidationError({'coordinates': e.detail})
+    return name, ring
+
+
+def _measure(rings):
+    """``(valid, metrics)`` for each ring, with one vectorized Shapely pass."""
+    geometries, coords, offsets = rings_to_polygons(rings)
+    valid = shapely.is_valid(geometries)
+    excess, longitude, perimeters = geodesic.packed_sums(coords, offsets)
+    areas = geodesic.areas_from_sums(excess, longitude)
+    bounds = shapely.bounds(geometries)
+    centroids = shapely.centroid(geometries)
+    centroids = np.column_stack([shapely.get_x(centroids), shapely.get_y(centroids)])
+    levels = simplified_levels(geometries)
+    return [
+        (is_valid, Metrics(
+            area, sums[2], tuple(bbox), tuple(centroid), simplified, sums
+        ))
+        for is_valid, area, sums, bbox, centroid, simplified in zip(
+            valid.tolist(), areas.tolist(),
+            zip(excess.tolist(), longitude.tolist(), perimeters.tolist()),
+            bounds.tolist(), centroids.tolist(), levels
+        )
+    ]
+
+
+@timed(BULK_CHUNK)
+def _build_chunk(chunk):
+    """
+    Validate geometry and compute metrics for ``(index, name, ring)`` tuples.
+
+    Rings in the metrics memo are not measured again.  Returns
+    ``(polygons, indices, errors)`` where ``errors`` maps item index to
+    field errors.
+    """
+    hashes = [ring_hash(ring) for _, _, ring in chunk]
+    known = [metrics_memo.get(key, ring) for key, (_, _, ring) in zip(hashes, chunk)]
+    misses = [position for position, metrics in enumerate(known) if metrics is None]
+    invalid = set()
+    if misses:
+        measured = _measure([chunk[position][2] for position in misses])
+        for position, (is_valid, metrics) in zip(misses, measured):
+            if is_valid:
+                known[position] = metrics
+                metrics_memo.put(hashes[position], chunk[position][2], metrics)
+            else:
+                invalid.add(position)
+
+    polygons, indices, errors = [], [], {}
+    rows = enumerate(zip(chunk, hashes, known))
+    for position, ((index, name, ring), key, metrics) in rows:
+        if position in invalid:
+            errors[index] = {'coordinates': ["Invalid polygon geometry"]}
+            continue
+        polygon = Polygon(
+            name=name, coordinates=ring, coordinates_packed=pack_coordinates(ring),
+            geometry_hash=key
+        )
+        polygon.apply_metrics(metrics)
+        polygons.append(polygon)
+        indices.append(index)
+    return polygons, indices, errors
+
+
+def prepare_items(indexed_items):
+    """
+    Validate and measure raw ``(index, item)`` pairs without saving them.
+
+    Returns ``(polygons, indices, errors)``: unsaved ``Polygon`` instances,
+    the index of each, and the field errors of each rejected item by index.
+    """
+    pending, errors = [], {}
+    for index, item in indexed_items:
+        try:
+            name, ring = normalize_item(item)
+        except serializers.ValidationError as e:
+            errors[index] = e.detail
+        else:
+            pending.append((index, name, ring))
+    if not pending:
+        return [], [], errors
+    polygons, indices, invalid = _build_chunk(pending)
+    errors.update(invalid)
+    return polygons, indices, errors
+
+
+def split_duplicates(polygons, indices, seen):
+    """
+    Separate the ``polygons`` repeating a stored or an earlier geometry.
+
+    ``seen`` maps geometry hashes to the first ``Polygon`` with each, stored
+    or about to be, and is updated.  Returns ``(polygons, indices,
+    duplicates)``: the new polygons with their indices, and ``(index,
+    original)`` pairs for the others.  Originals that are new polygons
+    get their ids when those are inserted.
+    """
+    unknown = {polygon.geometry_hash for polygon in polygons} - seen.keys()
+    if unknown:
+        stored = stored_duplicates(Polygon.objects.all(), unknown)
+        for key, polygon_id in stored.items():
+            seen[key] = Polygon(id=polygon_id, geometry_hash=key)
+    new, new_indices, duplicates = [], [], []
+    for polygon, index in zip(polygons, indices):
+        original = seen.setdefault(polygon.geometry_hash, polygon)
+        if original is polygon:
+            new.append(polygon)
+            new_indices.append(index)
+        else:
+            duplicates.append((index, original))
+    return new, new_indices, duplicates
+
+
+def duplicate_result(index, original_id, policy):
+    """The result of a duplicate item under the ``reject`` or ``merge`` policy."""
+    if policy == 'merge':
+        return {'index': index, 'id': original_id, 'duplicate': True}
+    return {
+        'index': index,
+        'errors': {'coordinates': [f"Duplicates polygon {original_id}"]},
+        'duplicate_of': original_id,
+    }
+
+
+def bulk_create_polygons(items, chunk_size=None, duplicates='allow'):
+    """
+    Validate, measure and insert ``items`` in chunks.
+
+    Each chunk is written with one ``bulk_create`` inside its own
+    transaction.  Returns one result per item, in order: ``{'index', 'id'}``
+    on success or ``{'index', 'errors'}`` on failure.  Unless the
+    ``duplicates`` policy is ``allow``, items repeating a stored polygon or
+    an earlier item are not inserted; see :func:`duplicate_result`.
+    """
+    chunk_size = chunk_size or settings.POLYGON_BULK_CHUNK_SIZE
+    results = [None] * len(items)
+    seen = {}
+    for start in range(0, len(items), chunk_size):
+        polygons, indices, errors = prepare_items(
+            enumerate(items[start:start + chunk_size], start)
+        )
+        for index, error in errors.items():
+            results[index] = {'index': index, 'errors': error}
+        repeated = []
+        if duplicates != 'allow' and polygons:
+            polygons, indices, repeated = split_duplicates(polygons, indices, seen)
+        if polygons:
+            with transaction.atomic():
+                Polygon.objects.bulk_create(polygons)
+            # bulk_create sends no post_save signals.
+            polygons_saved(polygons)
+        for index, polygon in zip(indices, polygons):
+            results[index] = {'index': index, 'id': polygon.id}
+        for index, original in repeated:
+            results[index] = duplicate_result(index, original.id, duplicates)
+    return results
@@ -0,0 +1,82 @@
+"""
+Primary/replica database routing.
+
+Everything reads and writes the ``default`` (primary) database unless a
+view asks :func:`read_database` for a read alias and pins its queryset to
+it with ``.using()``; ``PolygonViewSet`` does so for its read actions.
+Pinning (rather than routing lazily) keeps a streamed collection on the
+database its request chose.
+
+A request reads from the primary instead of a replica when
+
+* its client wrote within ``POLYGON_REPLICA_LAG`` seconds (a cookie set
+  on write responses), so it sees its own writes;
+* anyone wrote within that window (the collection's last-modified time),
+  so lagging replicas cannot fill the shared response cache with rows
+  older than its version says; or
+* the replica could not be connected to recently.
+"""
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from .response_cache import collection_state
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'polygon_primary'
+# Seconds a replica that failed to connect is skipped for
+_RETRY_AFTER = 30
+_down_until = {}
+
+
+class PrimaryReplicaRouter:
+    """Sends all routed traffic to the primary; replicas are read-only."""
+
+    def db_for_read(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.POLYGON_READ_REPLICAS
+
+
+def _healthy(alias):
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except OperationalError:
+        logger.warning("Read replica %s is unreachable, using the primary", alias)
+        _down_until[alias] = time.monotonic() + _RETRY_AFTER
+        return False
+    return True
+
+
+def read_database(request):
+    """The database alias a read-only ``request`` should query."""
+    replicas = settings.POLYGON_READ_REPLICAS
+    if not replicas or request.COOKIES.get(STICKY_COOKIE):
+        return DEFAULT_DB_ALIAS
+    last_modified = collection_state()[1]
+    if last_modified and time.time() - last_modified < settings.POLYGON_REPLICA_LAG:
+        return DEFAULT_DB_ALIAS
+    alias = random.choice(replicas)
+    return alias if _healthy(alias) else DEFAULT_DB_ALIAS
+
+
+def stick_to_primary(response):
+    """Mark ``response``'s client to read from the primary for a while."""
+    if settings.POLYGON_READ_REPLICAS:
+        response.set_cookie(
+            STICKY_COOKIE, '1', max_age=settings.POLYGON_REPLICA_LAG, samesite='Lax'
+        )
+    return response
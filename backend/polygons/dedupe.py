@@ -0,0 +1,172 @@
+"""
+Geometry content hashes, for recognising re-submitted polygons.
+
+:func:`ring_hash` digests a ring after normalizing away what does not
+change the shape: the closing point, repeated consecutive points, the
+winding direction, the starting vertex and the sign of zero.  Equal hashes
+mean the same float64 vertices in the same cyclic order.
+
+``metrics_memo`` keeps the metrics of recently measured geometries by hash,
+so a polygon seen before skips Shapely validation, geodesic measurement
+and simplification.  What depends on the ring's direction and start (the
+signed edge sums, the simplified rings) is turned to follow the ring
+asking.
+
+``POLYGON_DUPLICATES`` (or ``?duplicates=``) decides whether a polygon
+matching a stored one is created anyway, rejected, or answered with the
+stored one.  Matching is best effort: there is no unique constraint, so
+concurrent identical requests can both create a polygon.
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from . import geodesic
+
+DUPLICATE_POLICIES = ('allow', 'reject', 'merge')
+
+# What calculate_metrics derives from a ring; bounds, centroid and the
+# geodesic edge sums are tuples.
+Metrics = namedtuple(
+    'Metrics', ['area', 'perimeter', 'bounds', 'centroid', 'simplified', 'sums']
+)
+
+
+def _open_ring(ring):
+    """``ring`` as float64 without repeated points, closure or negative zeros."""
+    # Adding zero turns -0.0 into 0.0.
+    coords = np.asarray(ring, dtype=np.float64) + 0.0
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = (coords[1:] != coords[:-1]).any(axis=1)
+    coords = coords[keep]
+    while len(coords) > 1 and (coords[0] == coords[-1]).all():
+        coords = coords[:-1]
+    return coords
+
+
+def _orientation(coords):
+    """1 for a counter-clockwise open ring, -1 for clockwise, 0 if flat."""
+    if len(coords) < 3:
+        return 0
+    # fsum of the shoelace terms is exact, so the sign does not depend on
+    # where the ring starts.
+    centred = coords - coords.min(axis=0)
+    following = np.roll(centred, -1, axis=0)
+    terms = centred[:, 0] * following[:, 1] - following[:, 0] * centred[:, 1]
+    return int(np.sign(math.fsum(terms.tolist())))
+
+
+def ring_hash(ring):
+    """Hex digest of a ``(n, 2)`` ring that ignores start, direction and closure."""
+    coords = _open_ring(ring)
+    if _orientation(coords) < 0:
+        coords = coords[::-1]
+    if len(coords):
+        first = int(np.lexsort((coords[:, 1], coords[:, 0]))[0])
+        coords = np.roll(coords, -first, axis=0)
+    data = np.ascontiguousarray(coords, dtype='<f8').tobytes()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _turned(metrics, orientation, start, coords):
+    """
+    ``metrics`` of a ring with ``orientation`` and first vertex ``start``,
+    made to fit the same shape given as the open ring ``coords``.
+
+    Reversing a ring negates each edge's excess and longitude step, so the
+    signed edge sums change sign with the direction.  Simplified rings keep
+    a subset of the ring's vertices; they are turned to run in the
+    direction of ``coords`` from the vertex it reaches first.
+    """
+    flip = _orientation(coords) != orientation
+    if not flip and coords[0].tolist() == start:
+        return metrics
+    sums = metrics.sums
+    if flip:
+        sums = (-sums[0], -sums[1], sums[2])
+    order = {point: index for index, point in enumerate(map(tuple, coords.tolist()))}
+    simplified = {}
+    for key, level in metrics.simplified.items():
+        level = level[-2::-1] if flip else level[:-1]
+        positions = [order.get(tuple(point), len(order)) for point in level]
+        position = positions.index(min(positions))
+        simplified[key] = level[position:] + level[:position + 1]
+    return metrics._replace(sums=sums, simplified=simplified)
+
+
+class MetricsMemo:
+    """
+    Least recently used ``{hash: Metrics}`` map of at most
+    ``POLYGON_METRICS_MEMO_SIZE`` entries (0 disables it), per process.
+
+    Only geometries that passed validation are stored.  Entries are keyed
+    by ``geodesic.METRICS_VERSION`` and the simplification tolerances too,
+    so one is only reused under the formula and settings it was measured
+    with; ``recompute_metrics`` also clears the memo of its own process.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(key):
+        return (
+            geodesic.METRICS_VERSION, tuple(settings.POLYGON_SIMPLIFY_TOLERANCES), key
+        )
+
+    def get(self, key, ring):
+        """The metrics memoized under ``key``, fitted to ``ring``, or None."""
+        key = self._key(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        return _turned(*entry, _open_ring(ring))
+
+    def put(self, key, ring, metrics):
+        """Memoize ``metrics``, measured from ``ring``, under ``key``."""
+        coords = _open_ring(ring)
+        entry = (metrics, _orientation(coords), coords[0].tolist())
+        key = self._key(key)
+        size = settings.POLYGON_METRICS_MEMO_SIZE
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+metrics_memo = MetricsMemo()
+
+
+def parse_duplicates(query_params):
+    """The duplicate policy from ``?duplicates=``, else ``POLYGON_DUPLICATES``."""
+    policy = query_params.get('duplicates') or settings.POLYGON_DUPLICATES
+    if policy not in DUPLICATE_POLICIES:
+        raise ValidationError(
+            {'duplicates': ["duplicates must be allow, reject or merge"]}
+        )
+    return policy
+
+
+def stored_duplicates(queryset, hashes):
+    """``{hash: id}`` of the oldest polygon in ``queryset`` with each of ``hashes``."""
+    rows = queryset.filter(geometry_hash__in=list(hashes)).order_by('-id').values_list(
+        'geometry_hash', 'id'
+    )
+    # Later (smaller) ids overwrite larger ones.
+    return dict(rows)
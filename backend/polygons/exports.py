@@ -0,0 +1,294 @@
+"""
+Streamed polygon exports as NDJSON, CSV and FlatGeobuf.
+
+Rows are read in id order with ``QuerySet.iterator`` (``aiterator`` in
+async views) and encoded one chunk at a time, so NDJSON and CSV exports
+run in constant memory however many polygons they cover.  An interrupted
+export resumes with ``?after=<last id received>``.
+
+FlatGeobuf's spatial index precedes the features and fixes their order,
+so that export spools encoded features to a temporary file and keeps only
+each feature's bounds and size in memory (about 40 bytes a polygon) until
+all rows have been read; it then sends the header and index, followed by
+the features read back in index order.
+"""
+import csv
+import io
+import tempfile
+from array import array
+
+import numpy as np
+import shapely
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+
+from . import flatgeobuf
+from .geometry import rings_to_polygons
+from .models import stored_ring, unpacked_coordinates
+from .serializers import encode_features, feature_rows
+
+PROPERTY_FIELDS = (
+    'id', 'name', 'area_sq_meters', 'perimeter_meters', 'created_at', 'updated_at'
+)
+BOUNDS_FIELDS = ('min_lng', 'min_lat', 'max_lng', 'max_lat')
+# Rows without coordinates_packed carry their JSON coordinates under this key
+UNPACKED = 'unpacked_coordinates'
+# Bytes of spooled features sent per chunk of a FlatGeobuf export
+_SEND_SIZE = 256 * 1024
+
+
+def parse_after(query_params):
+    """The ``after`` id cursor of an export, or None."""
+    value = query_params.get('after')
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({'after': ["after must be a polygon id"]})
+
+
+def export_queryset(queryset, after=None):
+    """``queryset`` in export order, starting after polygon id ``after``."""
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    return queryset.order_by('id')
+
+
+def with_rings(rows):
+    """``(row, ring)`` pairs of ``rows``, skipping rows with no readable ring."""
+    pairs = (
+        (row, stored_ring(row['id'], row['coordinates_packed'], row[UNPACKED]))
+        for row in rows
+    )
+    return [(row, ring) for row, ring in pairs if ring is not None]
+
+
+def closed_ring(ring):
+    """``ring`` with its first point repeated at the end if it is not already."""
+    if (ring[0] == ring[-1]).all():
+        return ring
+    return np.vstack((ring, ring[:1]))
+
+
+class NDJSONExport:
+    """One GeoJSON Feature per line, as ``geojson_collection`` writes them."""
+    content_type = 'application/x-ndjson'
+    extension = 'ndjson'
+
+    def rows(self, queryset):
+        return feature_rows(queryset)
+
+    def start(self):
+        return []
+
+    def write(self, rows):
+        return [b'\n'.join(encode_features(rows)) + b'\n']
+
+    def finish(self):
+        return []
+
+
+class CSVExport:
+    """The feature properties plus the geometry as WKT in a ``wkt`` column."""
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def rows(self, queryset):
+        return queryset.values(
+            *PROPERTY_FIELDS, 'coordinates_packed', **{UNPACKED: unpacked_coordinates()}
+        )
+
+    def _encode(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode('utf-8')
+
+    def start(self):
+        return [self._encode([PROPERTY_FIELDS + ('wkt',)])]
+
+    def write(self, rows):
+        pairs = with_rings(rows)
+        rows, rings = [row for row, _ in pairs], [ring for _, ring in pairs]
+        # GEOS writes the shortest text that reads back to the same doubles.
+        wkt = shapely.to_wkt(rings_to_polygons(rings)[0], rounding_precision=-1)
+        return [self._encode(
+            (
+                row['id'], row['name'], row['area_sq_meters'], row['perimeter_meters'],
+                row['created_at'].isoformat(), row['updated_at'].isoformat(), text
+            )
+            for row, text in zip(rows, wkt.tolist())
+        )]
+
+    def finish(self):
+        return []
+
+
+def _starts(sizes):
+    """Offsets of consecutive blocks of ``sizes`` bytes."""
+    starts = np.zeros(len(sizes), dtype=np.uint64)
+    np.cumsum(sizes[:-1], out=starts[1:])
+    return starts
+
+
+class FlatGeobufExport:
+    """FlatGeobuf with a packed Hilbert R-tree index."""
+    content_type = 'application/flatgeobuf'
+    extension = 'fgb'
+    columns = (
+        ('id', flatgeobuf.LONG, False),
+        ('name', flatgeobuf.STRING, False),
+        ('area_sq_meters', flatgeobuf.DOUBLE, False),
+        ('perimeter_meters', flatgeobuf.DOUBLE, False),
+        ('created_at', flatgeobuf.DATETIME, False),
+        ('updated_at', flatgeobuf.DATETIME, False),
+    )
+
+    def rows(self, queryset):
+        return queryset.values(
+            *PROPERTY_FIELDS, 'coordinates_packed', *BOUNDS_FIELDS,
+            **{UNPACKED: unpacked_coordinates()}
+        )
+
+    def start(self):
+        self.spool = tempfile.TemporaryFile()
+        self.bounds = array('d')
+        self.sizes = array('Q')
+        return []
+
+    def write(self, rows):
+        encoded = []
+        for row, ring in with_rings(rows):
+            encoded.append(flatgeobuf.feature(
+                closed_ring(ring),
+                flatgeobuf.properties([
+                    (flatgeobuf.LONG, row['id']),
+                    (flatgeobuf.STRING, row['name']),
+                    (flatgeobuf.DOUBLE, float(row['area_sq_meters'])),
+                    (flatgeobuf.DOUBLE, float(row['perimeter_meters'])),
+                    (
+                        flatgeobuf.DATETIME,
+                        flatgeobuf.datetime_string(row['created_at'])
+                    ),
+                    (
+                        flatgeobuf.DATETIME,
+                        flatgeobuf.datetime_string(row['updated_at'])
+                    ),
+                ])
+            ))
+            if row['min_lng'] is None:
+                self.bounds.extend((*ring.min(axis=0), *ring.max(axis=0)))
+            else:
+                self.bounds.extend(row[field] for field in BOUNDS_FIELDS)
+        self.sizes.extend(len(data) for data in encoded)
+        self.spool.write(b''.join(encoded))
+        return []
+
+    def finish(self):
+        try:
+            yield from self._finish()
+        finally:
+            self.spool.close()
+
+    def _finish(self):
+        bounds = np.frombuffer(self.bounds, dtype=np.float64).reshape(-1, 4)
+        sizes = np.frombuffer(self.sizes, dtype=np.uint64)
+        count = len(sizes)
+        if not count:
+            yield flatgeobuf.MAGIC + flatgeobuf.header(
+                'polygons', self.columns, 0, None, node_size=0
+            )
+            return
+
+        envelope = (
+            bounds[:, 0].min(), bounds[:, 1].min(),
+            bounds[:, 2].max(), bounds[:, 3].max(),
+        )
+        order = flatgeobuf.hilbert_order(bounds, envelope)
+        sorted_sizes = sizes[order]
+        spooled_at = _starts(sizes)[order]
+        offsets = _starts(sorted_sizes)
+
+        yield flatgeobuf.MAGIC + flatgeobuf.header(
+            'polygons', self.columns, count, envelope
+        )
+        index = memoryview(flatgeobuf.packed_rtree(bounds[order], offsets))
+        for start in range(0, len(index), _SEND_SIZE):
+            yield bytes(index[start:start + _SEND_SIZE])
+
+        chunk = []
+        chunk_size = 0
+        for position, size in zip(spooled_at.tolist(), sorted_sizes.tolist()):
+            self.spool.seek(position)
+            chunk.append(self.spool.read(size))
+            chunk_size += size
+            if chunk_size >= _SEND_SIZE:
+                yield b''.join(chunk)
+                chunk = []
+                chunk_size = 0
+        if chunk:
+            yield b''.join(chunk)
+
+
+EXPORT_FORMATS = {
+    'ndjson': NDJSONExport,
+    'csv': CSVExport,
+    'fgb': FlatGeobufExport,
+}
+
+
+def iter_export(export, queryset, chunk_size=None):
+    """Yield ``queryset`` encoded by ``export`` as byte chunks."""
+    chunk_size = chunk_size or settings.POLYGON_STREAM_CHUNK_SIZE
+    rows = export.rows(queryset).iterator(chunk_size=chunk_size)
+    yield from export.start()
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from export.write(chunk)
+            chunk = []
+    if chunk:
+        yield from export.write(chunk)
+    yield from export.finish()
+
+
+async def aiter_export(export, queryset, chunk_size=None):
+    """
+    Async :func:`iter_export` for ASGI views.
+
+    Rows are read with ``QuerySet.aiterator``; a FlatGeobuf export's
+    spooled features are read back in a worker thread.
+    """
+    chunk_size = chunk_size or settings.POLYGON_STREAM_CHUNK_SIZE
+    rows = export.rows(queryset).aiterator(chunk_size=chunk_size)
+    for part in export.start():
+        yield part
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            for part in export.write(chunk):
+                yield part
+            chunk = []
+    if chunk:
+        for part in export.write(chunk):
+            yield part
+    parts = iter(export.finish())
+    read = sync_to_async(next, thread_sensitive=False)
+    while (part := await read(parts, None)) is not None:
+        yield part
+
+
+def export_response(fmt, queryset, iterate=iter_export):
+    """A streamed download of ``queryset`` in format ``fmt``."""
+    export = EXPORT_FORMATS[fmt]()
+    response = StreamingHttpResponse(
+        iterate(export, queryset), content_type=export.content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="polygons.{export.extension}"'
+    )
+    return response
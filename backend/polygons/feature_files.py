@@ -0,0 +1,89 @@
+"""
+Incremental readers for large GeoJSON and NDJSON feature files.
+
+Both readers take a binary file and yield ``(text, end_offset)`` for each
+feature: the feature's undecoded JSON text and the byte offset just past
+it.  Passing a previously yielded offset back in resumes reading from the
+next feature without rescanning the file.
+"""
+import codecs
+import json
+import re
+
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl', '.geojsonl', '.geojsons')
+
+_FEATURES_START = re.compile(r'"features"\s*:\s*\[')
+_SEPARATOR = re.compile(r'[\s,]*')
+# Longer than any number or literal a cut-off feature can end with.
+_TOKEN_MARGIN = 64
+
+
+class FeatureFileError(ValueError):
+    """The file cannot be read as a stream of features."""
+
+
+def iter_ndjson(source, offset=0):
+    """Features of a newline-delimited file, one JSON value per line."""
+    source.seek(offset)
+    for line in source:
+        offset += len(line)
+        if line.strip():
+            yield line.decode('utf-8'), offset
+
+
+def iter_feature_collection(source, offset=0, block_size=1 << 20):
+    """
+    Elements of the ``features`` array of a GeoJSON FeatureCollection.
+
+    Only enough of the file to hold the current feature is kept in memory.
+    Elements are framed with ``json.JSONDecoder.raw_decode``; a feature
+    that does not fit in the buffer grows it until it does.
+    """
+    decoder = json.JSONDecoder()
+    decode = codecs.getincrementaldecoder('utf-8')().decode
+    source.seek(offset)
+    text, pos, eof = '', 0, False
+
+    def read(size):
+        nonlocal text, pos, eof
+        block = source.read(size)
+        eof = not block
+        text = text[pos:] + decode(block, final=eof)
+        pos = 0
+
+    if not offset:
+        while True:
+            match = _FEATURES_START.search(text)
+            if match:
+                offset += len(text[:match.end()].encode('utf-8'))
+                pos = match.end()
+                break
+            if eof:
+                raise FeatureFileError("No FeatureCollection 'features' array found")
+            read(block_size)
+
+    while True:
+        start = _SEPARATOR.match(text, pos).end()
+        if start == len(text):
+            if eof:
+                raise FeatureFileError("File ends inside the 'features' array")
+            read(block_size)
+            continue
+        if text[start] == ']':
+            return
+        try:
+            end = decoder.raw_decode(text, start)[1]
+        except json.JSONDecodeError as e:
+            # A feature cut off by the end of the buffer fails at the end of
+            # the text, or at the start of a string it cannot close.
+            truncated = (
+                e.pos >= len(text) - _TOKEN_MARGIN
+                or e.msg.startswith('Unterminated string')
+            )
+            if eof or not truncated:
+                raise FeatureFileError(f"Invalid JSON after byte {offset}: {e.msg}")
+            read(max(block_size, len(text)))
+            continue
+        offset += len(text[pos:end].encode('utf-8'))
+        pos = end
+        yield text[start:end], offset
@@ -0,0 +1,98 @@
+"""
+Query-string filters shared by the polygon endpoints.
+"""
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+# Query parameters filtering on timestamps, and the lookups they apply
+DATE_FILTERS = {
+    'created_after': 'created_at__gte',
+    'created_before': 'created_at__lt',
+    'updated_after': 'updated_at__gte',
+    'updated_before': 'updated_at__lt',
+}
+
+
+def parse_bbox(value):
+    """
+    Parse ``minLng,minLat,maxLng,maxLat`` into a tuple of floats.
+
+    ``minLng`` may exceed ``maxLng`` for viewports crossing the antimeridian.
+    """
+    try:
+        bbox = tuple(float(part) for part in value.split(','))
+    except ValueError:
+        raise ValidationError({'bbox': ["bbox values must be numbers"]})
+    if len(bbox) != 4:
+        raise ValidationError({'bbox': ["bbox must be minLng,minLat,maxLng,maxLat"]})
+
+    min_lng, min_lat, max_lng, max_lat = bbox
+    if not all(-180 <= lng <= 180 for lng in (min_lng, max_lng)):
+        raise ValidationError({'bbox': ["Longitude must be between -180 and 180"]})
+    if not all(-90 <= lat <= 90 for lat in (min_lat, max_lat)):
+        raise ValidationError({'bbox': ["Latitude must be between -90 and 90"]})
+    if min_lat > max_lat:
+        raise ValidationError({'bbox': ["minLat must not exceed maxLat"]})
+    return bbox
+
+
+def parse_point(query_params):
+    """Read a ``lng``/``lat`` pair from the query string."""
+    try:
+        lng = float(query_params['lng'])
+        lat = float(query_params['lat'])
+    except KeyError:
+        raise ValidationError({'point': ["lng and lat query parameters are required"]})
+    except ValueError:
+        raise ValidationError({'point': ["lng and lat must be numbers"]})
+    if not (-180 <= lng <= 180):
+        raise ValidationError({'lng': ["Longitude must be between -180 and 180"]})
+    if not (-90 <= lat <= 90):
+        raise ValidationError({'lat': ["Latitude must be between -90 and 90"]})
+    return lng, lat
+
+
+def parse_timestamp(name, value):
+    """
+    Parse an ISO 8601 date or datetime query parameter.
+
+    Dates mean midnight, and naive values are in the current time zone.
+    """
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = day and datetime.combine(day, time.min)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: [f"{name} must be an ISO 8601 date or datetime"]})
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_bbox(queryset, bbox):
+    """Restrict ``queryset`` to polygons whose bounds intersect ``bbox``."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    queryset = queryset.filter(min_lat__lte=max_lat, max_lat__gte=min_lat)
+    if min_lng <= max_lng:
+        return queryset.filter(min_lng__lte=max_lng, max_lng__gte=min_lng)
+    return queryset.filter(Q(max_lng__gte=min_lng) | Q(min_lng__lte=max_lng))
+
+
+def filter_request(queryset, request):
+    """Apply the filters given in ``request``'s query string."""
+    bbox = request.query_params.get('bbox')
+    if bbox:
+        queryset = filter_bbox(queryset, parse_bbox(bbox))
+    for name, lookup in DATE_FILTERS.items():
+        value = request.query_params.get(name)
+        if value:
+            queryset = queryset.filter(**{lookup: parse_timestamp(name, value)})
+    return queryset
@@ -0,0 +1,280 @@
+"""
+Minimal FlatGeobuf writer for polygon exports.
+
+FlatGeobuf files are the magic bytes, a size-prefixed FlatBuffers header,
+an optional packed Hilbert R-tree over the feature bounds, and then the
+features, each a size-prefixed FlatBuffers table.  The index stores each
+feature's byte offset, so features must be written in the R-tree's
+Hilbert order; callers sort with :func:`hilbert_order` first.
+
+Only what the exporter needs is implemented: single-ring polygons in
+EPSG:4326 with Long, Double, String and DateTime columns.  See
+https://flatgeobuf.org for the format.
+"""
+import struct
+from datetime import timezone
+
+import numpy as np
+
+MAGIC = b'fgb\x03fgb\x00'
+NODE_SIZE = 16
+
+# GeometryType and ColumnType values from the FlatGeobuf schema
+POLYGON = 3
+LONG = 7
+DOUBLE = 10
+STRING = 11
+DATETIME = 13
+
+_PROPERTY_FORMATS = {LONG: '<Hq', DOUBLE: '<Hd'}
+_NODE_DTYPE = np.dtype([
+    ('min_x', '<f8'), ('min_y', '<f8'), ('max_x', '<f8'), ('max_y', '<f8'),
+    ('offset', '<u8'),
+])
+_HILBERT_MAX = (1 << 16) - 1
+# Size prefix, root offset, Feature vtable and table, Geometry vtable and
+# table, then the ends vector and the length of xy; see feature()
+_FEATURE_HEAD = struct.Struct('<II4HiII4HiIIIII')
+
+
+class _Builder:
+    """
+    Lays out one FlatBuffers buffer front to back.
+
+    Tables are given as ``[(slot, kind, value), ...]`` where ``kind`` is a
+    ``struct`` code for scalars, or ``'string'``, ``'vector'`` (a NumPy
+    array), ``'table'`` or ``'tables'``.  Each vtable is written just before
+    its table and everything a table refers to just after it, so all
+    offsets point forward as ``uoffset_t`` requires.
+    """
+
+    def __init__(self):
+        self.buf = bytearray(4)
+
+    def finish(self, fields):
+        struct.pack_into('<I', self.buf, 0, self.table(fields))
+        return bytes(self.buf)
+
+    def _pad(self, alignment, extra=0):
+        self.buf += bytes(-(len(self.buf) + extra) % alignment)
+
+    def table(self, fields):
+        fields = [field for field in fields if field[2] is not None]
+        inline = sorted(
+            ((slot, kind, value, 4 if len(kind) > 1 else struct.calcsize(kind))
+             for slot, kind, value in fields),
+            key=lambda field: -field[3]
+        )
+        offsets, position = {}, 4
+        for slot, kind, value, size in inline:
+            offsets[slot] = position
+            position += size
+        slots = max((field[0] for field in fields), default=-1) + 1
+
+        self._pad(2)
+        vtable = len(self.buf)
+        self.buf += struct.pack(
+            f'<HH{slots}H', 4 + 2 * slots, position,
+            *(offsets.get(slot, 0) for slot in range(slots))
+        )
+        # Eight-byte scalars follow the four-byte soffset directly.
+        if inline and inline[0][3] == 8:
+            self._pad(8, extra=4)
+        else:
+            self._pad(4)
+        start = len(self.buf)
+        self.buf += struct.pack('<i', start - vtable)
+        references = []
+        for slot, kind, value, size in inline:
+            if len(kind) > 1:
+                references.append((len(self.buf), kind, value))
+                self.buf += bytes(4)
+            else:
+                self.buf += struct.pack('<' + kind, value)
+        for at, kind, value in references:
+            self._point(at, getattr(self, '_' + kind)(value))
+        return start
+
+    def _point(self, at, target):
+        struct.pack_into('<I', self.buf, at, target - at)
+
+    def _string(self, value):
+        data = value.encode('utf-8')
+        self._pad(4)
+        start = len(self.buf)
+        self.buf += struct.pack('<I', len(data)) + data + b'\0'
+        return start
+
+    def _vector(self, array):
+        self._pad(max(array.itemsize, 4), extra=4)
+        start = len(self.buf)
+        self.buf += struct.pack('<I', len(array)) + array.tobytes()
+        return start
+
+    def _table(self, fields):
+        return self.table(fields)
+
+    def _tables(self, tables):
+        self._pad(4)
+        start = len(self.buf)
+        self.buf += struct.pack('<I', len(tables)) + bytes(4 * len(tables))
+        for index, fields in enumerate(tables):
+            self._point(start + 4 + 4 * index, self.table(fields))
+        return start
+
+
+def _size_prefixed(fields):
+    data = _Builder().finish(fields)
+    return struct.pack('<I', len(data)) + data
+
+
+def header(name, columns, features_count, envelope, node_size=NODE_SIZE):
+    """
+    The size-prefixed header of a polygon file in EPSG:4326.
+
+    ``columns`` is a list of ``(name, column_type, nullable)``;
+    ``envelope`` is ``(min_x, min_y, max_x, max_y)`` or None when empty.
+    """
+    return _size_prefixed([
+        (0, 'string', name),
+        (1, 'vector', None if envelope is None else np.asarray(envelope, dtype='<f8')),
+        (2, 'B', POLYGON),
+        (7, 'tables', [
+            [(0, 'string', column), (1, 'B', column_type), (7, '?', nullable)]
+            for column, column_type, nullable in columns
+        ]),
+        (8, 'Q', features_count),
+        (9, 'H', node_size),
+        (10, 'table', [(0, 'string', 'EPSG'), (1, 'i', 4326)]),
+    ])
+
+
+def datetime_string(value):
+    """
+    ``value`` as GDAL writes DateTime columns: UTC, to the millisecond.
+    Some readers reject the microseconds ``isoformat`` would add.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.isoformat(timespec='milliseconds')[:23] + 'Z'
+
+
+def properties(values):
+    """Encode ``[(column_type, value), ...]`` in column order; None is skipped."""
+    parts = []
+    for index, (column_type, value) in enumerate(values):
+        if value is None:
+            continue
+        if column_type in _PROPERTY_FORMATS:
+            parts.append(struct.pack(_PROPERTY_FORMATS[column_type], index, value))
+        else:
+            data = value.encode('utf-8')
+            parts.append(struct.pack('<HI', index, len(data)) + data)
+    return b''.join(parts)
+
+
+def feature(ring, encoded_properties):
+    """
+    A size-prefixed feature for a closed ``(n, 2)`` float64 ``ring``.
+
+    Every feature has the same layout, which is what :class:`_Builder`
+    writes for ``Feature{geometry: Geometry{ends, xy}, properties}``:
+    the two vtables and tables, ``ends``, ``xy`` (8-aligned at byte 56)
+    and the properties.  Packing it directly is several times faster.
+    """
+    count = len(ring)
+    return _FEATURE_HEAD.pack(
+        60 + 16 * count + len(encoded_properties),
+        12, 8, 12, 4, 8, 8, 16, 36 + 16 * count,
+        8, 12, 4, 8, 8, 8, 12,
+        1, count, 2 * count
+    ) + np.ascontiguousarray(ring, dtype='<f8').tobytes() + struct.pack(
+        '<I', len(encoded_properties)
+    ) + encoded_properties
+
+
+def _hilbert(x, y):
+    """Hilbert curve index of 16-bit grid cells, vectorized over uint32 arrays."""
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    for shift in (2, 4):
+        a, b, c, d = A, B, C, D
+        A = (a & (a >> shift)) ^ (b & (b >> shift))
+        B = (a & (b >> shift)) ^ (b & ((a ^ b) >> shift))
+        C = C ^ ((a & (c >> shift)) ^ (b & (d >> shift)))
+        D = D ^ ((b & (c >> shift)) ^ ((a ^ b) & (d >> shift)))
+
+    a, b, c, d = A, B, C, D
+    C = C ^ ((a & (c >> 8)) ^ (b & (d >> 8)))
+    D = D ^ ((b & (c >> 8)) ^ ((a ^ b) & (d >> 8)))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+    for shift, mask in (
+        (8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)
+    ):
+        i0 = (i0 | (i0 << shift)) & mask
+        i1 = (i1 | (i1 << shift)) & mask
+    return (i1 << 1) | i0
+
+
+def hilbert_order(bounds, envelope):
+    """
+    Indices sorting ``(n, 4)`` feature ``bounds`` by the Hilbert index of
+    their centres within ``envelope``, as the reference writer does.
+    """
+    min_x, min_y, max_x, max_y = envelope
+    width = (max_x - min_x) or 1.0
+    height = (max_y - min_y) or 1.0
+    x = np.floor(_HILBERT_MAX * ((bounds[:, 0] + bounds[:, 2]) / 2 - min_x) / width)
+    y = np.floor(_HILBERT_MAX * ((bounds[:, 1] + bounds[:, 3]) / 2 - min_y) / height)
+    values = _hilbert(x.astype(np.uint32), y.astype(np.uint32))
+    return np.argsort(values, kind='stable')[::-1]
+
+
+def _level_bounds(count, node_size):
+    """``(start, end)`` node ranges of each tree level, leaves first."""
+    sizes, n = [count], count
+    while True:
+        n = -(-n // node_size)
+        sizes.append(n)
+        if n == 1:
+            break
+    end = sum(sizes)
+    levels = []
+    for size in sizes:
+        levels.append((end - size, end))
+        end -= size
+    return levels
+
+
+def packed_rtree(bounds, offsets, node_size=NODE_SIZE):
+    """
+    The packed Hilbert R-tree over ``bounds`` (``(n, 4)``, in file order)
+    of features starting at byte ``offsets`` into the feature section.
+    """
+    levels = _level_bounds(len(bounds), node_size)
+    nodes = np.empty(levels[0][1], dtype=_NODE_DTYPE)
+    leaves = nodes[levels[0][0]:]
+    for column, name in enumerate(('min_x', 'min_y', 'max_x', 'max_y')):
+        leaves[name] = bounds[:, column]
+    leaves['offset'] = offsets
+    for (start, end), (parent, _) in zip(levels, levels[1:]):
+        groups = np.arange(start, end, node_size)
+        children = nodes[start:end]
+        parents = nodes[parent:parent + len(groups)]
+        for name, reduce in (('min_x', np.minimum), ('min_y', np.minimum),
+                             ('max_x', np.maximum), ('max_y', np.maximum)):
+            parents[name] = reduce.reduceat(children[name], groups - start)
+        parents['offset'] = groups
+    return nodes.tobytes()
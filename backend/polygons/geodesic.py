@@ -0,0 +1,219 @@
+"""
+Geodesic area and perimeter on the WGS84 ellipsoid.
+
+All routines work on NumPy arrays so a single ring, or a whole batch of
+rings packed into one coordinate array, is measured without a Python-level
+loop over vertices.  Coordinates are ``[lng, lat]`` pairs in degrees; rings
+may be open or closed (a repeated closing vertex adds a zero-length edge).
+
+Area uses the exact spherical-excess formula on the authalic sphere, which
+preserves area, with latitudes mapped to authalic latitudes.  Perimeter uses
+Vincenty's inverse formula evaluated for every edge at once.
+"""
+import numpy as np
+
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+_E2 = WGS84_F * (2 - WGS84_F)
+_E = np.sqrt(_E2)
+
+# Bump with any change here that alters stored metrics, then run
+# recompute_metrics; memoized metrics of older versions are not reused.
+METRICS_VERSION = 1
+
+VINCENTY_MAX_ITERATIONS = 200
+VINCENTY_TOLERANCE = 1e-12
+
+
+def _authalic_q(sin_phi):
+    e_sin = _E * sin_phi
+    return (1 - _E2) * (
+        sin_phi / (1 - _E2 * sin_phi ** 2)
+        - np.log((1 - e_sin) / (1 + e_sin)) / (2 * _E)
+    )
+
+
+_QP = float(_authalic_q(1.0))
+AUTHALIC_RADIUS = WGS84_A * np.sqrt(_QP / 2)
+_GLOBE_AREA = 4 * np.pi * AUTHALIC_RADIUS ** 2
+
+
+def as_ring_array(ring):
+    """Return ``ring`` as a float64 ``(n, 2)`` array of ``[lng, lat]``."""
+    coords = np.asarray(ring, dtype=np.float64)
+    if coords.ndim != 2 or coords.shape[1] != 2:
+        raise ValueError("Coordinates must be a list of [lng, lat] pairs")
+    return coords
+
+
+def pack_rings(rings):
+    """
+    Concatenate rings into one ``(N, 2)`` array plus ring start offsets.
+
+    ``coords[offsets[i]:offsets[i + 1]]`` is ring ``i``; ``offsets`` has one
+    more entry than there are rings.
+    """
+    arrays = [as_ring_array(ring) for ring in rings]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    if arrays:
+        np.cumsum([len(a) for a in arrays], out=offsets[1:])
+        coords = np.concatenate(arrays)
+    else:
+        coords = np.empty((0, 2), dtype=np.float64)
+    return coords, offsets
+
+
+def _edge_endpoints(coords, offsets):
+    """Index arrays for the start and end vertex of every ring edge."""
+    start = np.arange(len(coords))
+    end = start + 1
+    # The last vertex of each ring closes back onto its first vertex.
+    end[offsets[1:] - 1] = offsets[:-1]
+    return start, end
+
+
+def edge_excess(lng1, lat1, lng2, lat2):
+    """
+    Signed spherical excess (steradians) of each edge on the authalic sphere.
+
+    Summed around a ring this is the ring's signed area divided by the square
+    of :data:`AUTHALIC_RADIUS`; counter-clockwise rings are positive.
+    """
+    beta1 = np.arcsin(_authalic_q(np.sin(np.radians(lat1))) / _QP)
+    beta2 = np.arcsin(_authalic_q(np.sin(np.radians(lat2))) / _QP)
+    dlng = np.radians(lng2 - lng1)
+    dlng = (dlng + np.pi) % (2 * np.pi) - np.pi
+    t1 = np.tan(beta1 / 2)
+    t2 = np.tan(beta2 / 2)
+    return 2 * np.arctan2(np.tan(dlng / 2) * (t1 + t2), 1 + t1 * t2)
+
+
+def edge_lengths(lng1, lat1, lng2, lat2):
+    """Geodesic length in meters of each edge (Vincenty inverse)."""
+    lng1, lat1, lng2, lat2 = np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (lng1, lat1, lng2, lat2))
+    )
+    big_l = np.radians(lng2 - lng1)
+    u1 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat2)))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+    lam = big_l
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(VINCENTY_MAX_ITERATIONS):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(
+                cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam
+            )
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(
+                sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma
+            )
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sm = np.where(
+                cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha
+            )
+            c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+            lam_prev = lam
+            lam = big_l + (1 - c) * WGS84_F * sin_alpha * (
+                sigma + c * sin_sigma * (
+                    cos_2sm + c * cos_sigma * (-1 + 2 * cos_2sm ** 2)
+                )
+            )
+            # Relative test: short parcel edges have tiny absolute lambdas.
+            if np.all(np.abs(lam - lam_prev) <= VINCENTY_TOLERANCE * np.abs(lam)):
+                break
+
+    u_sq = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = big_b * sin_sigma * (
+        cos_2sm + big_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sm ** 2)
+            - big_b / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2)
+            * (-3 + 4 * cos_2sm ** 2)
+        )
+    )
+    return WGS84_B * big_a * (sigma - delta_sigma)
+
+
+def edge_terms(lng1, lat1, lng2, lat2):
+    """
+    Signed excess, longitude step (radians) and length (m) of each edge.
+
+    A ring's area and perimeter follow from the sums of these over its
+    edges (see :func:`areas_from_sums`), so a stored sum can be updated
+    from just the edges an edit replaces.
+    """
+    dlng = (np.radians(lng2 - lng1) + np.pi) % (2 * np.pi) - np.pi
+    return (
+        edge_excess(lng1, lat1, lng2, lat2), dlng, edge_lengths(lng1, lat1, lng2, lat2)
+    )
+
+
+def packed_sums(coords, offsets):
+    """
+    Per-ring sums of :func:`edge_terms` for rings packed by :func:`pack_rings`.
+
+    Returns three float64 arrays: signed excess, longitude steps and
+    perimeter, with one entry per ring.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_rings = len(offsets) - 1
+    if n_rings <= 0:
+        return np.empty(0), np.empty(0), np.empty(0)
+    if np.any(np.diff(offsets) < 1):
+        raise ValueError("Every ring needs at least one coordinate pair")
+
+    start, end = _edge_endpoints(coords, offsets)
+    terms = edge_terms(
+        coords[start, 0], coords[start, 1], coords[end, 0], coords[end, 1]
+    )
+    ring_starts = offsets[:-1]
+    return tuple(np.add.reduceat(values, ring_starts) for values in terms)
+
+
+def areas_from_sums(excess, longitude):
+    """Area (m²) of rings from their summed signed excess and longitude steps."""
+    excess = np.abs(excess)
+    # Rings that wind around a pole measure the band down to the equator;
+    # the enclosed polar cap is its complement within the hemisphere.
+    winding = np.rint(np.asarray(longitude) / (2 * np.pi))
+    excess = np.where(winding != 0, 2 * np.pi - excess, excess)
+    areas = excess * AUTHALIC_RADIUS ** 2
+    # A ring enclosing more than half the globe is measured the short way.
+    return np.where(areas > _GLOBE_AREA / 2, _GLOBE_AREA - areas, areas)
+
+
+def packed_metrics(coords, offsets):
+    """
+    Area (m²) and perimeter (m) for rings packed by :func:`pack_rings`.
+
+    Returns two float64 arrays with one entry per ring.
+    """
+    excess, longitude, perimeters = packed_sums(coords, offsets)
+    return areas_from_sums(excess, longitude), perimeters
+
+
+def batch_metrics(rings):
+    """Area (m²) and perimeter (m) arrays for a sequence of rings."""
+    return packed_metrics(*pack_rings(rings))
+
+
+def ring_sums(ring):
+    """:func:`packed_sums` of a single ring, as a tuple of Python floats."""
+    coords = as_ring_array(ring)
+    sums = packed_sums(coords, np.array([0, len(coords)]))
+    return tuple(float(values[0]) for values in sums)
+
+
+def ring_metrics(ring):
+    """Area (m²) and perimeter (m) of a single ring, as Python floats."""
+    coords = as_ring_array(ring)
+    areas, perimeters = packed_metrics(coords, np.array([0, len(coords)]))
+    return float(areas[0]), float(perimeters[0])
@@ -0,0 +1,69 @@
+"""
+Vectorized Shapely helpers for stored ``[[lng, lat], ...]`` rings.
+"""
+import numpy as np
+import shapely
+from rest_framework.exceptions import ValidationError
+from shapely.geometry import shape
+
+from . import geodesic
+
+
+def pack_coordinates(ring):
+    """Encode a ring as little-endian float64 ``lng, lat`` pairs."""
+    return geodesic.as_ring_array(ring).astype('<f8', copy=False).tobytes()
+
+
+def unpack_coordinates(data):
+    """Read-only ``(n, 2)`` view over bytes written by :func:`pack_coordinates`."""
+    return np.frombuffer(data, dtype='<f8').reshape(-1, 2)
+
+
+def packed_to_polygons(coords, offsets):
+    """Build one Shapely polygon per ring packed by ``geodesic.pack_rings``."""
+    ring_ids = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    return shapely.polygons(shapely.linearrings(coords, indices=ring_ids))
+
+
+def rings_to_polygons(rings):
+    """Return ``(geometries, coords, offsets)`` for a sequence of rings."""
+    coords, offsets = geodesic.pack_rings(rings)
+    return packed_to_polygons(coords, offsets), coords, offsets
+
+
+def geometry_from_geojson(data):
+    """Shapely geometry from a GeoJSON geometry or Feature object."""
+    if isinstance(data, dict) and data.get('type') == 'Feature':
+        data = data.get('geometry')
+    if not isinstance(data, dict) or 'type' not in data:
+        raise ValidationError({'geometry': ["Expected a GeoJSON geometry or Feature"]})
+    try:
+        geometry = shape(data)
+    except Exception as e:
+        raise ValidationError({'geometry': [f"Invalid geometry: {str(e)}"]})
+    if geometry.is_empty:
+        raise ValidationError({'geometry': ["Geometry must not be empty"]})
+    return geometry
+
+
+def point_array(points):
+    """Validate ``[[lng, lat], ...]`` and return it as a float64 array."""
+    try:
+        coords = np.asarray(points, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValidationError({'points': ["Points must be a list of [lng, lat] pairs"]})
+    if coords.ndim != 2 or coords.shape[1] != 2:
+        raise ValidationError({'points': ["Points must be a list of [lng, lat] pairs"]})
+    if not np.all(np.abs(coords[:, 0]) <= 180):
+        raise ValidationError({'points': ["Longitude must be between -180 and 180"]})
+    if not np.all(np.abs(coords[:, 1]) <= 90):
+        raise ValidationError({'points': ["Latitude must be between -90 and 90"]})
+    return coords
+
+
+def group_matches(n_points, point_indices, polygon_ids):
+    """List of matching polygon ids for each of ``n_points`` points."""
+    matches = [[] for _ in range(n_points)]
+    for point_index, polygon_id in zip(point_indices.tolist(), polygon_ids.tolist()):
+        matches[point_index].append(polygon_id)
+    return matches
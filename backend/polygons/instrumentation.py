@@ -0,0 +1,218 @@
+"""
+Prometheus metrics for requests and hot spots, served at ``/metrics``.
+
+``MetricsMiddleware`` records latency, response size and database query
+count/time per route name (``polygon-list``, ``polygon-geojson-collection``
+...).  Queries are counted by an execute wrapper installed on every
+database connection that charges them to the request in a context
+variable, so queries run by async views in worker threads and while a
+streamed response is being sent are counted too.
+
+Under a multi-process server set ``PROMETHEUS_MULTIPROC_DIR`` so that
+``/metrics`` reports all workers, not just the one that answered.
+"""
+import functools
+import os
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest,
+    multiprocess
+)
+
+_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30
+)
+
+REQUEST_LATENCY = Histogram(
+    'polygon_http_request_duration_seconds',
+    "Time from receiving a request to sending the last byte of its response",
+    ['route', 'method', 'status'], buckets=_LATENCY_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    'polygon_http_response_size_bytes', "Response body size",
+    ['route'], buckets=tuple(4 ** n * 256 for n in range(11))
+)
+REQUEST_QUERIES = Histogram(
+    'polygon_http_db_queries', "Database queries run per request",
+    ['route'], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+)
+REQUEST_QUERY_TIME = Histogram(
+    'polygon_http_db_query_duration_seconds', "Database time per request",
+    ['route'], buckets=_LATENCY_BUCKETS
+)
+METRICS_CALCULATION = Histogram(
+    'polygon_calculate_metrics_duration_seconds',
+    "Polygon.calculate_metrics, per polygon", buckets=_LATENCY_BUCKETS
+)
+VALIDATION = Histogram(
+    'polygon_validation_duration_seconds',
+    "Ring validation in PolygonSerializer, per polygon", buckets=_LATENCY_BUCKETS
+)
+BULK_CHUNK = Histogram(
+    'polygon_bulk_chunk_duration_seconds',
+    "Validating and measuring one bulk-ingest chunk", buckets=_LATENCY_BUCKETS
+)
+
+_request_stats = ContextVar('polygon_request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+
+
+def timed(histogram):
+    """Decorator observing each call's duration in ``histogram``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper charging queries to the current request."""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver adding :func:`record_query`."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.POLYGON_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return self.finish(request, response, stats, started)
+
+    def finish(self, request, response, stats, started):
+        match = request.resolver_match
+        route = (match.url_name or match.view_name) if match else 'unmatched'
+
+        def observe(size):
+            REQUEST_LATENCY.labels(
+                route, request.method, response.status_code
+            ).observe(time.perf_counter() - started)
+            RESPONSE_SIZE.labels(route).observe(size)
+            REQUEST_QUERIES.labels(route).observe(stats.queries)
+            REQUEST_QUERY_TIME.labels(route).observe(stats.query_time)
+
+        return on_response_end(response, _request_stats, stats, observe)
+
+
+def on_response_end(response, context_var, value, callback):
+    """
+    Call ``callback(body_size)`` once ``response`` has been fully sent.
+
+    For a streamed response that is when its last chunk has been read, and
+    ``context_var`` is set to ``value`` while each chunk is produced, so
+    work done lazily by the stream is attributed to the request.
+    """
+    if not response.streaming:
+        callback(len(response.content))
+    elif response.is_async:
+        response.streaming_content = _awatch_stream(
+            response.streaming_content, context_var, value, callback
+        )
+    else:
+        response.streaming_content = _watch_stream(
+            response.streaming_content, context_var, value, callback
+        )
+    return response
+
+
+def _watch_stream(content, context_var, value, callback):
+    size = 0
+    iterator = iter(content)
+    try:
+        while True:
+            token = context_var.set(value)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                context_var.reset(token)
+            size += len(chunk)
+            yield chunk
+    finally:
+        callback(size)
+
+
+async def _awatch_stream(content, context_var, value, callback):
+    size = 0
+    iterator = aiter(content)
+    try:
+        while True:
+            token = context_var.set(value)
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                break
+            finally:
+                context_var.reset(token)
+            size += len(chunk)
+            yield chunk
+    finally:
+        callback(size)
+
+
+def metrics_view(request):
+    """All metrics in the Prometheus text exposition format."""
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,145 @@
+"""
+Run the performance benchmarks and compare them against a baseline.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment
+)
+from django.utils import timezone
+
+from polygons import benchmarks
+
+
+def _sizes(value):
+    try:
+        sizes = [int(size) for size in value.split(',')]
+    except ValueError:
+        raise CommandError(f"Expected comma-separated integers, got {value!r}")
+    if any(size < 1 for size in sizes):
+        raise CommandError("Sizes must be at least 1")
+    return sorted(sizes)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark metrics computation, validation, single creates, list "
+        "pages and GeoJSON collection rendering on synthetic polygons.  "
+        "Runs against a throwaway test database of the configured backend "
+        "(SQLite or PostgreSQL) with the response cache disabled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', default='1000,100000,1000000',
+            help="Table sizes for the list and collection cases"
+        )
+        parser.add_argument(
+            '--vertices', default='10,1000,50000',
+            help="Polygon sizes for the metrics, validation and create cases"
+        )
+        parser.add_argument(
+            '--row-vertices', type=int, default=10,
+            help="Vertices per polygon in the populated table"
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5, help="Timed batches per case"
+        )
+        parser.add_argument(
+            '--cases', help="Comma-separated case names to run (default: all)"
+        )
+        parser.add_argument('--output', help="Write results to this JSON file")
+        parser.add_argument('--baseline', help="Compare against this results file")
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help="Slowdown that counts as a regression (0.25 = 25%%)"
+        )
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help="Keep the populated test database between runs"
+        )
+
+    def handle(self, *args, **options):
+        rows = _sizes(options['rows'])
+        vertices = _sizes(options['vertices'])
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1")
+        selected = set(options['cases'].split(',')) if options['cases'] else None
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {e}")
+
+        results, storage = {}, {}
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            with override_settings(**benchmarks.ISOLATED_SETTINGS):
+                for size in vertices:
+                    cases = benchmarks.vertex_cases(size)
+                    self.run_cases(
+                        cases, f"vertices={size}", selected, options, results
+                    )
+                for size in rows:
+                    self.stderr.write(f"Populating {size} rows")
+                    benchmarks.populate(size, options['row_vertices'])
+                    storage[f"rows={size}"] = columns = benchmarks.storage_sizes()
+                    self.stdout.write(f"{f'storage[rows={size}]':40} " + ', '.join(
+                        f"{column} {nbytes or 0:,} bytes"
+                        for column, nbytes in columns.items()
+                    ))
+                    cases = benchmarks.row_cases()
+                    self.run_cases(cases, f"rows={size}", selected, options, results)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'created_at': timezone.now().isoformat(),
+                    'environment': benchmarks.environment(),
+                    'results': results,
+                    'storage': storage,
+                }, f, indent=2)
+        if baseline is not None:
+            self.report_comparison(results, baseline, options['threshold'])
+
+    def run_cases(self, cases, size, selected, options, results):
+        for name, func in cases.items():
+            if selected and name not in selected:
+                continue
+            key = f"{name}[{size}]"
+            results[key] = result = benchmarks.measure(func, options['repeat'])
+            self.stdout.write(
+                f"{key:40} {result['median'] * 1000:12.3f} ms "
+                f"(min {result['min'] * 1000:.3f} ms, {result['calls']} calls)"
+            )
+
+    def report_comparison(self, results, baseline, threshold):
+        rows = benchmarks.compare(results, baseline, threshold)
+        if not rows:
+            self.stdout.write("No cases in common with the baseline")
+            return
+        self.stdout.write("")
+        for name, before, after, ratio, regressed in rows:
+            self.stdout.write(
+                f"{name:40} {before * 1000:12.3f} -> {after * 1000:12.3f} ms "
+                f"{(ratio - 1) * 100:+7.1f}%{'  REGRESSION' if regressed else ''}"
+            )
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} case(s) slower than the baseline by more "
+                f"than {threshold:.0%}: {', '.join(regressions)}"
+            )
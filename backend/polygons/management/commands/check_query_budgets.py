@@ -0,0 +1,92 @@
+"""
+Check every API route against its query budget.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment
+)
+from django.urls import resolve
+
+from polygons.benchmarks import ISOLATED_SETTINGS, budget_requests, populate
+from polygons.models import Polygon
+from polygons.query_budget import (
+    QUERY_BUDGETS, QueryBudgetExceeded, budget_for, query_budget, repeated_queries
+)
+from polygons.renderers import dumps
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every polygon API route in a throwaway test database and "
+        "fail if any runs more queries than its budget in "
+        "polygons.query_budget.QUERY_BUDGETS, or repeats one statement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat-threshold', type=int, default=3,
+            help="Fail when one statement shape runs this many times in a request"
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(**ISOLATED_SETTINGS):
+                failures = self.check_routes(options['repeat_threshold'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        if failures:
+            raise CommandError(
+                f"{len(failures)} query budget check(s) failed:\n\n"
+                + '\n\n'.join(failures)
+            )
+
+    def check_routes(self, repeat_threshold):
+        populate(20, 10)
+        polygon_ids = list(
+            Polygon.objects.order_by('id').values_list('id', flat=True)[:3]
+        )
+        client = Client()
+        # Load the spatial index and any lazy state first.
+        client.get('/api/polygons/contains/?lng=0&lat=0')
+
+        failures, checked = [], set()
+        for method, path, body in budget_requests(polygon_ids):
+            route = resolve(path.split('?')[0]).url_name
+            budget = budget_for(route, method)
+            if budget is None:
+                failures.append(f"{method} {path}: no budget for route {route}")
+                continue
+            checked.add((route, method))
+            label = f"{method} {path}"
+            try:
+                with query_budget(budget, label) as recorded:
+                    response = client.generic(
+                        method, path, None if body is None else dumps(body),
+                        content_type='application/json'
+                    )
+                    if response.streaming:
+                        for _ in response.streaming_content:
+                            pass
+            except QueryBudgetExceeded as e:
+                failures.append(str(e))
+                continue
+            if response.status_code >= 400:
+                failures.append(f"{label}: status {response.status_code}")
+                continue
+            for shape, count in repeated_queries(recorded.queries, repeat_threshold):
+                failures.append(f"{label}: ran {count} times: {shape}")
+            self.stdout.write(
+                f"{len(recorded.queries):3} / {budget:<3} {label}"
+            )
+
+        for route, methods in QUERY_BUDGETS.items():
+            for method in methods:
+                if (route, method) not in checked:
+                    failures.append(f"{method} {route}: budgeted but not exercised")
+        return failures
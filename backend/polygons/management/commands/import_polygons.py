@@ -0,0 +1,268 @@
+"""
+Import a large GeoJSON or NDJSON file of polygons, resumably.
+"""
+import collections
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+import orjson
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from polygons.bulk import duplicate_result, prepare_items, split_duplicates
+from polygons.dedupe import DUPLICATE_POLICIES
+from polygons.feature_files import (
+    NDJSON_SUFFIXES, FeatureFileError, iter_feature_collection, iter_ndjson
+)
+from polygons.models import Polygon, PolygonImport, PolygonImportChunk
+from polygons.signals import polygons_saved
+
+
+def _init_worker():
+    django.setup()
+
+
+def _import_chunk(import_id, start_offset, end_offset, first, texts, duplicates):
+    """
+    Worker side: decode, validate, measure and insert one chunk.
+
+    The polygons and the chunk's ``PolygonImportChunk`` row are committed
+    together, so a chunk is either fully imported or not at all.  ``first``
+    is the number of the chunk's first feature in the file.  Under the
+    ``reject`` and ``merge`` duplicate policies, features repeating a
+    polygon already committed or earlier in the chunk are not inserted.
+    """
+    items, errors = [], {}
+    for number, text in enumerate(texts, first):
+        try:
+            items.append((number, orjson.loads(text)))
+        except orjson.JSONDecodeError as e:
+            errors[number] = {'non_field_errors': [f"Invalid JSON: {e}"]}
+    polygons, indices, invalid = prepare_items(items)
+    errors.update(invalid)
+    merged = 0
+    with transaction.atomic():
+        if duplicates != 'allow' and polygons:
+            polygons, indices, repeated = split_duplicates(polygons, indices, {})
+            if duplicates == 'merge':
+                merged = len(repeated)
+            else:
+                for number, original in repeated:
+                    errors[number] = duplicate_result(
+                        number, original.id, duplicates
+                    )['errors']
+        Polygon.objects.bulk_create(polygons)
+        PolygonImportChunk.objects.create(
+            polygon_import_id=import_id, start_offset=start_offset,
+            end_offset=end_offset, first_feature=first, features=len(texts),
+            imported=len(polygons), failed=len(errors), duplicates=merged
+        )
+    # bulk_create sends no post_save signals.
+    polygons_saved(polygons)
+    # Plain data pickles more cheaply than ErrorDetail strings.
+    return len(polygons), merged, json.loads(json.dumps(errors))
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream polygons from a GeoJSON FeatureCollection or NDJSON file into "
+        "the database.  Each chunk is validated, measured and inserted by a "
+        "worker process in one transaction with a record of the chunk, so an "
+        "interrupted import picks up where it stopped when run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="GeoJSON or NDJSON file")
+        parser.add_argument(
+            '--format', choices=['geojson', 'ndjson'],
+            help="Input format (default: from the file extension)"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.POLYGON_BULK_CHUNK_SIZE,
+            help="Features per worker task and per INSERT transaction"
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Worker processes (default: one per core)"
+        )
+        parser.add_argument(
+            '--errors', help="Append rejected features' errors to this NDJSON file"
+        )
+        parser.add_argument(
+            '--duplicates', choices=DUPLICATE_POLICIES,
+            default=settings.POLYGON_DUPLICATES,
+            help="What to do with features repeating a stored polygon's geometry: "
+                 "insert them anyway, reject them, or skip them (merge).  Chunks "
+                 "imported concurrently do not see each other's polygons"
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help="Start from the beginning even if a previous run exists"
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['input'])
+        if not os.path.isfile(path):
+            raise CommandError(f"No such file: {path}")
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError("--chunk-size and --workers must be at least 1")
+        input_format = options['format'] or (
+            'ndjson' if path.lower().endswith(NDJSON_SUFFIXES) else 'geojson'
+        )
+        state = self.get_state(path, options['restart'])
+        offset, number, committed = self.get_progress(state)
+        reader = iter_ndjson if input_format == 'ndjson' else iter_feature_collection
+
+        errors_file = open(options['errors'], 'a') if options['errors'] else None
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        try:
+            with open(path, 'rb') as source, ProcessPoolExecutor(
+                max_workers=options['workers'], initializer=_init_worker
+            ) as pool:
+                self.run(
+                    state, reader(source, offset), offset, number, committed,
+                    pool, options['chunk_size'], options['workers'], errors_file,
+                    options['duplicates']
+                )
+        except FeatureFileError as e:
+            raise CommandError(f"{e}; the import can be resumed after fixing the file")
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        state.completed_at = timezone.now()
+        state.save(update_fields=['completed_at', 'updated_at'])
+        totals = state.chunks.aggregate(
+            imported=Sum('imported'), failed=Sum('failed'), duplicates=Sum('duplicates')
+        )
+        self.stdout.write(
+            f"Imported {totals['imported'] or 0} polygons from {path} "
+            f"({totals['failed'] or 0} rejected, {totals['duplicates'] or 0} merged)"
+        )
+
+    def get_state(self, path, restart):
+        size = os.path.getsize(path)
+        state, created = PolygonImport.objects.get_or_create(
+            source=path, defaults={'source_size': size}
+        )
+        if created:
+            return state
+        if restart:
+            state.delete()
+            return PolygonImport.objects.create(source=path, source_size=size)
+        if state.completed_at:
+            raise CommandError(
+                f"{path} was already imported on {state.completed_at:%Y-%m-%d %H:%M}; "
+                "use --restart to import it again"
+            )
+        if state.source_size != size:
+            raise CommandError(
+                f"{path} changed size since the interrupted import "
+                f"({state.source_size} -> {size} bytes); use --restart"
+            )
+        return state
+
+    def get_progress(self, state):
+        """
+        Where to resume ``state``.
+
+        Returns the end of the unbroken run of committed chunks from the
+        start of the file, the number of the next feature there, and the
+        ``(start, end)`` byte ranges of chunks committed beyond it, which
+        workers finished out of order before the previous run stopped.
+        """
+        offset = number = 0
+        committed = []
+        for chunk in state.chunks.all():
+            if not committed and chunk.start_offset == offset:
+                offset = chunk.end_offset
+                number = chunk.first_feature + chunk.features
+            else:
+                committed.append((chunk.start_offset, chunk.end_offset))
+        if offset or committed:
+            totals = state.chunks.aggregate(
+                imported=Sum('imported'), failed=Sum('failed')
+            )
+            self.stderr.write(
+                f"Resuming after feature {number} ({totals['imported']} imported, "
+                f"{totals['failed']} rejected)"
+            )
+        return offset, number, committed
+
+    def run(self, state, features, offset, number, committed, pool, chunk_size,
+            workers, errors_file, duplicates):
+        """Feed chunks of features to the pool, skipping committed ones."""
+        in_flight = collections.deque()
+        started = time.perf_counter()
+        progress = {'offset': offset, 'imported': 0, 'failed': 0, 'merged': 0}
+        last_report = 0
+        chunk_start = chunk_end = offset
+        first = number
+        texts = []
+
+        def submit():
+            nonlocal texts, first, chunk_start, last_report
+            in_flight.append((pool.submit(
+                _import_chunk, state.pk, chunk_start, chunk_end, first, texts,
+                duplicates
+            ), chunk_end))
+            first += len(texts)
+            chunk_start = chunk_end
+            texts = []
+            # Bound memory by waiting for the oldest chunk.
+            if len(in_flight) >= workers * 2:
+                self.finish(progress, *in_flight.popleft(), errors_file)
+                now = time.perf_counter()
+                if now - last_report >= 5:
+                    last_report = now
+                    self.report(state, offset, progress, now - started)
+
+        for text, end in features:
+            while committed and committed[0][1] < end:
+                committed.pop(0)
+            if committed and committed[0][0] < end:
+                # Already imported by a chunk of the interrupted run.
+                if texts:
+                    submit()
+                chunk_start = chunk_end = end
+                first += 1
+                continue
+            texts.append(text)
+            chunk_end = end
+            if len(texts) >= chunk_size:
+                submit()
+        if texts:
+            submit()
+        while in_flight:
+            self.finish(progress, *in_flight.popleft(), errors_file)
+        self.report(state, offset, progress, time.perf_counter() - started)
+
+    def finish(self, progress, future, end_offset, errors_file):
+        imported, merged, errors = future.result()
+        progress['offset'] = end_offset
+        progress['imported'] += imported
+        progress['merged'] += merged
+        progress['failed'] += len(errors)
+        if errors_file:
+            for number, error in errors.items():
+                errors_file.write(
+                    json.dumps({'feature': int(number), 'errors': error}) + '\n'
+                )
+            errors_file.flush()
+
+    def report(self, state, start_offset, progress, elapsed):
+        offset = progress['offset']
+        done = offset / state.source_size * 100 if state.source_size else 100
+        rate = (offset - start_offset) / elapsed / 2 ** 20 if elapsed else 0
+        self.stderr.write(
+            f"{done:5.1f}%  {progress['imported']} imported, "
+            f"{progress['failed']} rejected, {progress['merged']} merged this run, "
+            f"{rate:.1f} MiB/s"
+        )
@@ -0,0 +1,93 @@
+"""
+Measure request throughput of a running server with concurrent clients.
+"""
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Fetch URLs from a running server with many concurrent clients and "
+        "report throughput and latency.  Run it once against a WSGI server "
+        "and once against an ASGI server to compare them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help="URLs to fetch, round robin")
+        parser.add_argument('--clients', type=int, default=50)
+        parser.add_argument(
+            '--duration', type=float, default=20.0, help="Seconds to run for"
+        )
+        parser.add_argument(
+            '--read-delay', type=float, default=0.0,
+            help="Seconds to wait between 64 KiB reads, to simulate slow clients"
+        )
+        parser.add_argument('--timeout', type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        urls = options['urls']
+        clients = options['clients']
+        if clients < 1:
+            raise CommandError("--clients must be at least 1")
+        deadline = time.monotonic() + options['duration']
+        latencies, errors, received = [], [], [0]
+        lock = threading.Lock()
+
+        def fetch(url):
+            with urllib.request.urlopen(url, timeout=options['timeout']) as response:
+                size = 0
+                while True:
+                    block = response.read(65536)
+                    if not block:
+                        return size
+                    size += len(block)
+                    if options['read_delay']:
+                        time.sleep(options['read_delay'])
+
+        def client(offset):
+            count = offset
+            while time.monotonic() < deadline:
+                url = urls[count % len(urls)]
+                count += 1
+                started = time.perf_counter()
+                try:
+                    size = fetch(url)
+                except (urllib.error.URLError, OSError) as e:
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+                    received[0] += size
+
+        started = time.monotonic()
+        threads = [
+            threading.Thread(target=client, args=(i,), daemon=True)
+            for i in range(clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        if not latencies:
+            raise CommandError(
+                f"No request succeeded ({len(errors)} errors, first: "
+                f"{errors[0] if errors else 'none'})"
+            )
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f"{len(latencies)} requests in {elapsed:.1f} s with {clients} clients: "
+            f"{len(latencies) / elapsed:.1f} req/s, "
+            f"{received[0] / elapsed / 2 ** 20:.1f} MiB/s, "
+            f"latency p50 {statistics.median(latencies) * 1000:.0f} ms, "
+            f"p95 {p95 * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms, "
+            f"{len(errors)} errors"
+        )
@@ -0,0 +1,110 @@
+"""
+Tag a large file of points with the stored polygons that contain them.
+"""
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from polygons.geometry import group_matches, point_array
+from polygons.spatial_index import spatial_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Read points from a CSV or NDJSON file and write each one back with "
+        "the ids of the polygons containing it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="Input file, or - for stdin")
+        parser.add_argument(
+            '--format', choices=['csv', 'ndjson'],
+            help="Input format (default: from the file extension)"
+        )
+        parser.add_argument(
+            '--output', default='-', help="Output file, or - for stdout"
+        )
+        parser.add_argument('--lng-field', default='lng')
+        parser.add_argument('--lat-field', default='lat')
+        parser.add_argument('--chunk-size', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        input_format = options['format'] or (
+            'csv' if options['input'].lower().endswith('.csv') else 'ndjson'
+        )
+        source = sys.stdin if options['input'] == '-' else open(
+            options['input'], newline=''
+        )
+        target = sys.stdout if options['output'] == '-' else open(
+            options['output'], 'w', newline=''
+        )
+        lng_field, lat_field = options['lng_field'], options['lat_field']
+
+        try:
+            if input_format == 'csv':
+                reader = csv.DictReader(source)
+                fieldnames = list(reader.fieldnames or [])
+                if lng_field not in fieldnames or lat_field not in fieldnames:
+                    raise CommandError(
+                        f"CSV header must contain '{lng_field}' and '{lat_field}'"
+                    )
+                writer = csv.DictWriter(target, fieldnames + ['polygon_ids'])
+                writer.writeheader()
+                rows = reader
+
+                def point_of(row):
+                    return [row[lng_field], row[lat_field]]
+
+                def write(row, ids):
+                    row['polygon_ids'] = ';'.join(str(i) for i in ids)
+                    writer.writerow(row)
+            else:
+                rows = (json.loads(line) for line in source if line.strip())
+
+                def point_of(row):
+                    if isinstance(row, list):
+                        return row
+                    return [row[lng_field], row[lat_field]]
+
+                def write(row, ids):
+                    if isinstance(row, list):
+                        row = {'point': row}
+                    row['polygon_ids'] = ids
+                    target.write(json.dumps(row) + '\n')
+
+            started = time.perf_counter()
+            total = 0
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= options['chunk_size']:
+                    total += self.locate_chunk(chunk, point_of, write)
+                    chunk = []
+            if chunk:
+                total += self.locate_chunk(chunk, point_of, write)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if target is not sys.stdout:
+                target.close()
+
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stderr.write(
+            f"Located {total} points in {elapsed:.2f}s ({rate:.0f} points/s)"
+        )
+
+    def locate_chunk(self, chunk, point_of, write):
+        try:
+            coords = point_array([point_of(row) for row in chunk])
+        except (KeyError, ValidationError) as e:
+            raise CommandError(f"Invalid point in input: {e}")
+        point_indices, polygon_ids = spatial_index.locate(coords)
+        matches = group_matches(len(chunk), point_indices, polygon_ids)
+        for row, ids in zip(chunk, matches):
+            write(row, ids)
+        return len(chunk)
@@ -0,0 +1,83 @@
+"""
+List and summarize request profiles captured by ProfilingMiddleware.
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from polygons.profiling import list_profiles, load_stacks
+from polygons.query_budget import sql_shape
+
+
+class Command(BaseCommand):
+    help = (
+        "Without arguments, list captured request profiles, newest first.  "
+        "With a profile id, show where its samples were spent and its "
+        "slowest SQL.  Profiles live in POLYGON_PROFILE_DIR; the .folded "
+        "files can be fed to flamegraph.pl or opened in speedscope."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_id', nargs='?', help="Profile to summarize")
+        parser.add_argument('--route', help="Only list profiles of this route name")
+        parser.add_argument('--limit', type=int, default=20, help="Profiles to list")
+        parser.add_argument(
+            '--top', type=int, default=15, help="Rows per summary table"
+        )
+
+    def handle(self, *args, **options):
+        directory = settings.POLYGON_PROFILE_DIR
+        if not directory:
+            raise CommandError("Profiling is disabled (POLYGON_PROFILE_DIR is empty)")
+        profiles = list_profiles(directory)
+        if options['profile_id']:
+            for profile in profiles:
+                if profile['id'] == options['profile_id']:
+                    return self.summarize(directory, profile, options['top'])
+            raise CommandError(f"No profile {options['profile_id']} in {directory}")
+
+        if options['route']:
+            profiles = [p for p in profiles if p['route'] == options['route']]
+        for profile in profiles[:options['limit']]:
+            self.stdout.write(
+                f"{profile['id']}  {profile['duration'] * 1000:9.1f} ms  "
+                f"{profile['query_count']:4} queries "
+                f"{profile['query_time'] * 1000:8.1f} ms  "
+                f"{profile['status']} {profile['method']} {profile['path']}"
+            )
+        if not profiles:
+            self.stdout.write(f"No profiles in {directory}")
+
+    def summarize(self, directory, profile, top):
+        stacks = load_stacks(directory, profile['id'])
+        total = sum(stacks.values()) or 1
+        self_samples, inclusive = Counter(), Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            self_samples[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+
+        self.stdout.write(
+            f"{profile['method']} {profile['path']} -> {profile['status']}, "
+            f"{profile['duration'] * 1000:.1f} ms, {profile['response_bytes']} bytes, "
+            f"{profile['samples']} samples every {profile['interval'] * 1000:g} ms"
+        )
+        for title, counter in (("Self", self_samples), ("Inclusive", inclusive)):
+            self.stdout.write(f"\n{title} samples:")
+            for frame, count in counter.most_common(top):
+                self.stdout.write(f"{count / total * 100:6.1f}%  {frame}")
+
+        statements = defaultdict(lambda: [0, 0.0])
+        for query in profile['queries']:
+            shape = statements[sql_shape(query['sql'])]
+            shape[0] += 1
+            shape[1] += query['duration']
+        self.stdout.write(
+            f"\nSQL: {profile['query_count']} queries, "
+            f"{profile['query_time'] * 1000:.1f} ms"
+        )
+        slowest = sorted(statements.items(), key=lambda item: -item[1][1])[:top]
+        for sql, (count, duration) in slowest:
+            self.stdout.write(f"{duration * 1000:9.1f} ms  {count:4}x  {sql[:160]}")
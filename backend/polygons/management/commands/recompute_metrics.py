@@ -0,0 +1,180 @@
+"""
+Recompute stored area and perimeter for every polygon.
+"""
+import collections
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from polygons import geodesic
+from polygons.dedupe import metrics_memo
+from polygons.geometry import unpack_coordinates
+from polygons.models import SUM_FIELDS, Polygon
+from polygons.signals import BOUND_FIELDS, polygons_saved
+
+
+def _init_worker():
+    django.setup()
+
+
+def _recompute_range(low, high, changed_only):
+    """
+    Worker side: recompute the polygons with ``low < id <= high``.
+
+    The rows stay locked from the read to the write, so a polygon edited
+    while this runs is never overwritten with metrics of its old shape.
+    Returns ``(rows, updated)``.
+    """
+    rows_query = Polygon.objects.filter(id__gt=low)
+    if high is not None:
+        rows_query = rows_query.filter(id__lte=high)
+    with transaction.atomic():
+        rows = list(
+            rows_query.select_for_update().order_by('id').values_list(
+                'id', 'coordinates_packed', 'area_sq_meters', 'perimeter_meters',
+                *SUM_FIELDS, *BOUND_FIELDS
+            )
+        )
+        if not rows:
+            return 0, 0
+        unpacked = [row[0] for row in rows if row[1] is None]
+        if unpacked:
+            coordinates = dict(
+                Polygon.objects.filter(id__in=unpacked).values_list('id', 'coordinates')
+            )
+        rings = [
+            unpack_coordinates(row[1]) if row[1] is not None
+            else geodesic.as_ring_array(coordinates[row[0]])
+            for row in rows
+        ]
+        excess, longitude, perimeters = geodesic.packed_sums(
+            *geodesic.pack_rings(rings)
+        )
+        areas = geodesic.areas_from_sums(excess, longitude)
+
+        now = timezone.now()
+        polygons = []
+        sums = zip(excess.tolist(), longitude.tolist(), perimeters.tolist())
+        for row, ring, area, ring_sums in zip(rows, rings, areas.tolist(), sums):
+            polygon_id, packed, old_area, old_perimeter = row[:4]
+            old_sums, bounds = row[4:4 + len(SUM_FIELDS)], row[4 + len(SUM_FIELDS):]
+            polygon = Polygon(id=polygon_id, coordinates_packed=packed, updated_at=now)
+            polygon.set_metrics(area, ring_sums[2])
+            polygon.set_sums(ring_sums)
+            # Edge sums count too: vertex edits build on the stored ones, and
+            # rewriting them also clears the rounding drift edits accumulate.
+            if changed_only and (
+                polygon.area_sq_meters, polygon.perimeter_meters, *ring_sums
+            ) == (old_area, old_perimeter, *old_sums):
+                continue
+            if packed is None:
+                polygon.coordinates = ring.tolist()
+            polygon.min_lng, polygon.min_lat, polygon.max_lng, polygon.max_lat = bounds
+            polygons.append(polygon)
+        Polygon.objects.bulk_update(polygons, [
+            'area_sq_meters', 'perimeter_meters', *SUM_FIELDS, 'updated_at'
+        ])
+    # bulk_update sends no post_save signals.
+    if polygons:
+        polygons_saved(polygons)
+    return len(rows), len(polygons)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute area_sq_meters and perimeter_meters for stored polygons "
+        "after a change to the metrics formula.  The table is walked in "
+        "primary key ranges that worker processes recompute and write back "
+        "with bulk_update, each range in its own short transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.POLYGON_BULK_CHUNK_SIZE,
+            help="Polygons per worker task and per UPDATE transaction"
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Worker processes (default: one per core)"
+        )
+        parser.add_argument(
+            '--changed-only', action='store_true',
+            help="Only write rows whose stored metrics or edge sums differ from "
+                 "the new ones"
+        )
+        parser.add_argument(
+            '--start-id', type=int, default=0,
+            help="Only recompute polygons with a greater id, to resume a run"
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        if chunk_size < 1 or workers < 1:
+            raise CommandError("--chunk-size and --workers must be at least 1")
+        total = Polygon.objects.filter(id__gt=options['start_id']).count()
+        metrics_memo.clear()
+
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        in_flight = collections.deque()
+        started = last_report = time.perf_counter()
+        done = updated = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for low, high in self.ranges(options['start_id'], chunk_size):
+                in_flight.append((
+                    pool.submit(_recompute_range, low, high, options['changed_only']),
+                    high
+                ))
+                if len(in_flight) < workers * 2:
+                    continue
+                future, high = in_flight.popleft()
+                rows, written = future.result()
+                done += rows
+                updated += written
+                now = time.perf_counter()
+                if now - last_report >= 5:
+                    last_report = now
+                    self.report(done, updated, total, high, now - started)
+            while in_flight:
+                future, high = in_flight.popleft()
+                rows, written = future.result()
+                done += rows
+                updated += written
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Recomputed {done} polygons in {elapsed:.1f} s, updated {updated}"
+        )
+
+    def ranges(self, start_id, chunk_size):
+        """
+        ``(low, high]`` id ranges of ``chunk_size`` polygons each.
+
+        Bounds are found one range at a time on the primary key index, so
+        polygons created during the run are picked up too; the last range
+        is open-ended (``high`` is None).
+        """
+        ids = Polygon.objects.order_by('id').values_list('id', flat=True)
+        low = start_id
+        while True:
+            try:
+                high = ids.filter(id__gt=low)[chunk_size - 1]
+            except IndexError:
+                yield low, None
+                return
+            yield low, high
+            low = high
+
+    def report(self, done, updated, total, high, elapsed):
+        percent = done / total * 100 if total else 100
+        self.stderr.write(
+            f"{percent:5.1f}%  {done} recomputed, {updated} updated, "
+            f"{done / elapsed:.0f} polygons/s, up to id {high}"
+        )
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygons', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='polygon',
+            options={'ordering': ['-created_at', '-id'], 'verbose_name': 'Polygon', 'verbose_name_plural': 'Polygons'},
+        ),
+        migrations.AddIndex(
+            model_name='polygon',
+            index=models.Index(fields=['created_at', 'id'], name='polygon_created_id_idx'),
+        ),
+    ]
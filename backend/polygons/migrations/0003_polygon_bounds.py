@@ -0,0 +1,74 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:03
+
+from django.db import migrations, models
+from shapely.geometry import Polygon as ShapelyPolygon
+
+
+def backfill_bounds(apps, schema_editor):
+    Polygon = apps.get_model('polygons', 'Polygon')
+    batch = []
+    for polygon in Polygon.objects.only('id', 'coordinates').iterator(chunk_size=2000):
+        try:
+            shape = ShapelyPolygon(polygon.coordinates)
+        except (TypeError, ValueError):
+            continue
+        polygon.min_lng, polygon.min_lat, polygon.max_lng, polygon.max_lat = shape.bounds
+        polygon.centroid_lng, polygon.centroid_lat = shape.centroid.coords[0]
+        batch.append(polygon)
+        if len(batch) >= 2000:
+            Polygon.objects.bulk_update(batch, BOUND_FIELDS)
+            batch = []
+    if batch:
+        Polygon.objects.bulk_update(batch, BOUND_FIELDS)
+
+
+BOUND_FIELDS = ['min_lng', 'min_lat', 'max_lng', 'max_lat', 'centroid_lng', 'centroid_lat']
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygons', '0002_polygon_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='polygon',
+            name='centroid_lat',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='polygon',
+            name='centroid_lng',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='polygon',
+            name='max_lat',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='polygon',
+            name='max_lng',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='polygon',
+            name='min_lat',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='polygon',
+            name='min_lng',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_bounds, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='polygon',
+            index=models.Index(fields=['min_lng', 'max_lng'], name='polygon_lng_bounds_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='polygon',
+            index=models.Index(fields=['min_lat', 'max_lat'], name='polygon_lat_bounds_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:06
+
+from django.db import migrations, models
+import numpy as np
+import shapely
+from shapely.errors import GEOSException
+from shapely.geometry import Polygon as ShapelyPolygon
+
+# Frozen copy of polygons.simplify as of this migration, with the default
+# POLYGON_SIMPLIFY_TOLERANCES, so later changes do not alter the backfill.
+TOLERANCES = (0.0001, 0.001, 0.01)
+
+
+def simplified_levels(geometries):
+    geometries = np.asarray(geometries, dtype=object)
+    vertex_counts = shapely.get_num_coordinates(geometries)
+    levels = [{} for _ in range(len(geometries))]
+    for tolerance in TOLERANCES:
+        simplified = shapely.simplify(geometries, tolerance, preserve_topology=True)
+        reduced = np.flatnonzero(shapely.get_num_coordinates(simplified) < vertex_counts)
+        key = repr(float(tolerance))
+        for i in reduced.tolist():
+            ring = shapely.get_coordinates(shapely.get_exterior_ring(simplified[i]))
+            levels[i][key] = ring.tolist()
+    return levels
+
+
+def backfill_simplified(apps, schema_editor):
+    Polygon = apps.get_model('polygons', 'Polygon')
+    rows = Polygon.objects.only('id', 'coordinates').order_by('id')
+    batch, geometries = [], []
+    for polygon in rows.iterator(chunk_size=2000):
+        # Rows that do not parse as a valid polygon keep no levels; readers
+        # fall back to the full ring.
+        try:
+            shape = ShapelyPolygon(polygon.coordinates)
+            if not shape.is_valid:
+                continue
+        except (TypeError, ValueError, GEOSException):
+            continue
+        batch.append(polygon)
+        geometries.append(shape)
+        if len(batch) >= 2000:
+            _save_levels(Polygon, batch, geometries)
+            batch, geometries = [], []
+    if batch:
+        _save_levels(Polygon, batch, geometries)
+
+
+def _save_levels(Polygon, batch, geometries):
+    for polygon, levels in zip(batch, simplified_levels(geometries)):
+        polygon.simplified_coordinates = levels
+    Polygon.objects.bulk_update(batch, ['simplified_coordinates'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygons', '0003_polygon_bounds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='polygon',
+            name='simplified_coordinates',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Simplified rings keyed by tolerance in degrees'),
+        ),
+        migrations.RunPython(backfill_simplified, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:09
+
+from django.db import migrations, models
+import numpy as np
+
+
+def backfill_packed(apps, schema_editor):
+    Polygon = apps.get_model('polygons', 'Polygon')
+    rows = Polygon.objects.only('id', 'coordinates').order_by('id')
+    batch = []
+    for polygon in rows.iterator(chunk_size=2000):
+        # Rows that are not a list of number pairs stay unpacked; readers
+        # fall back to the JSON field.
+        try:
+            ring = np.asarray(polygon.coordinates, dtype='<f8')
+        except (TypeError, ValueError):
+            continue
+        if ring.ndim != 2 or ring.shape[1] != 2:
+            continue
+        polygon.coordinates_packed = ring.tobytes()
+        batch.append(polygon)
+        if len(batch) >= 2000:
+            Polygon.objects.bulk_update(batch, ['coordinates_packed'])
+            batch = []
+    if batch:
+        Polygon.objects.bulk_update(batch, ['coordinates_packed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygons', '0004_polygon_simplified_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='polygon',
+            name='coordinates_packed',
+            field=models.BinaryField(help_text='coordinates as little-endian float64 lng/lat pairs', null=True),
+        ),
+        migrations.RunPython(backfill_packed, migrations.RunPython.noop),
+    ]
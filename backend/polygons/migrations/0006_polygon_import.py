@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygons', '0005_polygon_coordinates_packed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PolygonImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Absolute path of the imported file', max_length=1024, unique=True)),
+                ('source_size', models.BigIntegerField(help_text='File size in bytes when the import started')),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Polygon import',
+                'verbose_name_plural': 'Polygon imports',
+            },
+        ),
+        migrations.CreateModel(
+            name='PolygonImportChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_offset', models.BigIntegerField(help_text='Byte offset just past the previous feature')),
+                ('end_offset', models.BigIntegerField(help_text="Byte offset just past the chunk's last feature")),
+                ('first_feature', models.BigIntegerField(help_text="Number of the chunk's first feature in the file")),
+                ('features', models.IntegerField()),
+                ('imported', models.IntegerField()),
+                ('failed', models.IntegerField()),
+                ('polygon_import', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='polygons.polygonimport')),
+            ],
+            options={
+                'ordering': ['polygon_import', 'start_offset'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='polygonimportchunk',
+            constraint=models.UniqueConstraint(fields=('polygon_import', 'start_offset'), name='polygon_import_chunk_start_uniq'),
+        ),
+    ]
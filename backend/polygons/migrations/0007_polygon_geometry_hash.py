@@ -0,0 +1,75 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:15
+
+from django.db import migrations, models
+import hashlib
+import math
+
+import numpy as np
+
+
+# Frozen copy of polygons.dedupe.ring_hash as of this migration, so later
+# changes there do not alter the backfill.
+def ring_hash(ring):
+    coords = np.asarray(ring, dtype=np.float64) + 0.0
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = (coords[1:] != coords[:-1]).any(axis=1)
+    coords = coords[keep]
+    while len(coords) > 1 and (coords[0] == coords[-1]).all():
+        coords = coords[:-1]
+    if len(coords) > 2:
+        centred = coords - coords.min(axis=0)
+        following = np.roll(centred, -1, axis=0)
+        terms = centred[:, 0] * following[:, 1] - following[:, 0] * centred[:, 1]
+        if math.fsum(terms.tolist()) < 0:
+            coords = coords[::-1]
+    if len(coords):
+        coords = np.roll(coords, -int(np.lexsort((coords[:, 1], coords[:, 0]))[0]), axis=0)
+    data = np.ascontiguousarray(coords, dtype='<f8').tobytes()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def backfill_hash(apps, schema_editor):
+    Polygon = apps.get_model('polygons', 'Polygon')
+    rows = Polygon.objects.only('id', 'coordinates_packed', 'coordinates').order_by('id')
+    batch = []
+    for polygon in rows.iterator(chunk_size=2000):
+        if polygon.coordinates_packed is not None:
+            ring = np.frombuffer(polygon.coordinates_packed, dtype='<f8').reshape(-1, 2)
+        else:
+            ring = polygon.coordinates
+        # Rows that are not a list of number pairs keep no hash and so never
+        # match as duplicates.
+        try:
+            ring = np.asarray(ring, dtype=np.float64)
+        except (TypeError, ValueError):
+            continue
+        if ring.ndim != 2 or ring.shape[1] != 2:
+            continue
+        polygon.geometry_hash = ring_hash(ring)
+        batch.append(polygon)
+        if len(batch) >= 2000:
+            Polygon.objects.bulk_update(batch, ['geometry_hash'])
+            batch = []
+    if batch:
+        Polygon.objects.bulk_update(batch, ['geometry_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygons', '0006_polygon_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='polygon',
+            name='geometry_hash',
+            field=models.CharField(db_index=True, editable=False, help_text='Hash of the ring independent of start vertex and orientation', max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='polygonimportchunk',
+            name='duplicates',
+            field=models.IntegerField(default=0, help_text='Features merged into an already stored polygon'),
+        ),
+        migrations.RunPython(backfill_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygons', '0007_polygon_geometry_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='polygon',
+            name='edge_excess_sum',
+            field=models.FloatField(editable=False, help_text='Signed spherical excess in steradians', null=True),
+        ),
+        migrations.AddField(
+            model_name='polygon',
+            name='edge_length_sum',
+            field=models.FloatField(editable=False, help_text='Perimeter in meters, unrounded', null=True),
+        ),
+        migrations.AddField(
+            model_name='polygon',
+            name='edge_longitude_sum',
+            field=models.FloatField(editable=False, help_text='Longitude steps in radians', null=True),
+        ),
+    ]
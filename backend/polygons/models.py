@@ -1,10 +1,51 @@
+import logging
+
 from django.db import models
+from django.db.models import Case, F, When
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 import json
-from shapely.geometry import Polygon as ShapelyPolygon
 from shapely.geometry import MultiPolygon as ShapelyMultiPolygon
 
+from . import geodesic
+from .dedupe import Metrics, metrics_memo
+from .instrumentation import METRICS_CALCULATION, timed
+from .geometry import pack_coordinates, unpack_coordinates
+from .simplify import pick_ring, simplified_levels
+from .validation import prepare_ring
+
+# Columns holding the ring's geodesic edge sums, in geodesic.packed_sums order
+SUM_FIELDS = ('edge_excess_sum', 'edge_longitude_sum', 'edge_length_sum')
+
+logger = logging.getLogger(__name__)
+
+
+def unpacked_coordinates():
+    """
+    The JSON ``coordinates`` of rows without ``coordinates_packed``, NULL for
+    the rest, so readers of the packed ring fetch the JSON only where needed.
+    """
+    return Case(
+        When(coordinates_packed__isnull=True, then=F('coordinates')),
+        default=None,
+        output_field=models.JSONField()
+    )
+
+
+def stored_ring(polygon_id, packed, coordinates):
+    """
+    A row's ring from ``coordinates_packed``, else from its JSON
+    ``coordinates``; None, logged, when the JSON is not a list of pairs
+    (migration 0005 leaves such rows unpacked).
+    """
+    if packed is not None:
+        return unpack_coordinates(packed)
+    try:
+        return geodesic.as_ring_array(coordinates)
+    except (TypeError, ValueError):
+        logger.warning("Polygon %s has no readable coordinates", polygon_id)
+        return None
+
 
 class Polygon(models.Model):
     name = models.CharField(max_length=255, blank=True)
@@ -21,42 +62,126 @@ class Polygon(models.Model):
         validators=[MinValueValidator(Decimal('0.01'))],
         help_text="Perimeter in meters"
     )
+    coordinates_packed = models.BinaryField(
+        null=True,
+        editable=False,
+        help_text="coordinates as little-endian float64 lng/lat pairs"
+    )
+    simplified_coordinates = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Simplified rings keyed by tolerance in degrees"
+    )
+    min_lng = models.FloatField(null=True, editable=False)
+    min_lat = models.FloatField(null=True, editable=False)
+    max_lng = models.FloatField(null=True, editable=False)
+    max_lat = models.FloatField(null=True, editable=False)
+    centroid_lng = models.FloatField(null=True, editable=False)
+    centroid_lat = models.FloatField(null=True, editable=False)
+    # Sums over the ring's edges of geodesic.edge_terms, from which area and
+    # perimeter follow; vertex edits update them from the edges they change.
+    # Null until first computed for rows older than these columns.
+    edge_excess_sum = models.FloatField(
+        null=True, editable=False, help_text="Signed spherical excess in steradians"
+    )
+    edge_longitude_sum = models.FloatField(
+        null=True, editable=False, help_text="Longitude steps in radians"
+    )
+    edge_length_sum = models.FloatField(
+        null=True, editable=False, help_text="Perimeter in meters, unrounded"
+    )
+    geometry_hash = models.CharField(
+        max_length=32,
+        null=True,
+        editable=False,
+        db_index=True,
+        help_text="Hash of the ring independent of start vertex and orientation"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='polygon_created_id_idx'),
+            models.Index(fields=['min_lng', 'max_lng'], name='polygon_lng_bounds_idx'),
+            models.Index(fields=['min_lat', 'max_lat'], name='polygon_lat_bounds_idx'),
+        ]
         verbose_name = "Polygon"
         verbose_name_plural = "Polygons"
 
+    _prepared_ring = None
+
     def __str__(self):
         return f"{self.name or 'Unnamed'} - {self.area_sq_meters} m²"
 
+    @timed(METRICS_CALCULATION)
     def calculate_metrics(self):
         if not self.coordinates or len(self.coordinates) < 3:
             raise ValueError("At least 3 coordinate pairs are required for a polygon")
         
+        prepared = self._prepared_ring
+        self._prepared_ring = None
+        
         try:
-            shapely_polygon = ShapelyPolygon(self.coordinates)
-            
-            if not shapely_polygon.is_valid:
-                raise ValueError("Invalid polygon geometry")
+            # Reuse the geometry built during validation when it still
+            # describes these coordinates.
+            if prepared is None or prepared.coordinates is not self.coordinates:
+                prepared = prepare_ring(self.coordinates)
             
-            area_degrees = shapely_polygon.area
-            self.area_sq_meters = Decimal(str(area_degrees * 111000 * 111000))
-            
-            perimeter_degrees = shapely_polygon.length
-            self.perimeter_meters = Decimal(str(perimeter_degrees * 111000))
+            self.coordinates_packed = pack_coordinates(prepared.array)
+            self.geometry_hash = prepared.hash
+            metrics = prepared.metrics
+            if metrics is None:
+                geometry = prepared.geometry
+                sums = geodesic.ring_sums(prepared.array)
+                metrics = Metrics(
+                    float(geodesic.areas_from_sums(sums[0], sums[1])), sums[2],
+                    geometry.bounds, geometry.centroid.coords[0],
+                    simplified_levels([geometry])[0], sums
+                )
+                metrics_memo.put(prepared.hash, prepared.array, metrics)
+            self.apply_metrics(metrics)
             
         except Exception as e:
             raise ValueError(f"Error calculating metrics: {str(e)}")
 
-    def to_geojson(self):
+    def use_prepared_ring(self, prepared):
+        self._prepared_ring = prepared
+
+    def coordinate_array(self):
+        if self.coordinates_packed is not None:
+            return unpack_coordinates(self.coordinates_packed)
+        return geodesic.as_ring_array(self.coordinates)
+
+    def set_metrics(self, area, perimeter):
+        self.area_sq_meters = Decimal(str(round(area, 2)))
+        self.perimeter_meters = Decimal(str(round(perimeter, 2)))
+
+    def set_bounds(self, bounds, centroid):
+        self.min_lng, self.min_lat, self.max_lng, self.max_lat = bounds
+        self.centroid_lng, self.centroid_lat = centroid
+
+    def set_sums(self, sums):
+        for field, value in zip(SUM_FIELDS, sums):
+            setattr(self, field, value)
+
+    def apply_metrics(self, metrics):
+        self.set_metrics(metrics.area, metrics.perimeter)
+        self.set_sums(metrics.sums)
+        self.set_bounds(metrics.bounds, metrics.centroid)
+        self.simplified_coordinates = metrics.simplified
+
+    def to_geojson(self, tolerance=None):
+        coordinates = pick_ring(
+            self.coordinates, self.simplified_coordinates, tolerance
+        )
         return {
             "type": "Feature",
             "geometry": {
                 "type": "Polygon",
-                "coordinates": [self.coordinates]
+                "coordinates": [coordinates]
             },
             "properties": {
                 "id": self.id,
@@ -71,4 +196,61 @@ class Polygon(models.Model):
     def save(self, *args, **kwargs):
         if self.coordinates:
             self.calculate_metrics()
-        super().save(*args, **kwargs) 
\ No newline at end of file
+        super().save(*args, **kwargs) 
+
+
+class PolygonImport(models.Model):
+    """An ``import_polygons`` run over one file."""
+    source = models.CharField(
+        max_length=1024, unique=True, help_text="Absolute path of the imported file"
+    )
+    source_size = models.BigIntegerField(
+        help_text="File size in bytes when the import started"
+    )
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Polygon import"
+        verbose_name_plural = "Polygon imports"
+
+    def __str__(self):
+        return self.source
+
+
+class PolygonImportChunk(models.Model):
+    """
+    A committed chunk of an import.
+
+    Written in the same transaction as the chunk's polygons, so after a
+    crash the chunks present are exactly the ones that need no redoing.
+    Chunks cover the file in byte ranges ``(start_offset, end_offset]``.
+    """
+    polygon_import = models.ForeignKey(
+        PolygonImport, on_delete=models.CASCADE, related_name='chunks'
+    )
+    start_offset = models.BigIntegerField(
+        help_text="Byte offset just past the previous feature"
+    )
+    end_offset = models.BigIntegerField(
+        help_text="Byte offset just past the chunk's last feature"
+    )
+    first_feature = models.BigIntegerField(
+        help_text="Number of the chunk's first feature in the file"
+    )
+    features = models.IntegerField()
+    imported = models.IntegerField()
+    failed = models.IntegerField()
+    duplicates = models.IntegerField(
+        default=0, help_text="Features merged into an already stored polygon"
+    )
+
+    class Meta:
+        ordering = ['polygon_import', 'start_offset']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['polygon_import', 'start_offset'],
+                name='polygon_import_chunk_start_uniq'
+            ),
+        ]
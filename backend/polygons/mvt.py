@@ -0,0 +1,170 @@
+"""
+Minimal Mapbox Vector Tile (v2) encoder for polygon layers.
+
+Only what the polygon tiles need is implemented: one or more layers of
+POLYGON features with string/number properties.  The protobuf wire format
+is written by hand so no protobuf runtime is required.
+"""
+import math
+import struct
+
+import numpy as np
+import shapely
+
+EXTENT = 4096
+BUFFER = 64
+
+_POLYGON = 3
+_MOVE_TO, _LINE_TO, _CLOSE_PATH = 1, 2, 7
+
+# Protobuf wire types
+_VARINT, _FIXED64, _LENGTH = 0, 1, 2
+
+
+def tile_bounds(z, x, y):
+    """``(min_lng, min_lat, max_lng, max_lat)`` of Web Mercator tile z/x/y."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def project(coords, z, x, y):
+    """Project ``[lng, lat]`` rows into tile pixel space (y grows down)."""
+    n = 2 ** z
+    coords = np.asarray(coords, dtype=np.float64)
+    lat = np.radians(np.clip(coords[:, 1], -85.0511287798, 85.0511287798))
+    px = ((coords[:, 0] + 180) / 360 * n - x) * EXTENT
+    py = ((1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2 * n - y) * EXTENT
+    return np.column_stack([px, py])
+
+
+def clip_to_tile(geometries):
+    """Clip projected geometries to the tile extent plus its buffer."""
+    return shapely.clip_by_rect(
+        geometries, -BUFFER, -BUFFER, EXTENT + BUFFER, EXTENT + BUFFER
+    )
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _length_delimited(field, payload):
+    return _key(field, _LENGTH) + _varint(len(payload)) + payload
+
+
+def _packed(field, values):
+    return _length_delimited(field, b''.join(_varint(v) for v in values))
+
+
+def _zigzag(values):
+    return (values << 1) ^ (values >> 63)
+
+
+def _ring_commands(ring, cursor):
+    """
+    Geometry commands for one quantized ring, without its closing vertex.
+
+    ``cursor`` is the running pen position, updated in place.
+    """
+    deltas = np.diff(np.vstack([cursor, ring]), axis=0)
+    cursor[:] = ring[-1]
+    params = _zigzag(deltas.astype(np.int64)).ravel().tolist()
+    return (
+        [(_MOVE_TO & 0x7) | (1 << 3)] + params[:2]
+        + [(_LINE_TO & 0x7) | ((len(ring) - 1) << 3)] + params[2:]
+        + [(_CLOSE_PATH & 0x7) | (1 << 3)]
+    )
+
+
+def _quantize_ring(coords, exterior):
+    ring = np.rint(np.asarray(coords)[:-1]).astype(np.int64)
+    if len(ring) == 0:
+        return None
+    # Drop repeated vertices created by rounding.
+    keep = np.any(ring != np.roll(ring, 1, axis=0), axis=1)
+    ring = ring[keep] if keep.any() else ring[:1]
+    if len(ring) < 3:
+        return None
+    x, y = ring[:, 0], ring[:, 1]
+    area = np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)
+    if area == 0:
+        return None
+    # Exterior rings wind positively in tile space, interior rings negatively.
+    if (area > 0) != exterior:
+        ring = ring[::-1]
+    return ring
+
+
+def polygon_commands(geometry):
+    """MVT geometry command stream for a projected Polygon or MultiPolygon."""
+    commands = []
+    cursor = np.zeros(2, dtype=np.int64)
+    for part in shapely.get_parts(geometry):
+        if not isinstance(part, shapely.Polygon):
+            continue
+        exterior = _quantize_ring(part.exterior.coords, True)
+        if exterior is None:
+            continue
+        commands += _ring_commands(exterior, cursor)
+        for interior in part.interiors:
+            ring = _quantize_ring(interior.coords, False)
+            if ring is not None:
+                commands += _ring_commands(ring, cursor)
+    return commands
+
+
+def _encode_value(value):
+    if isinstance(value, bool):
+        return _key(7, _VARINT) + _varint(int(value))
+    if isinstance(value, int) and value >= 0:
+        return _key(5, _VARINT) + _varint(value)
+    if isinstance(value, (int, float)):
+        return _key(3, _FIXED64) + struct.pack('<d', float(value))
+    return _length_delimited(1, str(value).encode('utf-8'))
+
+
+def encode_layer(name, features):
+    """
+    Encode a layer of ``(id, commands, properties)`` feature tuples.
+
+    Features with an empty command stream are skipped.
+    """
+    keys, values = {}, {}
+    body = bytearray()
+    for feature_id, commands, properties in features:
+        if not commands:
+            continue
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        feature = _key(1, _VARINT) + _varint(feature_id)
+        feature += _packed(2, tags)
+        feature += _key(3, _VARINT) + _varint(_POLYGON)
+        feature += _packed(4, commands)
+        body += _length_delimited(2, feature)
+
+    layer = _key(15, _VARINT) + _varint(2)
+    layer += _length_delimited(1, name.encode('utf-8'))
+    layer += bytes(body)
+    for key in keys:
+        layer += _length_delimited(3, key.encode('utf-8'))
+    for _, value in values:
+        layer += _length_delimited(4, _encode_value(value))
+    layer += _key(5, _VARINT) + _varint(EXTENT)
+    return _length_delimited(3, layer)
@@ -0,0 +1,34 @@
+"""
+Keyset pagination for polygon endpoints.
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+from .renderers import dumps
+
+
+class PolygonCursorPagination(CursorPagination):
+    """
+    Cursor pagination keyed on ``(created_at, id)``.
+
+    Backed by the composite ``polygon_created_id_idx`` index, so deep pages
+    cost the same as the first one.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = settings.POLYGON_MAX_PAGE_SIZE
+
+    def is_requested(self, request):
+        """True when the client asked for a page rather than everything."""
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def encode_feature_collection(self, features):
+        """The page as a FeatureCollection body, from encoded ``features``."""
+        return (
+            b'{"type":"FeatureCollection","next":' + dumps(self.get_next_link())
+            + b',"previous":' + dumps(self.get_previous_link())
+            + b',"features":[' + b','.join(features) + b']}'
+        )
@@ -0,0 +1,251 @@
+"""
+On-demand profiling of single requests.
+
+A request is profiled when it carries ``X-Profile: 1`` (or ``?profile=1``)
+and comes from a staff user, when the header carries
+``POLYGON_PROFILE_TOKEN``, or when it is picked at random at
+``POLYGON_PROFILE_SAMPLE_RATE``.  Other requests only pay for a header
+lookup and a substring test (about 1 us).
+
+A profiled request is sampled by a background thread every
+``POLYGON_PROFILE_INTERVAL`` seconds, including while a streamed response
+is being sent.  Each profile is written to ``POLYGON_PROFILE_DIR`` as
+``<id>.folded`` (collapsed stacks, for ``flamegraph.pl`` or speedscope)
+and ``<id>.json`` (request details and the SQL it ran with timings).  The
+``profiles`` management command lists and summarizes them.  Profiles
+record request paths and SQL, so the directory must be private to the
+user running the server.
+
+Sync requests sample only their own thread.  Async requests sample every
+thread, since their work hops between the event loop and worker threads,
+so concurrent requests can show up in their stacks.
+"""
+import json
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.utils import timezone
+
+from .instrumentation import on_response_end
+
+_active_profile = ContextVar('polygon_active_profile', default=None)
+
+
+def _frame_label(code):
+    path = code.co_filename.replace(os.sep, '/').rsplit('/', 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Counts collapsed stacks of ``thread_id`` (or all threads if None)."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='polygon-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frames = {self.thread_id: frames.get(self.thread_id)}
+            for thread_id, frame in frames.items():
+                if frame is None or thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Profile:
+    """One profiled request: its stack sampler and the SQL it ran."""
+
+    def __init__(self, request, thread_id):
+        self.id = f"{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.request = request
+        self.started_at = timezone.now()
+        self.started = time.perf_counter()
+        self.queries = []
+        self.sampler = StackSampler(thread_id, settings.POLYGON_PROFILE_INTERVAL)
+        self.sampler.start()
+
+    def finish(self, response, size):
+        duration = time.perf_counter() - self.started
+        self.sampler.stop()
+        match = self.request.resolver_match
+        directory = profile_directory()
+        with open(os.path.join(directory, f"{self.id}.folded"), 'w') as f:
+            for stack, count in self.sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(os.path.join(directory, f"{self.id}.json"), 'w') as f:
+            json.dump({
+                'id': self.id,
+                'method': self.request.method,
+                'path': self.request.get_full_path(),
+                'route': match.url_name if match else None,
+                'status': response.status_code,
+                'response_bytes': size,
+                'started_at': self.started_at.isoformat(),
+                'duration': duration,
+                'interval': self.sampler.interval,
+                'samples': self.sampler.samples,
+                'query_count': len(self.queries),
+                'query_time': sum(query['duration'] for query in self.queries),
+                'queries': self.queries,
+            }, f, indent=1)
+
+
+def profile_directory():
+    """
+    ``POLYGON_PROFILE_DIR``, created with mode 0700 if missing.
+
+    Raises ImproperlyConfigured if another user owns it or can open it,
+    e.g. when someone else created it first in a shared temp directory.
+    """
+    directory = settings.POLYGON_PROFILE_DIR
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.geteuid() or info.st_mode & 0o077:
+        raise ImproperlyConfigured(
+            f"POLYGON_PROFILE_DIR {directory} must be owned by this user "
+            "and closed to everyone else (mode 0700)"
+        )
+    return directory
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper logging SQL run by a profiled request."""
+    profile = _active_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries.append({
+            'sql': sql, 'many': many, 'duration': time.perf_counter() - started
+        })
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver adding :func:`record_query`."""
+    if settings.POLYGON_PROFILE_DIR and record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _profile_flag(request):
+    flag = request.META.get('HTTP_X_PROFILE')
+    if flag is None and 'profile=' in request.META.get('QUERY_STRING', ''):
+        flag = request.GET.get('profile')
+    return flag
+
+
+def wants_profile(request):
+    """Whether ``request`` asked for, or was sampled for, profiling."""
+    flag = _profile_flag(request)
+    if flag:
+        token = settings.POLYGON_PROFILE_TOKEN
+        if token and secrets.compare_digest(flag.encode(), token.encode()):
+            return True
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+    rate = settings.POLYGON_PROFILE_SAMPLE_RATE
+    return bool(rate) and random.random() < rate
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.POLYGON_PROFILE_DIR:
+            raise MiddlewareNotUsed
+        profile_directory()
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not wants_profile(request):
+            return self.get_response(request)
+        profile = Profile(request, threading.get_ident())
+        token = _active_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        return self.finish(profile, response)
+
+    async def __acall__(self, request):
+        if _profile_flag(request):
+            # Checking for a staff user may load the session.
+            profiled = await sync_to_async(wants_profile)(request)
+        else:
+            profiled = wants_profile(request)
+        if not profiled:
+            return await self.get_response(request)
+        profile = Profile(request, None)
+        token = _active_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        return self.finish(profile, response)
+
+    def finish(self, profile, response):
+        response['X-Profile-Id'] = profile.id
+        return on_response_end(
+            response, _active_profile, profile,
+            lambda size: profile.finish(response, size)
+        )
+
+
+def list_profiles(directory):
+    """Metadata of the stored profiles, newest first."""
+    try:
+        names = sorted(
+            (name for name in os.listdir(directory) if name.endswith('.json')),
+            reverse=True
+        )
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        with open(os.path.join(directory, name)) as f:
+            profiles.append(json.load(f))
+    return profiles
+
+
+def load_stacks(directory, profile_id):
+    """``Counter`` of collapsed stacks stored for ``profile_id``."""
+    stacks = Counter()
+    with open(os.path.join(directory, f"{profile_id}.folded")) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            stacks[stack] += int(count)
+    return stacks
@@ -0,0 +1,197 @@
+"""
+Query-count budgets and repeated-query (N+1) detection.
+
+``QUERY_BUDGETS`` holds the most queries each API route may run per method,
+not counting transaction control statements.  Budgets count steady-state
+requests: the spatial index already loaded and response caches missed.
+``QueryBudgetTests`` in the test suite requests every route and fails when
+one is over budget, as does ``manage.py check_query_budgets`` outside it;
+:class:`query_budget` enforces a budget around any block of code.
+
+With ``POLYGON_QUERY_DEBUG`` (on when ``DEBUG`` is) ``QueryDebugMiddleware``
+logs requests that exceed their budget or run the same statement shape
+``POLYGON_REPEATED_QUERY_THRESHOLD`` times or more.
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .instrumentation import on_response_end
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGETS = {
+    'polygon-list': {'GET': 1, 'POST': 2},
+    'polygon-detail': {'GET': 1, 'PUT': 3, 'PATCH': 3, 'DELETE': 2},
+    'polygon-vertices': {'PATCH': 2},
+    'polygon-geojson': {'GET': 1},
+    'polygon-geojson-collection': {'GET': 1},
+    'polygon-export': {'GET': 1},
+    'polygon-stats': {'GET': 3},
+    'polygon-bulk': {'POST': 2},
+    'polygon-contains': {'GET': 1},
+    'polygon-intersects': {'POST': 1},
+    'polygon-locate': {'POST': 0},
+    'polygon-tile': {'GET': 1},
+}
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_LISTS = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+# Issued as statements on SQLite but not on PostgreSQL; not counted, so
+# budgets hold on both.
+_TRANSACTION_CONTROL = re.compile(
+    r"\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b", re.IGNORECASE
+)
+
+_request_queries = ContextVar('polygon_request_queries', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """More queries ran than a budget allows."""
+
+
+def sql_shape(sql):
+    """
+    ``sql`` with literals and placeholder lists collapsed, so statements
+    that only differ in their parameters compare equal.
+    """
+    sql = _SQL_LITERALS.sub('?', ' '.join(sql.split()))
+    return _SQL_LISTS.sub('(...)', sql)
+
+
+def repeated_queries(queries, threshold):
+    """``(shape, count)`` of statement shapes run ``threshold`` times or more."""
+    counts = Counter(sql_shape(sql) for sql in queries)
+    return [
+        (shape, count) for shape, count in counts.most_common() if count >= threshold
+    ]
+
+
+def budget_for(route, method):
+    """The budget of ``route`` for ``method``, or None if it has none."""
+    return QUERY_BUDGETS.get(route, {}).get(method)
+
+
+def describe(queries, limit=10):
+    """Multi-line listing of ``queries`` for error messages."""
+    lines = [f"  {index}. {sql}" for index, sql in enumerate(queries[:limit], 1)]
+    if len(queries) > limit:
+        lines.append(f"  ... and {len(queries) - limit} more")
+    return '\n'.join(lines)
+
+
+class query_budget(ContextDecorator):
+    """
+    Context manager and decorator raising :class:`QueryBudgetExceeded` when
+    the wrapped code runs more than ``max_queries`` queries::
+
+        with query_budget(1, 'polygon list'):
+            client.get('/api/polygons/')
+
+    Queries on every database connection of the current thread are
+    counted; ``queries`` holds their SQL afterwards.
+    """
+
+    def __init__(self, max_queries, label='block'):
+        self.max_queries = max_queries
+        self.label = label
+        self.queries = []
+
+    def _record(self, execute, sql, params, many, context):
+        if not _TRANSACTION_CONTROL.match(sql):
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.queries = []
+        self._wrappers = [
+            connection.execute_wrapper(self._record) for connection in connections.all()
+        ]
+        for wrapper in self._wrappers:
+            wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        for wrapper in reversed(self._wrappers):
+            wrapper.__exit__(exc_type, exc, traceback)
+        if exc_type is None and len(self.queries) > self.max_queries:
+            raise QueryBudgetExceeded(
+                f"{self.label} ran {len(self.queries)} queries, budget is "
+                f"{self.max_queries}:\n{describe(self.queries)}"
+            )
+        return False
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper logging SQL for ``QueryDebugMiddleware``."""
+    queries = _request_queries.get()
+    if queries is not None and not _TRANSACTION_CONTROL.match(sql):
+        queries.append(sql)
+    return execute(sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver adding :func:`record_query`."""
+    if settings.POLYGON_QUERY_DEBUG and record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class QueryDebugMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.POLYGON_QUERY_DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = []
+        token = _request_queries.set(queries)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        return on_response_end(
+            response, _request_queries, queries,
+            lambda size: self.check(request, queries)
+        )
+
+    async def __acall__(self, request):
+        queries = []
+        token = _request_queries.set(queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        return on_response_end(
+            response, _request_queries, queries,
+            lambda size: self.check(request, queries)
+        )
+
+    def check(self, request, queries):
+        match = request.resolver_match
+        route = match.url_name if match else None
+        where = f"{request.method} {request.path}"
+        for shape, count in repeated_queries(
+            queries, settings.POLYGON_REPEATED_QUERY_THRESHOLD
+        ):
+            logger.warning("Possible N+1 in %s: ran %d times: %s", where, count, shape)
+        budget = budget_for(route, request.method)
+        if budget is not None and len(queries) > budget:
+            logger.warning(
+                "%s ran %d queries, budget for %s is %d:\n%s",
+                where, len(queries), route, budget, describe(queries)
+            )
@@ -0,0 +1,220 @@
+"""
+Rendered-response cache and HTTP validators for the GeoJSON read endpoints.
+
+Single-polygon responses are keyed by id and ``updated_at``, so an edit
+makes the old entry unreachable.  Collection responses are keyed by a
+collection version that every save and delete bumps, so with several
+workers the cache must be shared for each to see the others' writes.
+Both carry ETag and Last-Modified headers so unchanged resources come
+back as 304s.
+Aggregate statistics instead expire after a short timeout.
+"""
+import hashlib
+import logging
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'polygons:collection-version'
+EPOCH_KEY = 'polygons:collection-epoch'
+MODIFIED_KEY = 'polygons:collection-modified'
+
+
+class CacheStats:
+    """Per-process hit/miss counters, logged with every cached response."""
+
+    def __init__(self):
+        self.counts = {'hit': 0, 'miss': 0, 'not_modified': 0}
+
+    def record(self, outcome, name, started):
+        self.counts[outcome] += 1
+        served = self.counts['hit'] + self.counts['not_modified']
+        total = served + self.counts['miss']
+        logger.debug(
+            "%s cache %s in %.2f ms (hit ratio %.1f%% of %d)",
+            name, outcome, (time.perf_counter() - started) * 1000,
+            100 * served / total, total
+        )
+
+
+stats = CacheStats()
+
+
+def _cache():
+    return caches[settings.POLYGON_RESPONSE_CACHE]
+
+
+def _start_version(cache):
+    """Start a missing version counter under a new random epoch."""
+    if cache.add(VERSION_KEY, 0, timeout=None):
+        cache.set(EPOCH_KEY, secrets.token_hex(8), timeout=None)
+    else:
+        cache.add(EPOCH_KEY, secrets.token_hex(8), timeout=None)
+
+
+def collection_state():
+    """
+    ``(version, last_modified_timestamp)`` of the polygon collection.
+
+    The version is the write counter qualified by an epoch drawn whenever
+    the counter starts over, e.g. after a restart empties a local-memory
+    cache, so a restarted counter never repeats an earlier ETag.
+    """
+    cache = _cache()
+    keys = [EPOCH_KEY, VERSION_KEY, MODIFIED_KEY]
+    values = cache.get_many(keys)
+    if EPOCH_KEY not in values or VERSION_KEY not in values:
+        _start_version(cache)
+        values = cache.get_many(keys)
+    epoch = values.get(EPOCH_KEY) or secrets.token_hex(8)
+    return f'{epoch}.{values.get(VERSION_KEY, 0)}', values.get(MODIFIED_KEY)
+
+
+def bump_collection_version():
+    cache = _cache()
+    _start_version(cache)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        pass
+    cache.set(MODIFIED_KEY, int(time.time()), timeout=None)
+
+
+def response_key(name, *parts):
+    """Cache key and ETag for a response identified by ``parts``."""
+    digest = hashlib.sha1(
+        '\x1f'.join(str(part) for part in parts).encode('utf-8')
+    ).hexdigest()
+    return f'polygons:response:{name}:{digest}', quote_etag(digest)
+
+
+def _add_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _not_modified(request, name, etag, last_modified, started):
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is not None:
+        stats.record('not_modified', name, started)
+        _add_validators(response, etag, last_modified)
+    return response
+
+
+def cached_response(request, name, parts, last_modified, render):
+    """
+    Serve ``render()`` (which returns the encoded body) through the cache.
+
+    ``parts`` must identify the response completely; ``last_modified`` is
+    a POSIX timestamp or ``None``.
+    """
+    started = time.perf_counter()
+    key, etag = response_key(name, *parts)
+    not_modified = _not_modified(request, name, etag, last_modified, started)
+    if not_modified is not None:
+        return not_modified
+
+    cache = _cache()
+    body = cache.get(key)
+    if body is None:
+        body = render()
+        cache.set(key, body, settings.POLYGON_RESPONSE_CACHE_TIMEOUT)
+        stats.record('miss', name, started)
+    else:
+        stats.record('hit', name, started)
+    response = HttpResponse(body, content_type='application/json')
+    return _add_validators(response, etag, last_modified)
+
+
+def expiring_response(name, parts, timeout, render):
+    """
+    Serve ``render()`` from the cache for up to ``timeout`` seconds.
+
+    For responses too costly to recompute after every write, which is what
+    keying them by collection version would mean.  They can be up to
+    ``timeout`` seconds stale, so they carry no validators.
+    """
+    started = time.perf_counter()
+    key, etag = response_key(name, *parts)
+    cache = _cache()
+    body = cache.get(key)
+    if body is None:
+        body = render()
+        cache.set(key, body, timeout)
+        stats.record('miss', name, started)
+    else:
+        stats.record('hit', name, started)
+    return HttpResponse(body, content_type='application/json')
+
+
+def _tee(chunks, key):
+    """Pass ``chunks`` through, caching the whole body if it stays small."""
+    limit = settings.POLYGON_RESPONSE_CACHE_MAX_BYTES
+    parts, size = [], 0
+    for chunk in chunks:
+        if parts is not None:
+            size += len(chunk)
+            if size <= limit:
+                parts.append(chunk)
+            else:
+                parts = None
+        yield chunk
+    if parts is not None:
+        _cache().set(key, b''.join(parts), settings.POLYGON_RESPONSE_CACHE_TIMEOUT)
+
+
+async def _atee(chunks, key):
+    """:func:`_tee` for an async iterator."""
+    limit = settings.POLYGON_RESPONSE_CACHE_MAX_BYTES
+    parts, size = [], 0
+    async for chunk in chunks:
+        if parts is not None:
+            size += len(chunk)
+            if size <= limit:
+                parts.append(chunk)
+            else:
+                parts = None
+        yield chunk
+    if parts is not None:
+        await _cache().aset(
+            key, b''.join(parts), settings.POLYGON_RESPONSE_CACHE_TIMEOUT
+        )
+
+
+def cached_streaming_response(request, name, parts, last_modified, chunks):
+    """
+    Like :func:`cached_response` for a streamed body.
+
+    ``chunks`` is a zero-argument callable returning the byte iterator,
+    sync or async. On a miss the stream is copied into the cache as it is
+    sent, unless it grows past ``POLYGON_RESPONSE_CACHE_MAX_BYTES``.
+    """
+    started = time.perf_counter()
+    key, etag = response_key(name, *parts)
+    not_modified = _not_modified(request, name, etag, last_modified, started)
+    if not_modified is not None:
+        return not_modified
+
+    body = _cache().get(key)
+    if body is not None:
+        stats.record('hit', name, started)
+        response = HttpResponse(body, content_type='application/json')
+    else:
+        stats.record('miss', name, started)
+        body = chunks()
+        tee = _atee if hasattr(body, '__aiter__') else _tee
+        response = StreamingHttpResponse(
+            tee(body, key), content_type='application/json'
+        )
+    return _add_validators(response, etag, last_modified)
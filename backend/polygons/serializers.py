@@ -1,8 +1,34 @@
 from rest_framework import serializers
+from django.conf import settings
+from django.db.models import TextField
+from django.db.models.functions import Cast
+from django.utils import timezone
 from .models import Polygon
-from shapely.geometry import Polygon as ShapelyPolygon
+from .instrumentation import VALIDATION, timed
+from .renderers import dumps
+from .simplify import pick_ring
+from .validation import InvalidRing, check_ring_array, prepare_ring
 from decimal import Decimal
 
+# Columns read by the fast read paths below.
+LIST_FIELDS = ('id', 'name', 'area_sq_meters', 'perimeter_meters', 'created_at')
+FEATURE_FIELDS = (
+    'id', 'name', 'area_sq_meters', 'perimeter_meters', 'created_at', 'updated_at'
+)
+
+
+def check_ring(value):
+    """
+    Shape and range checks for a ``[[lng, lat], ...]`` ring.
+
+    Returns the ring as a float64 array.  Geometry validity is left to the
+    caller so batch paths can test many rings at once.
+    """
+    try:
+        return check_ring_array(value)
+    except InvalidRing as e:
+        raise serializers.ValidationError(str(e))
+
 
 class PolygonSerializer(serializers.ModelSerializer):
     area_hectares = serializers.SerializerMethodField()
@@ -28,36 +54,40 @@ class PolygonSerializer(serializers.ModelSerializer):
             return float(obj.area_sq_meters) / 4046.86
         return None
 
+    @timed(VALIDATION)
     def validate_coordinates(self, value):
-        if not value or not isinstance(value, list):
-            raise serializers.ValidationError("Coordinates must be a list of coordinate pairs")
-        
-        if len(value) < 3:
-            raise serializers.ValidationError("At least 3 coordinate pairs are required for a polygon")
-        
-        for coord in value:
-            if not isinstance(coord, list) or len(coord) != 2:
-                raise serializers.ValidationError("Each coordinate must be a list with exactly 2 values [lng, lat]")
-            
-            lng, lat = coord
-            if not isinstance(lng, (int, float)) or not isinstance(lat, (int, float)):
-                raise serializers.ValidationError("Longitude and latitude must be numbers")
-            
-            if not (-180 <= lng <= 180):
-                raise serializers.ValidationError("Longitude must be between -180 and 180")
-            
-            if not (-90 <= lat <= 90):
-                raise serializers.ValidationError("Latitude must be between -90 and 90")
-        
         try:
-            shapely_polygon = ShapelyPolygon(value)
-            if not shapely_polygon.is_valid:
-                raise serializers.ValidationError("Invalid polygon geometry")
-        except Exception as e:
-            raise serializers.ValidationError(f"Invalid polygon: {str(e)}")
+            self._prepared_ring = prepare_ring(value)
+        except InvalidRing as e:
+            raise serializers.ValidationError(str(e))
         
         return value
 
+    @property
+    def geometry_hash(self):
+        """Hash of the validated coordinates, once ``is_valid()`` has passed."""
+        return self._prepared_ring.hash
+
+    def create(self, validated_data):
+        polygon = Polygon(**validated_data)
+        polygon.use_prepared_ring(getattr(self, '_prepared_ring', None))
+        polygon.save()
+        return polygon
+
+    def update(self, instance, validated_data):
+        if 'coordinates' in validated_data:
+            instance.use_prepared_ring(getattr(self, '_prepared_ring', None))
+        return super().update(instance, validated_data)
+
+
+class PolygonSummarySerializer(PolygonSerializer):
+    """``PolygonSerializer`` output without the coordinates."""
+
+    class Meta(PolygonSerializer.Meta):
+        fields = [
+            field for field in PolygonSerializer.Meta.fields if field != 'coordinates'
+        ]
+
 
 class PolygonListSerializer(serializers.ModelSerializer):
     area_hectares = serializers.SerializerMethodField()
@@ -70,4 +100,95 @@ class PolygonListSerializer(serializers.ModelSerializer):
     def get_area_hectares(self, obj):
         if obj.area_sq_meters:
             return float(obj.area_sq_meters) / 10000
-        return None 
\ No newline at end of file
+        return None 
+
+
+def _decimal_strings(values):
+    """DRF ``DecimalField`` output for the model's 2-place decimals."""
+    return [f'{value:f}' for value in values]
+
+
+def _local_datetimes(values):
+    """
+    Datetimes converted the way DRF's ``DateTimeField`` does before
+    formatting; the renderer then writes them in the same ISO 8601 form.
+    """
+    if not settings.USE_TZ:
+        return list(values)
+    tz = timezone.get_current_timezone()
+    return [value.astimezone(tz) for value in values]
+
+
+def list_representations(rows):
+    """
+    ``PolygonListSerializer`` output for ``.values(*LIST_FIELDS)`` rows.
+
+    Builds the same dicts column by column instead of field by field, which
+    is what makes large listings cheap.  ``created_at`` is left as a
+    datetime for the renderer to format.
+    """
+    rows = list(rows)
+    areas = [row['area_sq_meters'] for row in rows]
+    columns = zip(
+        _decimal_strings(areas),
+        _decimal_strings(row['perimeter_meters'] for row in rows),
+        [float(area) / 10000 if area else None for area in areas],
+        _local_datetimes(row['created_at'] for row in rows),
+    )
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'area_sq_meters': area,
+            'perimeter_meters': perimeter,
+            'area_hectares': hectares,
+            'created_at': created_at,
+        }
+        for row, (area, perimeter, hectares, created_at) in zip(rows, columns)
+    ]
+
+
+def feature_rows(queryset, tolerance=None):
+    """
+    ``queryset`` as the row dicts :func:`encode_features` expects.
+
+    Coordinates are read as their stored JSON text, so they are never
+    decoded into Python lists.
+    """
+    fields = FEATURE_FIELDS
+    if tolerance is not None:
+        fields += ('simplified_coordinates',)
+    return queryset.annotate(
+        coordinates_json=Cast('coordinates', TextField())
+    ).values('coordinates_json', *fields)
+
+
+def encode_features(rows, tolerance=None):
+    """
+    Encoded ``Polygon.to_geojson(tolerance)`` output, one bytes object per
+    :func:`feature_rows` row.
+
+    The stored coordinate text is spliced in with its whitespace removed.
+    PostgreSQL normalizes numbers in ``jsonb``, so a coordinate may be
+    written in a different but equal notation (``0.00001`` for ``1e-05``).
+    """
+    encoded = []
+    for row in rows:
+        ring = pick_ring(None, row.get('simplified_coordinates'), tolerance)
+        if ring is None:
+            coordinates = row['coordinates_json'].replace(' ', '').encode('utf-8')
+        else:
+            coordinates = dumps(ring)
+        properties = dumps({
+            "id": row['id'],
+            "name": row['name'],
+            "area_sq_meters": float(row['area_sq_meters']),
+            "perimeter_meters": float(row['perimeter_meters']),
+            "created_at": row['created_at'],
+            "updated_at": row['updated_at']
+        }, utc_z=False)
+        encoded.append(
+            b'{"type":"Feature","geometry":{"type":"Polygon","coordinates":['
+            + coordinates + b']},"properties":' + properties + b'}'
+        )
+    return encoded
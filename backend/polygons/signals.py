@@ -0,0 +1,55 @@
+"""
+Keep derived polygon state in step with saves and deletes.
+
+Code that writes polygons without model signals (``bulk_create``,
+``bulk_update``) calls :func:`polygons_saved` / :func:`polygons_deleted`
+directly.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import response_cache, tiles
+from .models import Polygon
+from .spatial_index import spatial_index
+
+BOUND_FIELDS = ('min_lng', 'min_lat', 'max_lng', 'max_lat')
+
+
+def bounds_of(polygon):
+    return tuple(getattr(polygon, field) for field in BOUND_FIELDS)
+
+
+def polygons_saved(polygons, previous_bounds=()):
+    """Refresh caches and indexes after ``polygons`` were written."""
+    spatial_index.polygons_saved(polygons)
+    tiles.invalidate_bounds(
+        [bounds_of(polygon) for polygon in polygons] + list(previous_bounds)
+    )
+    response_cache.bump_collection_version()
+
+
+def polygons_deleted(polygons):
+    """Refresh caches and indexes after ``polygons`` were deleted."""
+    spatial_index.polygons_deleted([polygon.id for polygon in polygons])
+    tiles.invalidate_bounds([bounds_of(polygon) for polygon in polygons])
+    response_cache.bump_collection_version()
+
+
+@receiver(pre_save, sender=Polygon)
+def remember_previous_bounds(sender, instance, **kwargs):
+    instance._previous_bounds = None
+    if instance.pk is not None:
+        instance._previous_bounds = (
+            Polygon.objects.filter(pk=instance.pk).values_list(*BOUND_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=Polygon)
+def polygon_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_bounds', None)
+    polygons_saved([instance], [previous] if previous else [])
+
+
+@receiver(post_delete, sender=Polygon)
+def polygon_deleted(sender, instance, **kwargs):
+    polygons_deleted([instance])
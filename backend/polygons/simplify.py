@@ -0,0 +1,78 @@
+"""
+Precomputed, topology-preserving simplifications of polygon rings.
+
+Each polygon stores a ``{tolerance: ring}`` map for the tolerances in
+``POLYGON_SIMPLIFY_TOLERANCES`` (degrees).  A level is only stored when it
+actually drops vertices; readers fall back to the full ring otherwise.
+"""
+import numpy as np
+import shapely
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+# Web Mercator tiles are 256 px wide and span 360 degrees at zoom 0.
+TILE_SIZE = 256
+
+
+def level_key(tolerance):
+    return repr(float(tolerance))
+
+
+def tolerance_for_zoom(zoom):
+    """Width of one screen pixel in degrees at ``zoom``."""
+    return 360 / (TILE_SIZE * 2 ** zoom)
+
+
+def simplified_levels(geometries):
+    """
+    Simplified rings for an array of Shapely polygons.
+
+    Returns one ``{level_key: ring}`` dict per geometry.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    vertex_counts = shapely.get_num_coordinates(geometries)
+    levels = [{} for _ in range(len(geometries))]
+    for tolerance in settings.POLYGON_SIMPLIFY_TOLERANCES:
+        simplified = shapely.simplify(geometries, tolerance, preserve_topology=True)
+        reduced = np.flatnonzero(
+            shapely.get_num_coordinates(simplified) < vertex_counts
+        )
+        key = level_key(tolerance)
+        for i in reduced.tolist():
+            ring = shapely.get_coordinates(shapely.get_exterior_ring(simplified[i]))
+            levels[i][key] = ring.tolist()
+    return levels
+
+
+def pick_ring(coordinates, simplified, tolerance):
+    """The coarsest stored ring within ``tolerance``, else ``coordinates``."""
+    if tolerance is None or not simplified:
+        return coordinates
+    best = None
+    for key in simplified:
+        level = float(key)
+        if level <= tolerance and (best is None or level > best[0]):
+            best = (level, key)
+    return simplified[best[1]] if best else coordinates
+
+
+def parse_tolerance(query_params):
+    """Read ``?tolerance=`` (degrees) or ``?zoom=`` from the query string."""
+    tolerance = query_params.get('tolerance')
+    zoom = query_params.get('zoom')
+    try:
+        if tolerance is not None:
+            tolerance = float(tolerance)
+            if tolerance < 0:
+                raise ValueError
+            return tolerance
+        if zoom is not None:
+            zoom = float(zoom)
+            if not 0 <= zoom <= 30:
+                raise ValueError
+            return tolerance_for_zoom(zoom)
+    except ValueError:
+        raise ValidationError(
+            {'tolerance': ["tolerance must be >= 0 and zoom between 0 and 30"]}
+        )
+    return None
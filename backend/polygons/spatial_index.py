@@ -0,0 +1,220 @@
+"""
+In-process STRtree index over stored polygon geometries.
+
+Every worker keeps its own index, loaded lazily on the first query.  Saves
+and deletes made by the worker are applied immediately; changes made by
+other workers are noticed through a version counter kept in Django's cache
+(shared between workers when the cache backend is) and pulled in with an
+incremental sync.
+
+STRtrees are immutable, so changes since the last build are kept in a small
+side table that is scanned alongside the tree and folded into a fresh tree
+once it grows past ``POLYGON_SPATIAL_INDEX_REBUILD_THRESHOLD`` entries.
+"""
+import threading
+
+import numpy as np
+import shapely
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .geometry import rings_to_polygons
+from .models import Polygon, stored_ring, unpacked_coordinates
+
+VERSION_KEY = 'polygons:spatial-index:version'
+
+
+def _bump_version():
+    cache.add(VERSION_KEY, 0, timeout=None)
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        return None
+
+
+class SpatialIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._synced_at = None
+        self._tree = None
+        self._tree_ids = np.empty(0, dtype=np.int64)
+        self._tree_geoms = np.empty(0, dtype=object)
+        # Geometries added or changed since the tree was built, by id.
+        self._pending = {}
+        # Ids whose tree entry is outdated (changed or deleted).
+        self._stale = set()
+
+    def _build(self, ids, geometries):
+        shapely.prepare(geometries)
+        self._tree_ids = np.asarray(ids, dtype=np.int64)
+        self._tree_geoms = geometries
+        self._tree = shapely.STRtree(geometries)
+        self._pending = {}
+        self._stale = set()
+
+    def _rows_to_geometries(self, rows):
+        rows = [(row[0], stored_ring(*row)) for row in rows]
+        rows = [row for row in rows if row[1] is not None]
+        ids = [row[0] for row in rows]
+        return ids, rings_to_polygons([row[1] for row in rows])[0]
+
+    def _load(self):
+        synced_at = timezone.now()
+        # No ordering: the tree does not need one, and sorting by the
+        # default -created_at would sort the whole table.
+        rows = list(
+            Polygon.objects.order_by()
+            .values_list('id', 'coordinates_packed', unpacked_coordinates())
+        )
+        self._build(*self._rows_to_geometries(rows))
+        self._synced_at = synced_at
+        self._loaded = True
+
+    def _sync(self):
+        synced_at = timezone.now()
+        live = set(Polygon.objects.order_by().values_list('id', flat=True))
+        known = (set(self._tree_ids.tolist()) - self._stale) | set(self._pending)
+        for polygon_id in known - live:
+            self._remove(polygon_id)
+        changed = list(
+            Polygon.objects.filter(updated_at__gte=self._synced_at).order_by()
+            .values_list('id', 'coordinates_packed', unpacked_coordinates())
+        )
+        if changed:
+            ids, geometries = self._rows_to_geometries(changed)
+            for polygon_id, geometry in zip(ids, geometries):
+                self._put(polygon_id, geometry)
+            # Rows whose coordinates no longer read leave the index.
+            for polygon_id in {row[0] for row in changed} - set(ids):
+                self._remove(polygon_id)
+        self._synced_at = synced_at
+        self._maybe_rebuild()
+
+    def _put(self, polygon_id, geometry):
+        shapely.prepare(geometry)
+        self._stale.add(polygon_id)
+        self._pending[polygon_id] = geometry
+
+    def _remove(self, polygon_id):
+        self._stale.add(polygon_id)
+        self._pending.pop(polygon_id, None)
+
+    def _maybe_rebuild(self):
+        changes = len(self._pending) + len(self._stale)
+        if changes < settings.POLYGON_SPATIAL_INDEX_REBUILD_THRESHOLD:
+            return
+        keep = ~np.isin(self._tree_ids, np.fromiter(self._stale, dtype=np.int64))
+        ids = np.concatenate([
+            self._tree_ids[keep],
+            np.fromiter(self._pending, dtype=np.int64, count=len(self._pending)),
+        ])
+        pending = np.empty(len(self._pending), dtype=object)
+        pending[:] = list(self._pending.values())
+        self._build(ids, np.concatenate([self._tree_geoms[keep], pending]))
+
+    def _ensure_fresh(self):
+        version = cache.get(VERSION_KEY, 0)
+        if not self._loaded:
+            self._load()
+        elif version != self._version:
+            self._sync()
+        self._version = version
+
+    def _local_change(self, apply):
+        with self._lock:
+            if self._loaded:
+                apply()
+                self._maybe_rebuild()
+            version = _bump_version()
+            # Only skip the next sync if no other worker changed anything
+            # since this index was last in step with the shared version.
+            if version is not None and self._version == version - 1:
+                self._version = version
+
+    def polygons_saved(self, polygons):
+        """Record new or changed ``Polygon`` instances."""
+        def apply():
+            geometries = rings_to_polygons(
+                [polygon.coordinate_array() for polygon in polygons]
+            )[0]
+            for polygon, geometry in zip(polygons, geometries):
+                self._put(polygon.id, geometry)
+        self._local_change(apply)
+
+    def polygons_deleted(self, polygon_ids):
+        """Record deleted polygon ids."""
+        def apply():
+            for polygon_id in polygon_ids:
+                self._remove(polygon_id)
+        self._local_change(apply)
+
+    def _pending_matches(self, predicate, geometry):
+        if not self._pending:
+            return []
+        ids = np.fromiter(self._pending, dtype=np.int64, count=len(self._pending))
+        geometries = np.empty(len(self._pending), dtype=object)
+        geometries[:] = list(self._pending.values())
+        return ids[predicate(geometries, geometry)].tolist()
+
+    def _tree_matches(self, indices):
+        ids = self._tree_ids[indices].tolist()
+        if not self._stale:
+            return ids
+        return [polygon_id for polygon_id in ids if polygon_id not in self._stale]
+
+    def contains(self, lng, lat):
+        """Ids of stored polygons containing the point ``(lng, lat)``."""
+        point = shapely.Point(lng, lat)
+        with self._lock:
+            self._ensure_fresh()
+            candidates = self._tree.query(point)
+            hits = candidates[shapely.contains(self._tree_geoms[candidates], point)]
+            return self._tree_matches(hits) + self._pending_matches(
+                shapely.contains, point
+            )
+
+    def locate(self, coords):
+        """
+        Match ``[lng, lat]`` rows of ``coords`` to the polygons containing them.
+
+        Returns ``(point_indices, polygon_ids)`` arrays listing every
+        matching pair, ordered by point index.
+        """
+        points = shapely.points(np.asarray(coords, dtype=np.float64))
+        with self._lock:
+            self._ensure_fresh()
+            point_idx, tree_idx = self._tree.query(points)
+            hit = shapely.contains(self._tree_geoms[tree_idx], points[point_idx])
+            point_idx, ids = point_idx[hit], self._tree_ids[tree_idx[hit]]
+            if self._stale:
+                live = ~np.isin(ids, np.fromiter(self._stale, dtype=np.int64))
+                point_idx, ids = point_idx[live], ids[live]
+            if self._pending:
+                pending_ids = np.fromiter(
+                    self._pending, dtype=np.int64, count=len(self._pending)
+                )
+                pending = np.empty(len(self._pending), dtype=object)
+                pending[:] = list(self._pending.values())
+                extra_points, extra = shapely.STRtree(pending).query(
+                    points, predicate='within'
+                )
+                point_idx = np.concatenate([point_idx, extra_points])
+                ids = np.concatenate([ids, pending_ids[extra]])
+        order = np.argsort(point_idx, kind='stable')
+        return point_idx[order], ids[order]
+
+    def intersects(self, geometry):
+        """Ids of stored polygons intersecting a Shapely ``geometry``."""
+        shapely.prepare(geometry)
+        with self._lock:
+            self._ensure_fresh()
+            hits = self._tree.query(geometry, predicate='intersects')
+            return self._tree_matches(hits) + self._pending_matches(
+                shapely.intersects, geometry
+            )
+
+
+spatial_index = SpatialIndex()
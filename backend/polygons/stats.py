@@ -0,0 +1,148 @@
+"""
+Area and perimeter statistics computed by database aggregates.
+
+One aggregate query gives the count, total, mean, minimum and maximum of
+both measures; one window-function query picks the nearest-rank
+percentiles of both; an optional histogram takes one grouped query.  No
+polygon rows are sent to Python.
+"""
+import math
+
+from django.db.models import (
+    Avg, Count, ExpressionWrapper, F, FloatField, Max, Min, Q, Sum, Value, Window
+)
+from django.db.models.functions import (
+    Cast, Floor, Least, RowNumber, TruncDay, TruncWeek
+)
+from rest_framework.exceptions import ValidationError
+
+MEASURES = ('area_sq_meters', 'perimeter_meters')
+PERCENTILES = (50, 90, 99)
+PERIODS = {'day': TruncDay, 'week': TruncWeek}
+DEFAULT_BINS = 20
+MAX_BINS = 100
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def parse_histogram(query_params):
+    """``(by, bins)`` from ``?histogram=area|day|week&bins=``; ``by`` may be None."""
+    by = query_params.get('histogram') or None
+    if by is not None and by != 'area' and by not in PERIODS:
+        raise ValidationError({'histogram': ["histogram must be area, day or week"]})
+    try:
+        bins = int(query_params.get('bins', DEFAULT_BINS))
+    except ValueError:
+        raise ValidationError({'bins': ["bins must be an integer"]})
+    if not 1 <= bins <= MAX_BINS:
+        raise ValidationError({'bins': [f"bins must be between 1 and {MAX_BINS}"]})
+    return by, bins
+
+
+def _percentiles(queryset, count):
+    """``{measure: {'p50': value, ...}}`` by nearest rank among ``count`` rows."""
+    ranks = {p: max(1, math.ceil(p * count / 100)) for p in PERCENTILES}
+    wanted = set(ranks.values())
+    # Ordering a window by a DecimalField generates invalid SQL on SQLite
+    # in Django 4.2; doubles order the 2-place values the same way.
+    rows = queryset.order_by().annotate(**{
+        f'{measure}_rank': Window(
+            RowNumber(), order_by=Cast(measure, FloatField()).asc()
+        )
+        for measure in MEASURES
+    }).filter(
+        Q(area_sq_meters_rank__in=wanted) | Q(perimeter_meters_rank__in=wanted)
+    ).values(*MEASURES, *(f'{measure}_rank' for measure in MEASURES))
+
+    by_rank = {measure: {} for measure in MEASURES}
+    for row in rows:
+        for measure in MEASURES:
+            by_rank[measure][row[f'{measure}_rank']] = float(row[measure])
+    return {
+        measure: {f'p{p}': by_rank[measure].get(rank) for p, rank in ranks.items()}
+        for measure in MEASURES
+    }
+
+
+def area_histogram(queryset, low, high, bins):
+    """``bins`` equal-width area buckets from ``low`` to ``high``, empty or not."""
+    width = (high - low) / bins or 1.0
+    offset = ExpressionWrapper(
+        (F('area_sq_meters') - Value(low)) / Value(width), output_field=FloatField()
+    )
+    bucket = Least(Floor(offset), Value(bins - 1.0))
+    counts = {
+        int(row['bucket']): row['count']
+        for row in queryset.order_by().annotate(bucket=bucket)
+        .values('bucket').annotate(count=Count('id'))
+    }
+    return [
+        {
+            'min': round(low + index * width, 2),
+            'max': high if index == bins - 1 else round(low + (index + 1) * width, 2),
+            'count': counts.get(index, 0),
+        }
+        for index in range(bins)
+    ]
+
+
+def period_histogram(queryset, period):
+    """Polygons created per day or week; periods without any are left out."""
+    rows = (
+        queryset.order_by().annotate(period=PERIODS[period]('created_at'))
+        .values('period')
+        .annotate(count=Count('id'), area_sq_meters=Sum('area_sq_meters'))
+        .order_by('period')
+    )
+    return [
+        {
+            'start': row['period'].date().isoformat(),
+            'count': row['count'],
+            'area_sq_meters': round(float(row['area_sq_meters']), 2),
+        }
+        for row in rows
+    ]
+
+
+def compute_stats(queryset, histogram=None, bins=DEFAULT_BINS):
+    """Statistics of ``queryset``, plus a ``histogram`` by area, day or week."""
+    aggregates = {'count': Count('id')}
+    for measure in MEASURES:
+        aggregates.update({
+            f'{measure}_total': Sum(measure),
+            f'{measure}_mean': Avg(measure),
+            f'{measure}_min': Min(measure),
+            f'{measure}_max': Max(measure),
+        })
+    totals = queryset.order_by().aggregate(**aggregates)
+    count = totals['count']
+
+    if count:
+        percentiles = _percentiles(queryset, count)
+    else:
+        percentiles = {
+            measure: {f'p{p}': None for p in PERCENTILES} for measure in MEASURES
+        }
+    stats = {'count': count}
+    for measure in MEASURES:
+        stats[measure] = {
+            'total': round(_float(totals[f'{measure}_total']) or 0.0, 2),
+            'mean': _float(totals[f'{measure}_mean']),
+            'min': _float(totals[f'{measure}_min']),
+            'max': _float(totals[f'{measure}_max']),
+            **percentiles[measure],
+        }
+
+    if histogram == 'area':
+        buckets = []
+        if count:
+            area = stats['area_sq_meters']
+            buckets = area_histogram(queryset, area['min'], area['max'], bins)
+        stats['histogram'] = {'by': 'area', 'buckets': buckets}
+    elif histogram is not None:
+        stats['histogram'] = {
+            'by': histogram, 'buckets': period_histogram(queryset, histogram)
+        }
+    return stats
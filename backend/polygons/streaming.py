@@ -0,0 +1,53 @@
+"""
+Incremental GeoJSON encoding for large polygon collections.
+"""
+from django.conf import settings
+
+from .serializers import encode_features, feature_rows
+
+
+def iter_feature_collection(queryset, chunk_size=None, tolerance=None):
+    """
+    Yield a GeoJSON FeatureCollection as encoded byte chunks.
+
+    Rows are read with ``QuerySet.iterator`` (a server-side cursor on
+    PostgreSQL), so only one chunk of polygons is held in memory at a time.
+    ``tolerance`` selects a simplified level as in ``Polygon.to_geojson``.
+    """
+    chunk_size = chunk_size or settings.POLYGON_STREAM_CHUNK_SIZE
+    rows = feature_rows(queryset, tolerance).iterator(chunk_size=chunk_size)
+    yield b'{"type":"FeatureCollection","features":['
+    separator = b''
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield separator + b','.join(encode_features(chunk, tolerance))
+            separator = b','
+            chunk = []
+    if chunk:
+        yield separator + b','.join(encode_features(chunk, tolerance))
+    yield b']}'
+
+
+async def aiter_feature_collection(queryset, chunk_size=None, tolerance=None):
+    """
+    Async :func:`iter_feature_collection` for ASGI views.
+
+    Rows are read with ``QuerySet.aiterator``, one chunk per database round
+    trip.
+    """
+    chunk_size = chunk_size or settings.POLYGON_STREAM_CHUNK_SIZE
+    rows = feature_rows(queryset, tolerance).aiterator(chunk_size=chunk_size)
+    yield b'{"type":"FeatureCollection","features":['
+    separator = b''
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield separator + b','.join(encode_features(chunk, tolerance))
+            separator = b','
+            chunk = []
+    if chunk:
+        yield separator + b','.join(encode_features(chunk, tolerance))
+    yield b']}'
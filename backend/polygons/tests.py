@@ -0,0 +1,416 @@
+import csv
+import io
+import os
+import tempfile
+import tracemalloc
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connections
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from . import db_router, geodesic
+from .benchmarks import ISOLATED_SETTINGS, budget_requests, populate, synthetic_rings
+from .dedupe import metrics_memo
+from .exports import CSVExport, FlatGeobufExport, export_queryset, iter_export
+from .models import SUM_FIELDS, Polygon
+from .profiling import profile_directory
+from .query_budget import QUERY_BUDGETS, budget_for, query_budget, repeated_queries
+from .renderers import dumps
+from .response_cache import bump_collection_version, collection_state
+from .spatial_index import SpatialIndex
+from .streaming import iter_feature_collection
+
+# Reference area (m²) and perimeter (m) from GeographicLib's ellipsoidal
+# polygon computation (Karney 2013) on WGS84.
+REFERENCE_RINGS = {
+    'equator square': (
+        [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]],
+        12308778361.469452, 443770.91724830196,
+    ),
+    'high latitude square': (
+        [[10, 70], [11, 70], [11, 71], [10, 71], [10, 70]],
+        4157942715.0476074, 297673.23927019304,
+    ),
+    'city block': (
+        [
+            [-73.9857, 40.7484], [-73.9847, 40.7484], [-73.9847, 40.7491],
+            [-73.9857, 40.7491], [-73.9857, 40.7484],
+        ],
+        6564.965184211731, 324.3764033097129,
+    ),
+    'large box': (
+        [[-120, 30], [-70, 30], [-70, 50], [-120, 50], [-120, 30]],
+        9266348868278.54, 12741601.142158765,
+    ),
+    'around the north pole': (
+        [[lng, 80] for lng in range(-180, 180, 30)] + [[-180, 80]],
+        3736196234080.8438, 6904500.875462253,
+    ),
+    'around the south pole, clockwise': (
+        [[lng, -75] for lng in range(180, -180, -45)] + [[180, -75]],
+        7929743264756.8125, 10156004.530718582,
+    ),
+}
+
+# Area is measured on the authalic sphere, whose great circles drift from
+# the ellipsoid's geodesics as edges get longer.
+AREA_TOLERANCES = {
+    'city block': 1e-9,
+    'large box': 5e-4,
+    'around the north pole': 1e-4,
+    'around the south pole, clockwise': 1e-4,
+}
+
+
+class GeodesicAccuracyTests(SimpleTestCase):
+    def test_reference_polygons(self):
+        for name, (ring, area, perimeter) in REFERENCE_RINGS.items():
+            with self.subTest(name):
+                measured_area, measured_perimeter = geodesic.ring_metrics(ring)
+                self.assertLess(
+                    abs(measured_area - area) / area, AREA_TOLERANCES.get(name, 1e-6)
+                )
+                self.assertLess(abs(measured_perimeter - perimeter) / perimeter, 1e-9)
+
+    def test_orientation_and_closure_do_not_matter(self):
+        ring = REFERENCE_RINGS['high latitude square'][0]
+        expected = geodesic.ring_metrics(ring)
+        for variant in (ring[::-1], ring[:-1], ring[2:] + ring[1:3]):
+            with self.subTest(variant=variant):
+                area, perimeter = geodesic.ring_metrics(variant)
+                self.assertAlmostEqual(area, expected[0], delta=1e-3)
+                self.assertAlmostEqual(perimeter, expected[1], delta=1e-6)
+
+    def test_batch_matches_single_rings(self):
+        rings = [ring for ring, _, _ in REFERENCE_RINGS.values()]
+        areas, perimeters = geodesic.batch_metrics(rings)
+        for ring, area, perimeter in zip(rings, areas, perimeters):
+            # Batched Vincenty iterates until every edge converges.
+            expected_area, expected_perimeter = geodesic.ring_metrics(ring)
+            self.assertAlmostEqual(area / expected_area, 1, places=10)
+            self.assertAlmostEqual(perimeter / expected_perimeter, 1, places=10)
+
+
+def measured(ring):
+    polygon = Polygon(coordinates=ring)
+    polygon.calculate_metrics()
+    return polygon
+
+
+class MetricsMemoTests(SimpleTestCase):
+    def setUp(self):
+        metrics_memo.clear()
+        self.ring = synthetic_rings(1, 400, seed=3)[0]
+
+    def assertLevelsFollow(self, polygon):
+        """Each level visits a subset of the ring's vertices in ring order."""
+        ring = polygon.coordinates[:-1]
+        self.assertTrue(polygon.simplified_coordinates)
+        for level in polygon.simplified_coordinates.values():
+            self.assertEqual(level[0], level[-1])
+            positions = [ring.index(point) for point in level[:-1]]
+            self.assertEqual(positions, sorted(positions))
+
+    def test_memo_hit_matches_fresh_measurement(self):
+        first = measured(self.ring)
+        self.assertEqual(len(metrics_memo), 1)
+        again = measured(list(self.ring))
+        self.assertEqual(again.simplified_coordinates, first.simplified_coordinates)
+        self.assertEqual(again.area_sq_meters, first.area_sq_meters)
+
+    def test_levels_follow_a_reversed_ring(self):
+        measured(self.ring)
+        reversed_ring = self.ring[::-1]
+        polygon = measured(reversed_ring)
+        self.assertEqual(len(metrics_memo), 1)
+        self.assertLevelsFollow(polygon)
+
+    def test_levels_follow_a_rotated_ring(self):
+        original = measured(self.ring)
+        for start in (1, 57, 200):
+            with self.subTest(start=start):
+                rotated = self.ring[start:-1] + self.ring[:start + 1]
+                for ring in (rotated, rotated[::-1]):
+                    polygon = measured(ring)
+                    self.assertLevelsFollow(polygon)
+                    self.assertEqual(polygon.area_sq_meters, original.area_sq_meters)
+        self.assertEqual(len(metrics_memo), 1)
+
+    def test_entries_are_keyed_by_formula_and_tolerances(self):
+        measured(self.ring)
+        key = Polygon(coordinates=self.ring)
+        key.calculate_metrics()
+        self.assertIsNotNone(metrics_memo.get(key.geometry_hash, self.ring))
+        version = geodesic.METRICS_VERSION + 1
+        with mock.patch.object(geodesic, 'METRICS_VERSION', version):
+            self.assertIsNone(metrics_memo.get(key.geometry_hash, self.ring))
+        with self.settings(POLYGON_SIMPLIFY_TOLERANCES=[0.005]):
+            self.assertIsNone(metrics_memo.get(key.geometry_hash, self.ring))
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'polygon-collection-state-tests',
+        },
+    },
+    POLYGON_RESPONSE_CACHE='default',
+)
+class CollectionStateTests(SimpleTestCase):
+    def test_versions_do_not_repeat_when_the_cache_starts_over(self):
+        seen = set()
+        for _ in range(2):
+            # As a restarted worker's local-memory cache would
+            caches['default'].clear()
+            for _ in range(3):
+                version = collection_state()[0]
+                self.assertEqual(collection_state()[0], version)
+                self.assertNotIn(version, seen)
+                seen.add(version)
+                bump_collection_version()
+
+
+@override_settings(**ISOLATED_SETTINGS)
+class VertexEditTests(TestCase):
+    square = [[0, 0], [0.014, 0], [0.014, 0.014], [0, 0.014], [0, 0]]
+
+    def setUp(self):
+        metrics_memo.clear()
+
+    def create(self, ring):
+        response = self.client.post(
+            '/api/polygons/?duplicates=allow', {'coordinates': ring},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def assertMeasuresItsRing(self, polygon_id):
+        polygon = Polygon.objects.get(pk=polygon_id)
+        ring = polygon.coordinate_array()
+        area, perimeter = geodesic.ring_metrics(ring)
+        self.assertAlmostEqual(float(polygon.area_sq_meters), area, delta=0.01)
+        self.assertAlmostEqual(float(polygon.perimeter_meters), perimeter, delta=0.01)
+        stored = [getattr(polygon, field) for field in SUM_FIELDS]
+        for value, expected in zip(stored, geodesic.ring_sums(ring)):
+            self.assertAlmostEqual(value, expected, delta=1e-12)
+
+    def test_edit_of_a_ring_memoized_in_the_other_direction(self):
+        self.create(self.square)
+        polygon_id = self.create(self.square[::-1])
+        self.assertMeasuresItsRing(polygon_id)
+        response = self.client.patch(
+            f'/api/polygons/{polygon_id}/vertices/',
+            {'operations': [{'op': 'move', 'index': 2, 'point': [0.015, 0.015]}]},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertMeasuresItsRing(polygon_id)
+
+
+class StreamingMemoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        populate(4000, 50)
+
+    def peak_streaming(self, rows):
+        """Peak bytes allocated while consuming a collection of ``rows``."""
+        queryset = Polygon.objects.order_by('id')[:rows]
+        tracemalloc.start()
+        try:
+            size = 0
+            for chunk in iter_feature_collection(queryset, chunk_size=200):
+                size += len(chunk)
+            return tracemalloc.get_traced_memory()[1], size
+        finally:
+            tracemalloc.stop()
+
+    def test_memory_stays_flat_as_rows_grow(self):
+        self.peak_streaming(200)
+        small_peak, small_size = self.peak_streaming(1000)
+        large_peak, large_size = self.peak_streaming(4000)
+        self.assertGreater(large_size, 3 * small_size)
+        self.assertLess(large_peak, small_peak * 1.5)
+        # Far below what holding the whole body would take
+        self.assertLess(large_peak, large_size / 4)
+
+
+@override_settings(**ISOLATED_SETTINGS)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        populate(20, 10)
+
+    def setUp(self):
+        # Load the spatial index and any lazy state first.
+        self.client.get('/api/polygons/contains/?lng=0&lat=0')
+
+    def test_routes_stay_within_budget(self):
+        polygon_ids = list(Polygon.objects.order_by('id').values_list('id', flat=True))
+        checked = set()
+        # Requests build on each other, so they run in order in one test.
+        for method, path, body in budget_requests(polygon_ids[:3]):
+            route = resolve(path.split('?')[0]).url_name
+            budget = budget_for(route, method)
+            with self.subTest(f"{method} {path}"):
+                self.assertIsNotNone(budget, f"no budget for route {route}")
+                checked.add((route, method))
+                with query_budget(budget, f"{method} {path}") as recorded:
+                    response = self.client.generic(
+                        method, path, None if body is None else dumps(body),
+                        content_type='application/json'
+                    )
+                    if response.streaming:
+                        for _ in response.streaming_content:
+                            pass
+                self.assertLess(response.status_code, 400)
+                self.assertEqual(repeated_queries(recorded.queries, 3), [])
+
+        budgeted = {
+            (route, method) for route, methods in QUERY_BUDGETS.items()
+            for method in methods
+        }
+        self.assertEqual(budgeted - checked, set(), "budgeted but not exercised")
+
+
+def square(lng, lat, size=0.01):
+    return [
+        [lng, lat], [lng + size, lat], [lng + size, lat + size],
+        [lng, lat + size], [lng, lat],
+    ]
+
+
+@override_settings(**ISOLATED_SETTINGS)
+class UnpackedRowTests(TestCase):
+    """Rows migration 0005 left without ``coordinates_packed``."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.packed, cls.unpacked, cls.unreadable = (
+            Polygon.objects.create(name=name, coordinates=square(lng, 0)).id
+            for name, lng in (('packed', 0), ('unpacked', 1), ('unreadable', 2))
+        )
+        Polygon.objects.filter(id=cls.unpacked).update(coordinates_packed=None)
+        Polygon.objects.filter(id=cls.unreadable).update(
+            coordinates_packed=None, coordinates={'not': 'a ring'}
+        )
+
+    def test_spatial_index_reads_the_json_coordinates(self):
+        index = SpatialIndex()
+        with self.assertLogs('polygons.models', 'WARNING'):
+            self.assertEqual(index.contains(0.005, 0.005), [self.packed])
+        self.assertEqual(index.contains(1.005, 0.005), [self.unpacked])
+        self.assertEqual(index.contains(2.005, 0.005), [])
+
+    def test_exports_read_the_json_coordinates(self):
+        queryset = export_queryset(Polygon.objects.all())
+        with self.assertLogs('polygons.models', 'WARNING'):
+            body = b''.join(iter_export(CSVExport(), queryset)).decode('utf-8')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(
+            [int(row['id']) for row in rows], [self.packed, self.unpacked]
+        )
+        self.assertEqual(
+            rows[1]['wkt'], 'POLYGON ((1 0, 1.01 0, 1.01 0.01, 1 0.01, 1 0))'
+        )
+
+        export = FlatGeobufExport()
+        with self.assertLogs('polygons.models', 'WARNING'):
+            self.assertTrue(b''.join(iter_export(export, queryset)))
+        self.assertEqual(len(export.sizes), 2)
+
+
+class ProfileDirectoryTests(SimpleTestCase):
+    def test_directory_is_created_private(self):
+        with tempfile.TemporaryDirectory() as parent:
+            directory = os.path.join(parent, 'profiles')
+            with self.settings(POLYGON_PROFILE_DIR=directory):
+                self.assertEqual(profile_directory(), directory)
+            self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+
+    def test_directory_others_can_open_is_refused(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.chmod(directory, 0o755)
+            with self.settings(POLYGON_PROFILE_DIR=directory):
+                with self.assertRaises(ImproperlyConfigured):
+                    profile_directory()
+
+
+@override_settings(**{
+    **ISOLATED_SETTINGS,
+    'CACHES': {
+        **ISOLATED_SETTINGS['CACHES'],
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'polygon-replica-routing-tests',
+        },
+    },
+    'POLYGON_READ_REPLICAS': ['replica1'],
+    'POLYGON_REPLICA_LAG': 5,
+})
+class ReplicaRoutingTests(TransactionTestCase):
+    # Transactional, so the replica's own connection to the mirrored test
+    # database sees the rows.
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        populate(5, 10)
+        caches['default'].clear()
+        db_router._down_until.clear()
+        self.addCleanup(db_router._down_until.clear)
+
+    def read_database(self, **cookies):
+        request = RequestFactory().get('/api/polygons/')
+        request.COOKIES.update(cookies)
+        return db_router.read_database(request)
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(self.read_database(), 'replica1')
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            with CaptureQueriesContext(connections['default']) as primary:
+                response = self.client.get('/api/polygons/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(replica.captured_queries)
+        self.assertFalse(primary.captured_queries)
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            response = self.client.post(
+                '/api/polygons/?duplicates=allow', {'coordinates': square(5, 5)},
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(replica.captured_queries)
+        cookie = response.cookies[db_router.STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+        self.assertEqual(
+            self.read_database(**{db_router.STICKY_COOKIE: cookie.value}), 'default'
+        )
+
+    def test_reads_stay_on_the_primary_within_the_lag_after_any_write(self):
+        bump_collection_version()
+        self.assertEqual(self.read_database(), 'default')
+        later = db_router.time.time() + 6
+        with mock.patch.object(db_router.time, 'time', return_value=later):
+            self.assertEqual(self.read_database(), 'replica1')
+
+    def test_unreachable_replica_falls_back_to_the_primary(self):
+        replica = connections['replica1']
+        with mock.patch.object(
+            replica, 'ensure_connection', side_effect=OperationalError
+        ) as ensure_connection:
+            with self.assertLogs('polygons.db_router', 'WARNING'):
+                self.assertEqual(self.read_database(), 'default')
+            # Not retried until the back-off passes
+            self.assertEqual(self.read_database(), 'default')
+        self.assertEqual(ensure_connection.call_count, 1)
+        self.assertEqual(self.read_database(), 'default')
+        db_router._down_until.clear()
+        self.assertEqual(self.read_database(), 'replica1')
@@ -0,0 +1,143 @@
+"""
+Vector tile rendering and caching for stored polygons.
+
+Rendered tiles live in the ``POLYGON_TILE_CACHE`` cache alias.  Saving or
+deleting a polygon deletes the cached tiles its bounds touch at every zoom
+level; when that would mean more than ``POLYGON_TILE_INVALIDATION_LIMIT``
+tiles at one zoom, the whole zoom level is invalidated by bumping its
+generation number instead.
+"""
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from . import mvt
+from .filters import filter_bbox
+from .geometry import rings_to_polygons
+from .simplify import pick_ring, tolerance_for_zoom
+
+LAYER_NAME = 'polygons'
+MAX_ZOOM = 22
+MAX_MERCATOR_LAT = 85.0511287798
+
+
+def _cache():
+    return caches[settings.POLYGON_TILE_CACHE]
+
+
+def _generation_key(z):
+    return f'polygons:tile-generation:{z}'
+
+
+def _tile_key(z, x, y, generation):
+    return f'polygons:tile:{z}:{generation}:{x}:{y}'
+
+
+def _generation(cache, z):
+    return cache.get(_generation_key(z), 0)
+
+
+def tile_ranges(bounds, z):
+    """
+    Inclusive tile index ranges covering an ``(n, 4)`` array of bounds.
+
+    Returns ``(x0, y0, x1, y1)`` integer arrays.
+    """
+    bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+    n = 2 ** z
+
+    def column(lng):
+        return np.clip(((lng + 180) / 360 * n).astype(np.int64), 0, n - 1)
+
+    def row(lat):
+        lat = np.radians(np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+        y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2 * n
+        return np.clip(y.astype(np.int64), 0, n - 1)
+
+    return (
+        column(bounds[:, 0]), row(bounds[:, 3]),
+        column(bounds[:, 2]), row(bounds[:, 1]),
+    )
+
+
+def render_tile(queryset, z, x, y):
+    """Encode the polygons of ``queryset`` that fall in tile z/x/y."""
+    bounds = mvt.tile_bounds(z, x, y)
+    # Widen the candidate search by the tile buffer.
+    pad_lng = (bounds[2] - bounds[0]) * mvt.BUFFER / mvt.EXTENT
+    pad_lat = (bounds[3] - bounds[1]) * mvt.BUFFER / mvt.EXTENT
+    candidates = filter_bbox(queryset, (
+        max(-180, bounds[0] - pad_lng), max(-90, bounds[1] - pad_lat),
+        min(180, bounds[2] + pad_lng), min(90, bounds[3] + pad_lat),
+    )).only(
+        'id', 'name', 'area_sq_meters', 'perimeter_meters',
+        'coordinates_packed', 'simplified_coordinates'
+    )
+    polygons = list(candidates)
+    if not polygons:
+        return mvt.encode_layer(LAYER_NAME, [])
+
+    tolerance = tolerance_for_zoom(z)
+    rings = [
+        mvt.project(
+            pick_ring(
+                polygon.coordinate_array(), polygon.simplified_coordinates, tolerance
+            ),
+            z, x, y
+        )
+        for polygon in polygons
+    ]
+    clipped = mvt.clip_to_tile(rings_to_polygons(rings)[0])
+    features = (
+        (
+            polygon.id,
+            mvt.polygon_commands(geometry),
+            {
+                'id': polygon.id,
+                'name': polygon.name,
+                'area_sq_meters': float(polygon.area_sq_meters),
+                'perimeter_meters': float(polygon.perimeter_meters),
+            },
+        )
+        for polygon, geometry in zip(polygons, clipped)
+    )
+    return mvt.encode_layer(LAYER_NAME, features)
+
+
+def get_tile(queryset, z, x, y):
+    """Cached :func:`render_tile`; returns ``(tile_bytes, cache_hit)``."""
+    cache = _cache()
+    key = _tile_key(z, x, y, _generation(cache, z))
+    tile = cache.get(key)
+    if tile is not None:
+        return tile, True
+    tile = render_tile(queryset, z, x, y)
+    cache.set(key, tile, settings.POLYGON_TILE_CACHE_TIMEOUT)
+    return tile, False
+
+
+def invalidate_bounds(bounds_list):
+    """Drop cached tiles touched by any of the given lng/lat bounds."""
+    bounds_list = [bounds for bounds in bounds_list if None not in bounds]
+    if not bounds_list:
+        return
+    cache = _cache()
+    limit = settings.POLYGON_TILE_INVALIDATION_LIMIT
+    for z in range(MAX_ZOOM + 1):
+        x0, y0, x1, y1 = tile_ranges(bounds_list, z)
+        if int(np.sum((x1 - x0 + 1) * (y1 - y0 + 1))) > limit:
+            # Tile counts only grow with zoom, so every deeper level is
+            # past the limit too.
+            for level in range(z, MAX_ZOOM + 1):
+                cache.add(_generation_key(level), 0, timeout=None)
+                cache.incr(_generation_key(level))
+            return
+        generation = _generation(cache, z)
+        keys = []
+        for ranges in zip(x0.tolist(), y0.tolist(), x1.tolist(), y1.tolist()):
+            keys.extend(
+                _tile_key(z, x, y, generation)
+                for x in range(ranges[0], ranges[2] + 1)
+                for y in range(ranges[1], ranges[3] + 1)
+            )
+        cache.delete_many(keys)
@@ -1,8 +1,10 @@
 """
 URL patterns for polygon API endpoints.
 """
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import PolygonViewSet
 
 # Create router and register viewsets
@@ -10,5 +12,49 @@ router = DefaultRouter()
 router.register(r'polygons', PolygonViewSet, basename='polygon')
 
 urlpatterns = [
+    path(
+        'polygons/tiles/<int:z>/<int:x>/<int:y>.mvt',
+        PolygonViewSet.as_view({'get': 'tile'}),
+        name='polygon-tile'
+    ),
     path('', include(router.urls)),
-] 
\ No newline at end of file
+]
+
+if settings.POLYGON_ASYNC_VIEWS:
+    # Matched before the router.  Detail routes only take numeric ids so
+    # that extra actions such as bulk/ still reach the router.
+    urlpatterns[:0] = [
+        path(
+            'polygons/tiles/<int:z>/<int:x>/<int:y>.mvt',
+            async_views.polygon_tile, name='polygon-tile'
+        ),
+        re_path(r'^polygons/$', async_views.polygon_list, name='polygon-list'),
+        re_path(
+            r'^polygons/geojson_collection/$',
+            async_views.polygon_geojson_collection, name='polygon-geojson-collection'
+        ),
+        re_path(
+            r'^polygons/export/(?P<fmt>ndjson|csv|fgb)/$',
+            async_views.polygon_export, name='polygon-export'
+        ),
+        re_path(r'^polygons/stats/$', async_views.polygon_stats, name='polygon-stats'),
+        re_path(
+            r'^polygons/contains/$',
+            async_views.polygon_contains, name='polygon-contains'
+        ),
+        re_path(
+            r'^polygons/intersects/$',
+            async_views.polygon_intersects, name='polygon-intersects'
+        ),
+        re_path(
+            r'^polygons/locate/$', async_views.polygon_locate, name='polygon-locate'
+        ),
+        re_path(
+            r'^polygons/(?P<pk>[0-9]+)/$',
+            async_views.polygon_detail, name='polygon-detail'
+        ),
+        re_path(
+            r'^polygons/(?P<pk>[0-9]+)/geojson/$',
+            async_views.polygon_geojson, name='polygon-geojson'
+        ),
+    ]
@@ -0,0 +1,83 @@
+"""
+Single-pass validation of incoming polygon rings.
+
+Shape and range checks run vectorized over the whole ring, and the Shapely
+geometry built to test validity is handed on to metric computation instead
+of being rebuilt on save.  Rings already in the metrics memo were valid
+when first measured and skip Shapely altogether.
+"""
+from collections import namedtuple
+
+import numpy as np
+import shapely
+
+from .dedupe import metrics_memo, ring_hash
+from .geometry import rings_to_polygons
+
+
+class InvalidRing(ValueError):
+    """A ring failed validation; the message is suitable for API clients."""
+
+
+PreparedRing = namedtuple(
+    'PreparedRing', ['coordinates', 'array', 'geometry', 'hash', 'metrics']
+)
+
+
+def check_ring_array(value):
+    """
+    Check a ``[[lng, lat], ...]`` ring and return it as a float64 array.
+
+    Geometry validity is not tested here so batch callers can test many
+    rings with one vectorized Shapely call.
+    """
+    if not value or not isinstance(value, list):
+        raise InvalidRing("Coordinates must be a list of coordinate pairs")
+
+    if len(value) < 3:
+        raise InvalidRing("At least 3 coordinate pairs are required for a polygon")
+
+    try:
+        raw = np.asarray(value)
+    except ValueError:
+        raw = None
+    if raw is None or raw.ndim != 2 or raw.shape[1] != 2:
+        raise InvalidRing(
+            "Each coordinate must be a list with exactly 2 values [lng, lat]"
+        )
+
+    if raw.dtype.kind not in 'iuf':
+        raise InvalidRing("Longitude and latitude must be numbers")
+
+    coords = raw.astype(np.float64, copy=False)
+    if not np.all(np.abs(coords[:, 0]) <= 180):
+        raise InvalidRing("Longitude must be between -180 and 180")
+
+    if not np.all(np.abs(coords[:, 1]) <= 90):
+        raise InvalidRing("Latitude must be between -90 and 90")
+
+    if len(coords) < 4 and np.array_equal(coords[0], coords[-1]):
+        raise InvalidRing("At least 3 coordinate pairs are required for a polygon")
+
+    return coords
+
+
+def prepare_ring(value):
+    """
+    Validate ``value`` fully and return a :class:`PreparedRing`.
+
+    On a metrics memo hit ``geometry`` is None and ``metrics`` holds the
+    memoized :class:`~.dedupe.Metrics`; otherwise ``metrics`` is None.
+    """
+    coords = check_ring_array(value)
+    key = ring_hash(coords)
+    metrics = metrics_memo.get(key, coords)
+    if metrics is not None:
+        return PreparedRing(value, coords, None, key, metrics)
+    try:
+        geometry = rings_to_polygons([coords])[0][0]
+    except Exception as e:
+        raise InvalidRing(f"Invalid polygon: {str(e)}")
+    if not shapely.is_valid(geometry):
+        raise InvalidRing("Invalid polygon geometry")
+    return PreparedRing(value, coords, geometry, key, None)
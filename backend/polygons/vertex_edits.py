@@ -0,0 +1,257 @@
+"""
+Vertex-level edits of a stored polygon ring.
+
+An edit inserts, moves or deletes one vertex by index.  Rather than
+revalidating and remeasuring the whole ring as a PUT does, each operation
+
+* updates the stored geodesic edge sums (see ``geodesic.edge_terms``) by
+  the two or three edges it replaces, so area and perimeter cost the same
+  whatever the ring's size;
+* checks only the edges it creates: against the ring's other edges whose
+  bounding boxes they overlap, which keeps an already valid ring simple.
+
+What remains proportional to the ring is plain array and encoding work:
+unpacking, the bounds, centroid and hash, and writing the ring back.
+Simplified levels are dropped (readers fall back to the full ring) until
+the polygon is next saved in full.
+"""
+import numpy as np
+import orjson
+import shapely
+from django.db import transaction
+from django.db.models import JSONField, Value
+from django.db.models.functions import Cast
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import geodesic
+from .dedupe import ring_hash
+from .geometry import pack_coordinates, unpack_coordinates
+from .models import SUM_FIELDS
+from .signals import BOUND_FIELDS, bounds_of, polygons_saved
+from .validation import InvalidRing
+
+OPERATIONS = ('insert', 'move', 'delete')
+MAX_OPERATIONS = 100
+# Columns an edit rewrites besides coordinates
+EDIT_FIELDS = (
+    'coordinates_packed', 'area_sq_meters', 'perimeter_meters',
+    *SUM_FIELDS, *BOUND_FIELDS, 'centroid_lng', 'centroid_lat',
+    'simplified_coordinates', 'geometry_hash', 'updated_at',
+)
+
+
+def _parse_point(point):
+    if (
+        not isinstance(point, list) or len(point) != 2
+        or not all(
+            isinstance(v, (int, float)) and not isinstance(v, bool) for v in point
+        )
+    ):
+        raise ValueError("point must be [lng, lat]")
+    lng, lat = float(point[0]), float(point[1])
+    if not abs(lng) <= 180:
+        raise ValueError("Longitude must be between -180 and 180")
+    if not abs(lat) <= 90:
+        raise ValueError("Latitude must be between -90 and 90")
+    return lng, lat
+
+
+def parse_operations(data):
+    """
+    ``[(op, index, point), ...]`` from ``{"operations": [{"op", "index",
+    "point"}, ...]}``; ``point`` is None for deletes.
+    """
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise ValidationError(
+            {'operations': ["Expected a non-empty list of vertex operations"]}
+        )
+    if len(operations) > MAX_OPERATIONS:
+        raise ValidationError(
+            {'operations': [f"At most {MAX_OPERATIONS} operations per request"]}
+        )
+    parsed = []
+    for position, operation in enumerate(operations):
+        try:
+            if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+                raise ValueError("op must be insert, move or delete")
+            index = operation.get('index')
+            if not isinstance(index, int) or isinstance(index, bool) or index < 0:
+                raise ValueError("index must be a non-negative integer")
+            point = None
+            if operation['op'] != 'delete':
+                point = _parse_point(operation.get('point'))
+        except ValueError as e:
+            raise ValidationError({'operations': [f"Operation {position}: {e}"]})
+        parsed.append((operation['op'], index, point))
+    return parsed
+
+
+def _edge_sums(starts, ends):
+    """Summed ``geodesic.edge_terms`` of the edges ``starts[i] -> ends[i]``."""
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    terms = geodesic.edge_terms(starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1])
+    return np.array([values.sum() for values in terms])
+
+
+def _neighbour(edge, step, degenerate):
+    """The nearest edge before or after ``edge`` that is not a single point."""
+    count = len(degenerate)
+    other = (edge + step) % count
+    while degenerate[other] and other != edge:
+        other = (other + step) % count
+    return other
+
+
+def check_edges(ring, changed):
+    """
+    Raise ``InvalidRing`` if an edge in ``changed`` crosses or touches an
+    edge of the open ``ring`` other than its neighbours, or overlaps one of
+    those.  Edge ``k`` runs from vertex ``k`` to the next.
+    """
+    ends = np.roll(ring, -1, axis=0)
+    low = np.minimum(ring, ends)
+    high = np.maximum(ring, ends)
+    # Zero-length edges (repeated points) are covered by the edges they join.
+    degenerate = (ring == ends).all(axis=1)
+    for edge in changed:
+        if degenerate[edge]:
+            continue
+        near = np.flatnonzero(
+            (low[:, 0] <= high[edge, 0]) & (high[:, 0] >= low[edge, 0])
+            & (low[:, 1] <= high[edge, 1]) & (high[:, 1] >= low[edge, 1])
+            & ~degenerate
+        )
+        near = near[near != edge]
+        if not len(near):
+            continue
+        line = shapely.linestrings([ring[edge], ends[edge]])
+        others = shapely.linestrings(np.stack([ring[near], ends[near]], axis=1))
+        adjacent = np.isin(
+            near, [_neighbour(edge, -1, degenerate), _neighbour(edge, 1, degenerate)]
+        )
+        # Neighbours share one vertex; anything more is an overlap.
+        crossing = shapely.intersects(line, others[~adjacent]).any() or (
+            shapely.get_type_id(shapely.intersection(line, others[adjacent])) != 0
+        ).any()
+        if crossing:
+            raise InvalidRing("Edit makes the polygon intersect itself")
+
+
+def edit_ring(ring, sums, operations):
+    """
+    Apply ``operations`` in order to the open ``(n, 2)`` ``ring``.
+
+    Each index refers to the ring as left by the operations before it.
+    Returns the new ring and its updated edge ``sums``; raises
+    ``InvalidRing`` naming the first operation that fails.
+    """
+    sums = np.array(sums, dtype=np.float64)
+    for position, (op, index, point) in enumerate(operations):
+        count = len(ring)
+        limit = count if op == 'insert' else count - 1
+        try:
+            if index > limit:
+                raise InvalidRing(f"index must be at most {limit}")
+            before = ring[index - 1]
+            if op == 'insert':
+                after = ring[index % count]
+                removed, added = [(before, after)], [(before, point), (point, after)]
+                ring = np.insert(ring, index, point, axis=0)
+                changed = [(index - 1) % (count + 1), index]
+            elif op == 'move':
+                after = ring[(index + 1) % count]
+                removed = [(before, ring[index]), (ring[index], after)]
+                added = [(before, point), (point, after)]
+                ring = ring.copy()
+                ring[index] = point
+                changed = [(index - 1) % count, index]
+            else:
+                if count <= 3:
+                    raise InvalidRing("A polygon needs at least 3 vertices")
+                after = ring[(index + 1) % count]
+                removed = [(before, ring[index]), (ring[index], after)]
+                added = [(before, after)]
+                ring = np.delete(ring, index, axis=0)
+                changed = [(index - 1) % (count - 1)]
+            check_edges(ring, changed)
+        except InvalidRing as e:
+            raise InvalidRing(f"Operation {position}: {e}")
+        sums += _edge_sums(*zip(*added)) - _edge_sums(*zip(*removed))
+    return ring, tuple(sums.tolist())
+
+
+def apply_operations(polygon, operations):
+    """
+    Edit ``polygon``'s ring and every field derived from it, unsaved.
+
+    Returns the new ring as an array.
+    """
+    if polygon.coordinates_packed is not None:
+        stored = unpack_coordinates(polygon.coordinates_packed)
+    else:
+        stored = geodesic.as_ring_array(polygon.coordinates)
+    closed = len(stored) > 1 and (stored[0] == stored[-1]).all()
+    sums = tuple(getattr(polygon, field) for field in SUM_FIELDS)
+    if None in sums:
+        # Rows measured before edge sums were stored pay for one full pass.
+        sums = geodesic.ring_sums(stored)
+
+    ring, sums = edit_ring(stored[:-1] if closed else stored, sums, operations)
+    area = float(geodesic.areas_from_sums(sums[0], sums[1]))
+    if round(area, 2) < 0.01:
+        raise InvalidRing("Edit leaves the polygon without area")
+    if closed:
+        ring = np.vstack((ring, ring[:1]))
+
+    # edit_vertices writes the JSON copy straight from the array.
+    if 'coordinates' not in polygon.get_deferred_fields():
+        polygon.coordinates = ring.tolist()
+    polygon.coordinates_packed = pack_coordinates(ring)
+    polygon.set_metrics(area, sums[2])
+    polygon.set_sums(sums)
+    centroid = shapely.centroid(shapely.polygons(ring))
+    polygon.set_bounds(
+        (*ring.min(axis=0).tolist(), *ring.max(axis=0).tolist()),
+        (shapely.get_x(centroid), shapely.get_y(centroid))
+    )
+    polygon.simplified_coordinates = {}
+    polygon.geometry_hash = ring_hash(ring)
+    polygon.updated_at = timezone.now()
+    return ring
+
+
+def edit_vertices(queryset, pk, operations):
+    """
+    Apply vertex ``operations`` to polygon ``pk`` of ``queryset`` and save it.
+
+    The row stays locked from the read to the write, so concurrent edits
+    apply one after the other.  Raises ``ValidationError`` if an operation
+    is out of range or makes the ring invalid, and ``Http404``.
+    """
+    with transaction.atomic():
+        # Edits read the packed ring, not the JSON copies.
+        polygon = get_object_or_404(
+            queryset.select_for_update().defer('coordinates', 'simplified_coordinates'),
+            pk=pk
+        )
+        previous = bounds_of(polygon)
+        try:
+            ring = apply_operations(polygon, operations)
+        except InvalidRing as e:
+            raise ValidationError({'operations': [str(e)]})
+        fields = {field: getattr(polygon, field) for field in EDIT_FIELDS}
+        # JSONField would build a list of lists and encode it with the json
+        # module, several times slower on large rings; the cast keeps jsonb
+        # columns jsonb.
+        fields['coordinates'] = Cast(
+            Value(orjson.dumps(ring, option=orjson.OPT_SERIALIZE_NUMPY).decode()),
+            output_field=JSONField()
+        )
+        queryset.filter(pk=pk).update(**fields)
+    # QuerySet.update sends no post_save signals.
+    polygons_saved([polygon], [previous])
+    return polygon
@@ -1,23 +1,105 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.http import Http404, HttpResponse
 from .models import Polygon
-from .serializers import PolygonSerializer, PolygonListSerializer
+from .serializers import (
+    PolygonSerializer, PolygonListSerializer, PolygonSummarySerializer, LIST_FIELDS,
+    list_representations, feature_rows, encode_features
+)
+from .renderers import dumps
+from .bulk import parse_items, bulk_create_polygons
+from .dedupe import parse_duplicates
+from .vertex_edits import edit_vertices, parse_operations
+from .db_router import read_database, stick_to_primary
+from .streaming import iter_feature_collection
+from .exports import export_queryset, export_response, parse_after
+from .stats import compute_stats, parse_histogram
+from .response_cache import (
+    cached_response, cached_streaming_response, collection_state, expiring_response
+)
+from .filters import filter_request, parse_point
+from .geometry import geometry_from_geojson, group_matches, point_array
+from .spatial_index import spatial_index
+from .simplify import parse_tolerance
+from .tiles import MAX_ZOOM, get_tile
 
 
 class PolygonViewSet(viewsets.ModelViewSet):
     queryset = Polygon.objects.all()
     serializer_class = PolygonSerializer
+    # Actions that may read from a replica, and writes that make their
+    # client read from the primary for a while afterwards
+    read_actions = (
+        'list', 'retrieve', 'geojson', 'geojson_collection', 'export',
+        'stats', 'contains', 'intersects', 'tile'
+    )
+    write_actions = (
+        'create', 'update', 'partial_update', 'destroy', 'bulk', 'vertices'
+    )
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'geojson_collection', 'export', 'stats'):
+            queryset = filter_request(queryset, self.request)
+        if self.action in self.read_actions:
+            if not hasattr(self, '_read_database'):
+                self._read_database = read_database(self.request)
+            queryset = queryset.using(self._read_database)
+        return queryset
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.action in self.write_actions and response.status_code < 400:
+            stick_to_primary(response)
+        return response
 
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in ('list', 'contains', 'intersects'):
             return PolygonListSerializer
         return PolygonSerializer
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).values(*LIST_FIELDS)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(list_representations(page))
+        return Response(list_representations(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        polygon = self.get_object()
+        return cached_response(
+            request, 'retrieve',
+            (polygon.pk, polygon.updated_at.isoformat()),
+            int(polygon.updated_at.timestamp()),
+            lambda: dumps(self.get_serializer(polygon).data)
+        )
+
     def create(self, request, *args, **kwargs):
+        try:
+            duplicates = parse_duplicates(request.query_params)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
+            if duplicates != 'allow':
+                original = Polygon.objects.filter(
+                    geometry_hash=serializer.geometry_hash
+                ).order_by('id').first()
+                if original is not None and duplicates == 'reject':
+                    return Response(
+                        {
+                            "detail": f"Duplicates polygon {original.id}",
+                            "id": original.id
+                        },
+                        status=status.HTTP_409_CONFLICT
+                    )
+                if original is not None:
+                    return Response(self.get_serializer(original).data)
             polygon = serializer.save()
             return Response(
                 serializer.data, 
@@ -28,23 +110,157 @@ class PolygonViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        try:
+            items = parse_items(request.data)
+            duplicates = parse_duplicates(request.query_params)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = bulk_create_polygons(items, duplicates=duplicates)
+        succeeded = sum(1 for result in results if 'id' in result)
+        merged = sum(1 for result in results if result.get('duplicate'))
+        created = succeeded - merged
+        
+        if succeeded == len(results):
+            # Nothing new when every item matched a stored polygon
+            response_status = (
+                status.HTTP_200_OK if merged and not created
+                else status.HTTP_201_CREATED
+            )
+        elif succeeded == 0:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_207_MULTI_STATUS
+        
+        return Response(
+            {
+                "created": created,
+                "merged": merged,
+                "failed": len(results) - succeeded,
+                "results": results
+            },
+            status=response_status
+        )
+
+    @action(detail=True, methods=['patch'])
+    def vertices(self, request, pk=None):
+        try:
+            operations = parse_operations(request.data)
+            polygon = edit_vertices(self.get_queryset(), pk, operations)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(PolygonSummarySerializer(polygon).data)
+
     @action(detail=True, methods=['get'])
     def geojson(self, request, pk=None):
+        try:
+            tolerance = parse_tolerance(request.query_params)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        
         polygon = self.get_object()
-        geojson_data = polygon.to_geojson()
-        return Response(geojson_data)
+        return cached_response(
+            request, 'geojson',
+            (polygon.pk, polygon.updated_at.isoformat(), tolerance),
+            int(polygon.updated_at.timestamp()),
+            lambda: dumps(polygon.to_geojson(tolerance))
+        )
 
     @action(detail=False, methods=['get'])
     def geojson_collection(self, request):
-        polygons = self.get_queryset()
-        features = [polygon.to_geojson() for polygon in polygons]
+        try:
+            tolerance = parse_tolerance(request.query_params)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = self.get_queryset()
+        version, last_modified = collection_state()
+        parts = (version, request.get_full_path())
         
-        geojson_collection = {
-            "type": "FeatureCollection",
-            "features": features
-        }
+        if self.paginator is not None and self.paginator.is_requested(request):
+            def render_page():
+                page = self.paginate_queryset(feature_rows(queryset, tolerance))
+                return self.paginator.encode_feature_collection(
+                    encode_features(page, tolerance)
+                )
+            
+            return cached_response(
+                request, 'geojson_collection', parts, last_modified, render_page
+            )
+        
+        return cached_streaming_response(
+            request, 'geojson_collection', parts, last_modified,
+            lambda: iter_feature_collection(queryset, tolerance=tolerance)
+        )
+
+    @action(detail=False, methods=['get'], url_path=r'export/(?P<fmt>ndjson|csv|fgb)')
+    def export(self, request, fmt):
+        try:
+            queryset = export_queryset(
+                self.get_queryset(), parse_after(request.query_params)
+            )
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(fmt, queryset)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        try:
+            histogram, bins = parse_histogram(request.query_params)
+            queryset = self.get_queryset()
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        return expiring_response(
+            'stats', (request.get_full_path(),), settings.POLYGON_STATS_CACHE_TIMEOUT,
+            lambda: dumps(compute_stats(queryset, histogram, bins))
+        )
+
+    def matching_response(self, ids):
+        polygons = self.get_queryset().filter(id__in=ids).values(*LIST_FIELDS)
+        return Response({"count": len(ids), "results": list_representations(polygons)})
+
+    @action(detail=False, methods=['get'])
+    def contains(self, request):
+        try:
+            lng, lat = parse_point(request.query_params)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        return self.matching_response(spatial_index.contains(lng, lat))
+
+    @action(detail=False, methods=['post'])
+    def intersects(self, request):
+        try:
+            geometry = geometry_from_geojson(request.data)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        return self.matching_response(spatial_index.intersects(geometry))
+
+    @action(detail=False, methods=['post'])
+    def locate(self, request):
+        points = request.data.get('points') if isinstance(request.data, dict) else None
+        try:
+            coords = point_array(points)
+        except ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        
+        point_indices, polygon_ids = spatial_index.locate(coords)
+        return Response({
+            "count": len(coords),
+            "results": group_matches(len(coords), point_indices, polygon_ids)
+        })
+
+    def tile(self, request, z, x, y):
+        z, x, y = int(z), int(x), int(y)
+        if z > MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+            raise Http404("Tile out of range")
         
-        return Response(geojson_collection)
+        data, hit = get_tile(self.get_queryset(), z, x, y)
+        response = HttpResponse(data, content_type='application/vnd.mapbox-vector-tile')
+        response['X-Tile-Cache'] = 'HIT' if hit else 'MISS'
+        return response
 
     def destroy(self, request, *args, **kwargs):
         polygon = self.get_object()
@@ -43,8 +43,14 @@ const PolygonList = () => {
     setError('');
     
     try {
-      const data = await polygonAPI.getAll();
-      setPolygons(data.results || data);
+      let data = await polygonAPI.getPage();
+      let loaded = data.results;
+      setPolygons(loaded);
+      while (data.next) {
+        data = await polygonAPI.getPage(data.next);
+        loaded = loaded.concat(data.results);
+        setPolygons(loaded);
+      }
     } catch (err) {
       setError('Failed to load polygons');
       console.error('Error loading polygons:', err);
@@ -9,7 +9,19 @@ const api = axios.create({
 
 export const polygonAPI = {
   getAll: async () => {
-    const response = await api.get('/polygons/');
+    let data = await polygonAPI.getPage();
+    let polygons = data.results;
+    while (data.next) {
+      data = await polygonAPI.getPage(data.next);
+      polygons = polygons.concat(data.results);
+    }
+    return polygons;
+  },
+
+  getPage: async (pageUrl = null, pageSize = undefined) => {
+    const response = pageUrl
+      ? await api.get(pageUrl)
+      : await api.get('/polygons/', { params: { page_size: pageSize } });
     return response.data;
   },
 
@@ -23,11 +35,22 @@ export const polygonAPI = {
     return response.data;
   },
 
+  bulkCreate: async (polygons) => {
+    const response = await api.post('/polygons/bulk/', polygons);
+    return response.data;
+  },
+
   update: async (id, polygonData) => {
     const response = await api.put(`/polygons/${id}/`, polygonData);
     return response.data;
   },
 
+  // operations: [{ op: 'insert' | 'move' | 'delete', index, point: [lng, lat] }]
+  editVertices: async (id, operations) => {
+    const response = await api.patch(`/polygons/${id}/vertices/`, { operations });
+    return response.data;
+  },
+
   delete: async (id) => {
     const response = await api.delete(`/polygons/${id}/`);
     return response.data;